@@ -30,6 +30,9 @@ cfg = __C
 
 __C.FLIP_X = False
 __C.INPUT = 'RGBD'
+# feed uint8 color and normals and uint16 depth of one channel, vgg16_convs
+# subtracts the means, scales and tiles the depth in the graph
+__C.INPUT_RAW = False
 __C.NETWORK = 'VGG16'
 __C.RIG = ''
 __C.CAD = ''
@@ -215,6 +218,34 @@ __C.TEST.POSE_REFINE = False
 __C.TEST.SYNTHETIC = False
 __C.TEST.VOTING_THRESHOLD = -1
 
+# ICP refinement: objects are refined one at a time in order of confidence
+# time budget of ICP per frame in seconds, -1 for none
+__C.TEST.ICP_DEADLINE = -1.0
+# ICP error threshold in meters
+__C.TEST.ICP_ERROR_THRESHOLD = 0.01
+# max roi center motion in pixels to reuse the previous refined pose of a video,
+# 0 refines every frame from scratch
+__C.TEST.ICP_TRACK_RADIUS = 0.0
+# converged tracks are refined again after this many skipped frames
+__C.TEST.ICP_TRACK_MAX_SKIP = 10
+
+# Tracking in the ROS listeners: while the segmentation of every tracked
+# object overlaps its previous mask, skip Hough voting and move the poses
+__C.TEST.TRACKING = False
+# min mask IoU with the previous frame to keep tracking
+__C.TEST.TRACK_IOU = 0.7
+# max number of tracked frames before running Hough voting again
+__C.TEST.TRACK_MAX_AGE = 30
+# pixels of an untracked class that trigger Hough voting
+__C.TEST.TRACK_MIN_PIXELS = 500
+
+# latency tracing of the single frame pipeline and the ROS listeners, see utils.trace
+__C.TEST.TRACE = False
+# number of events kept in the ring buffer
+__C.TEST.TRACE_CAPACITY = 65536
+# Chrome trace JSON written at exit and on SIGUSR1, '' for none
+__C.TEST.TRACE_FILE = ''
+
 # Scales to compute real features
 __C.TEST.SCALES_BASE = (0.25, 0.5, 1.0, 2.0, 3.0)
 
@@ -0,0 +1,167 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Per-object ICP pose refinement with a frame deadline.
+
+Objects are refined one at a time in order of detection confidence, in
+the calling thread, which owns the OpenGL context of the synthesizer.
+
+With track_radius > 0 the refined poses are kept as tracks across the
+frames of a video. A detection that matches a track is initialized from
+the previous refined pose, and skipped when the previous ICP had already
+converged and the object has not moved, for at most track_max_skip
+frames in a row. Images that are not consecutive frames must not share
+tracks, use track_radius 0 or reset() between them.
+"""
+
+import time
+import numpy as np
+from transforms3d.quaternions import quat2mat
+from utils.trace import span
+
+class RefineScheduler(object):
+
+    def __init__(self, synthesizer, points, deadline=-1, \
+                 error_threshold=0.01, track_radius=0.0, track_max_skip=10):
+        """
+        Arguments:
+            synthesizer: a set up libsynthesizer.Synthesizer
+            points (ndarray): (num_classes, num_points, 3) model points
+            deadline (float): time budget per frame in seconds, -1 for none
+            error_threshold (float): ICP error threshold in meters, also the
+                pose change below which ICP is considered converged
+            track_radius (float): max roi center motion in pixels for a
+                detection to continue a track, 0 for no tracks
+            track_max_skip (int): frames in a row a converged track may skip ICP
+        """
+        self.points = points
+        self.deadline = deadline
+        self.error_threshold = error_threshold
+        self.track_radius = track_radius
+        self.track_max_skip = track_max_skip
+        self.synthesizer = synthesizer
+
+        # tracks[cls] is a list of (roi center, refined pose, converged, frames skipped)
+        self.tracks = {}
+        self.stats = {'frames': 0, 'refined': 0, 'skipped': 0, 'timeout': 0}
+
+    def reset(self):
+        self.tracks = {}
+
+    def pose_distance(self, cls, pose_a, pose_b):
+        """Average distance of the model points under two (quaternion, translation) poses."""
+        pts = self.points[cls]
+        delta = np.dot(pts, (quat2mat(pose_a[:4]) - quat2mat(pose_b[:4])).T) + (pose_a[4:7] - pose_b[4:7])
+        return np.linalg.norm(delta, axis=1).mean()
+
+    def _match_track(self, cls, center, used):
+        """Closest unused track of the class within track_radius, and its distance."""
+        if self.track_radius <= 0:
+            return None, -1
+        best = -1
+        best_dist = self.track_radius
+        for k, track in enumerate(self.tracks.get(cls, [])):
+            if (cls, k) in used:
+                continue
+            dist = np.linalg.norm(track[0] - center)
+            if dist <= best_dist:
+                best = k
+                best_dist = dist
+        if best < 0:
+            return None, -1
+        used.add((cls, best))
+        return self.tracks[cls][best], best_dist
+
+    def refine(self, labels, depth, parameters, rois, poses):
+        """Refine the poses of all rois.
+
+        Arguments follow synthesizer.icp_python: labels (H, W) int32,
+        depth (H, W) uint16, parameters [fx, fy, px, py, znear, zfar, factor],
+        rois (N, C) with class in column 1 and score in column 6, poses (N, 7).
+
+        Returns:
+            poses_new, poses_icp (ndarray): (N, 7) refined poses. Objects not
+                reached before the deadline keep their input pose
+        """
+        start = time.time()
+        deadline_time = start + self.deadline if self.deadline > 0 else -1
+        num = rois.shape[0]
+        poses_new = np.zeros((num, 7), dtype=np.float32)
+        poses_icp = np.zeros((num, 7), dtype=np.float32)
+        self.stats['frames'] += 1
+
+        if rois.shape[1] > 6:
+            order = np.argsort(-rois[:, 6], kind='mergesort')
+        else:
+            order = np.arange(num)
+
+        labels = np.ascontiguousarray(labels, dtype=np.int32)
+        depth = np.ascontiguousarray(depth, dtype=np.uint16)
+        parameters = np.ascontiguousarray(parameters, dtype=np.float32)
+        rois = np.ascontiguousarray(rois, dtype=np.float32)
+
+        used = set()
+        centers = np.zeros((num, 2), dtype=np.float32)
+        converged = np.zeros((num,), dtype=np.bool_)
+        skipped = np.zeros((num,), dtype=np.int32)
+        tasks = []
+        for i in order:
+            cls = int(rois[i, 1])
+            if cls <= 0:
+                continue
+            centers[i, 0] = (rois[i, 2] + rois[i, 4]) / 2
+            centers[i, 1] = (rois[i, 3] + rois[i, 5]) / 2
+            pose_init = poses[i, :7].astype(np.float32)
+            track, dist = self._match_track(cls, centers[i], used)
+            if track is not None:
+                if track[2] and dist <= 0.25 * self.track_radius and track[3] < self.track_max_skip:
+                    # converged last frame and the object has not moved,
+                    # keep the track center so slow drift still adds up
+                    poses_new[i, :] = track[1]
+                    poses_icp[i, :] = track[1]
+                    centers[i, :] = track[0]
+                    converged[i] = True
+                    skipped[i] = track[3] + 1
+                    self.stats['skipped'] += 1
+                    continue
+                pose_init = track[1]
+            tasks.append((i, pose_init))
+
+        def run(task):
+            i, pose_init = task
+            if deadline_time > 0 and time.time() > deadline_time:
+                return i, pose_init, None, None
+            pose = np.ascontiguousarray(pose_init.reshape((1, 7)), dtype=np.float32)
+            out_new = np.zeros((1, 7), dtype=np.float32)
+            out_icp = np.zeros((1, 7), dtype=np.float32)
+            roi = np.ascontiguousarray(rois[i:i+1, :])
+            with span('icp', cls=int(roi[0, 1])):
+                self.synthesizer.icp_python(labels, depth, parameters, labels.shape[0], labels.shape[1], \
+                    1, roi.shape[1], roi, pose, out_new, out_icp, self.error_threshold)
+            return i, pose_init, out_new[0], out_icp[0]
+
+        for i, pose_init, pose_new, pose_icp in (run(task) for task in tasks):
+            if pose_icp is None:
+                poses_new[i, :] = poses[i, :7]
+                poses_icp[i, :] = poses[i, :7]
+                self.stats['timeout'] += 1
+                continue
+            poses_new[i, :] = pose_new
+            poses_icp[i, :] = pose_icp
+            converged[i] = self.pose_distance(int(rois[i, 1]), pose_icp, pose_init) < self.error_threshold
+            self.stats['refined'] += 1
+
+        # the refined poses become the tracks of the next frame
+        tracks = {}
+        for i in order:
+            cls = int(rois[i, 1])
+            if cls <= 0:
+                continue
+            tracks.setdefault(cls, []).append((centers[i].copy(), poses_icp[i].copy(), converged[i], skipped[i]))
+        self.tracks = tracks
+
+        return poses_new, poses_icp
@@ -4,10 +4,15 @@ import cv2
 import numpy as np
 from fcn.config import cfg
 from fcn.test import _extract_vertmap
+from fcn.refine_scheduler import RefineScheduler
+from fcn.pose_tracker import PoseTracker
+from utils.timer import Timer
+from utils.trace import span, begin, dump_on_signal
 from utils.blob import im_list_to_blob, pad_im, unpad_im, add_noise
 from normals import gpu_normals
 from cv_bridge import CvBridge, CvBridgeError
 from std_msgs.msg import String
+import json
 from sensor_msgs.msg import Image
 # from synthesizer.msg import PoseCNNMsg
 from posecnn_kinect.msg import PoseCNNMsg
@@ -153,6 +158,14 @@ class ImageListener:
         self.count = 0
         # self.axs = self.create_plots()
 
+        # per-frame latency, and tracking skips Hough voting on stable frames
+        self.timers = {'frame': Timer(), 'tracked': Timer(), 'voted': Timer(), 'full': Timer()}
+        self.vote_feed = None
+        if cfg.TEST.TRACKING and cfg.TEST.VERTEX_REG_2D and cfg.TEST.POSE_REG:
+            self.tracker = PoseTracker(imdb.num_classes, cfg.TEST.TRACK_IOU, cfg.TEST.TRACK_MAX_AGE, cfg.TEST.TRACK_MIN_PIXELS)
+        else:
+            self.tracker = None
+
         if (cfg.TEST.VERTEX_REG_2D and cfg.TEST.POSE_REFINE) or (cfg.TEST.VERTEX_REG_3D and cfg.TEST.POSE_REG):
             # import libsynthesizer
             from synthesize import libsynthesizer
@@ -161,11 +174,15 @@ class ImageListener:
             self.synthesizer.setup(cfg.TRAIN.SYN_WIDTH, cfg.TRAIN.SYN_HEIGHT)
             print "synthesizer setup done"
 
+            self.refiner = RefineScheduler(self.synthesizer, imdb._points_all, \
+                cfg.TEST.ICP_DEADLINE, cfg.TEST.ICP_ERROR_THRESHOLD, cfg.TEST.ICP_TRACK_RADIUS, cfg.TEST.ICP_TRACK_MAX_SKIP)
+
         # initialize a node
         rospy.init_node("image_listener_posecnn")
         self.posecnn_pub = rospy.Publisher('posecnn_result', PoseCNNMsg, queue_size=1)
         self.label_pub = rospy.Publisher('posecnn_label', Image, queue_size=1)
         self.center_pub = rospy.Publisher('posecnn_center', Image, queue_size=1)
+        self.track_pub = rospy.Publisher('posecnn_tracks', String, queue_size=1)
         rgb_sub = message_filters.Subscriber('/camera/rgb/image_color', Image, queue_size=2)
         # depth_sub = message_filters.Subscriber('/camera/depth_registered/image', Image, queue_size=2)
         depth_sub = message_filters.Subscriber('/camera/depth_registered/sw_registered/image_rect_raw', Image, queue_size=2)
@@ -175,11 +192,14 @@ class ImageListener:
         ts = message_filters.ApproximateTimeSynchronizer([rgb_sub, depth_sub], queue_size, slop_seconds)
         ts.registerCallback(self.callback)
 
+        # TEST.TRACE_FILE is written at shutdown and on kill -USR1
+        if cfg.TEST.TRACE:
+            dump_on_signal()
+
     def processFeedback(self):
         return
 
     def callback(self, rgb, depth):
-        # print "test1"
         if depth.encoding == '32FC1':
             depth_32 = self.cv_bridge.imgmsg_to_cv2(depth) * 1000
             depth_cv = np.array(depth_32, dtype=np.uint16)
@@ -191,13 +211,16 @@ class ImageListener:
                     depth.encoding))
             return
 
+        frame = begin('frame', count=self.count)
+
         # write images
         im = self.cv_bridge.imgmsg_to_cv2(rgb, 'bgr8')
-        filename = 'images/%06d-color.png' % self.count
-        cv2.imwrite(filename, im)
+        with span('write images'):
+            filename = 'images/%06d-color.png' % self.count
+            cv2.imwrite(filename, im)
 
-        filename = 'images/%06d-depth.png' % self.count
-        cv2.imwrite(filename, depth_cv)
+            filename = 'images/%06d-depth.png' % self.count
+            cv2.imwrite(filename, depth_cv)
         # print filename
         self.count += 1
 
@@ -206,15 +229,34 @@ class ImageListener:
         #     synthesizer = libsynthesizer.Synthesizer(self.cfg.CAD, self.cfg.POSE)
         #     synthesizer.setup(self.cfg.TRAIN.SYN_WIDTH, self.cfg.TRAIN.SYN_HEIGHT)
 
-        # run network
-        labels, probs, vertex_pred, rois, poses = self.im_segment_single_frame(self.sess, self.net, im, depth_cv, self.meta_data, \
-            self.imdb._extents, self.imdb._points_all, self.imdb._symmetry, self.imdb.num_classes)
+        # run network, with live tracks first only the segmentation
+        for t in self.timers.values():
+            t.tic()
+        im_scale = self.cfg.TEST.SCALES_BASE[0]
+        tracked = False
+        kind = 'full'
+        if self.tracker is not None and self.tracker.tracks:
+            with span('segment', labels_only=True):
+                labels, probs, vertex_pred, _, _ = self.im_segment_single_frame(self.sess, self.net, im, depth_cv, self.meta_data, \
+                    self.imdb._extents, self.imdb._points_all, self.imdb._symmetry, self.imdb.num_classes, labels_only=True)
+            with span('track'):
+                rois, poses = self.tracker.predict(unpad_im(labels, 16), self.meta_data['intrinsic_matrix'][0, 0] * im_scale, \
+                    self.meta_data['intrinsic_matrix'][1, 1] * im_scale)
+            tracked = rois is not None
+            kind = 'tracked' if tracked else 'voted'
+            if not tracked:
+                # the segmentation pass is reused, only the vertex branch and voting run
+                with span('vote'):
+                    vertex_pred, rois, poses = self.vote_single_frame(self.sess, self.net)
+        else:
+            with span('segment', labels_only=False):
+                labels, probs, vertex_pred, rois, poses = self.im_segment_single_frame(self.sess, self.net, im, depth_cv, self.meta_data, \
+                    self.imdb._extents, self.imdb._points_all, self.imdb._symmetry, self.imdb.num_classes)
 
         im_label = self.imdb.labels_to_image(im, labels)
 
         # added by Aditya
         labels = unpad_im(labels, 16)
-        im_scale = self.cfg.TEST.SCALES_BASE[0]
         im_depth = depth_cv
 
         # cv2.imshow("depth",im_depth)
@@ -233,7 +275,6 @@ class ImageListener:
                 zfar = 6.0
                 poses_new = np.zeros((poses.shape[0], 7), dtype=np.float32)
                 poses_icp = np.zeros((poses.shape[0], 7), dtype=np.float32)
-                error_threshold = 0.01
                 if self.cfg.TEST.POSE_REFINE:
                     labels_icp = labels.copy();
                     rois_icp = rois
@@ -252,16 +293,26 @@ class ImageListener:
                     parameters[4] = znear
                     parameters[5] = zfar
                     parameters[6] = factor
-
-                    height = labels_icp.shape[0]
-                    width = labels_icp.shape[1]
-                    num_roi = rois_icp.shape[0]
-                    channel_roi = rois_icp.shape[1]
-                    self.synthesizer.icp_python(labels_icp, im_depth, parameters, height, width, num_roi, channel_roi, \
-                                           rois_icp, poses, poses_new, poses_icp, error_threshold)
-
-
-        if self.cfg.TEST.VISUALIZE:
+                    with span('refine'):
+                        poses_new, poses_icp = self.refiner.refine(labels_icp, im_depth, parameters, rois_icp, poses)
+
+                if self.tracker is not None:
+                    poses_track = poses_icp if self.cfg.TEST.POSE_REFINE else poses
+                    with span('track'):
+                        if tracked:
+                            self.tracker.correct(poses_track)
+                        else:
+                            self.tracker.update(labels, rois, poses_track)
+                    with span('publish', topic='posecnn_tracks'):
+                        self.track_pub.publish(String(json.dumps(self.tracker.state())))
+
+        self.timers['frame'].toc()
+        self.timers[kind].toc()
+        rospy.loginfo_throttle(5, 'frame {:.3f}s average, full {:.3f}s ({:d}), tracked {:.3f}s ({:d}), voted after tracking {:.3f}s ({:d})'.format( \
+            self.timers['frame'].average_time, self.timers['full'].average_time, self.timers['full'].calls, \
+            self.timers['tracked'].average_time, self.timers['tracked'].calls, self.timers['voted'].average_time, self.timers['voted'].calls))
+
+        if self.cfg.TEST.VISUALIZE and not tracked:
             vertmap = _extract_vertmap(labels, vertex_pred, self.imdb._extents, self.imdb.num_classes)
             # vis_segmentations_vertmaps_detection(im, im_depth, im_label, self.imdb._class_colors, vertmap,
                 # labels, rois, poses, poses_icp, self.meta_data['intrinsic_matrix'], self.imdb.num_classes, self.imdb._classes, self.imdb._points_all)
@@ -290,14 +341,12 @@ class ImageListener:
         # print im_center.shape[0]
         classes = self.imdb._classes
         label_list = []
-        print poses
         for i in xrange(rois.shape[0]):
             cls = int(rois[i, 1])
             if cls > 0:
                 label_list.append(classes[cls])
-                print classes[cls]
-                print poses[i, :]
 
+        publish = begin('publish', topic='posecnn_result')
         msg = PoseCNNMsg()
         msg.height = int(im.shape[0])
         msg.width = int(im.shape[1])
@@ -329,6 +378,7 @@ class ImageListener:
         center_msg.header.frame_id = rgb.header.frame_id
         center_msg.encoding = 'rgb8'
         self.center_pub.publish(center_msg)
+        publish.end()
 
         server = InteractiveMarkerServer("simple_marker")
 
@@ -380,8 +430,7 @@ class ImageListener:
                     # 'commit' changes and send to all clients
 
         server.applyChanges()
-
-        # print "test"
+        frame.end()
 
 
     def create_plots(self):
@@ -454,24 +503,35 @@ class ImageListener:
         im_rescale = cv2.resize(im_orig / 127.5 - 1, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims_rescale.append(im_rescale)
 
-        im_orig -= self.cfg.PIXEL_MEANS
         processed_ims = []
         im_scale_factors = []
         assert len(self.cfg.TEST.SCALES_BASE) == 1
 
-        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        if self.cfg.INPUT_RAW:
+            # uint8 color and uint16 depth, the network subtracts the means and scales the depth
+            color_dtype, depth_dtype, depth_channels = np.uint8, np.uint16, 1
+            im = cv2.resize(im_orig.astype(np.uint8), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        else:
+            color_dtype, depth_dtype, depth_channels = np.float32, np.float32, 3
+            im_orig -= self.cfg.PIXEL_MEANS
+            im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         im_scale_factors.append(im_scale)
         processed_ims.append(im)
 
         # depth
-        im_orig = im_depth.astype(np.float32, copy=True)
-        # im_orig = im_orig / im_orig.max() * 255
-        im_orig = np.clip(im_orig / 2000.0, 0, 1) * 255
-        im_orig = np.tile(im_orig[:,:,np.newaxis], (1,1,3))
-        im_orig -= self.cfg.PIXEL_MEANS
-
         processed_ims_depth = []
-        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        if self.cfg.INPUT_RAW:
+            # a single uint16 channel, im_list_to_blob keeps one
+            if len(im_depth.shape) == 3:
+                im_depth = im_depth[:, :, 0]
+            im = cv2.resize(im_depth.astype(np.uint16, copy=False), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        else:
+            im_orig = im_depth.astype(np.float32, copy=True)
+            # im_orig = im_orig / im_orig.max() * 255
+            im_orig = np.clip(im_orig / 2000.0, 0, 1) * 255
+            im_orig = np.tile(im_orig[:,:,np.newaxis], (1,1,3))
+            im_orig -= self.cfg.PIXEL_MEANS
+            im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims_depth.append(im)
 
         if cfg.INPUT == 'NORMAL':
@@ -491,28 +551,33 @@ class ImageListener:
             im_normal = cv2.bilateralFilter(im_normal, 9, 75, 75)
 
             processed_ims_normal = []
-            im_orig = im_normal.astype(np.float32, copy=True)
-            im_orig -= cfg.PIXEL_MEANS
-            im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            if self.cfg.INPUT_RAW:
+                im_normal = cv2.resize(im_normal, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            else:
+                im_orig = im_normal.astype(np.float32, copy=True)
+                im_orig -= cfg.PIXEL_MEANS
+                im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
             processed_ims_normal.append(im_normal)
-            blob_normal = im_list_to_blob(processed_ims_normal, 3)
+            blob_normal = im_list_to_blob(processed_ims_normal, 3, color_dtype)
         else:
             blob_normal = []
 
         # Create a blob to hold the input images
-        blob = im_list_to_blob(processed_ims, 3)
+        blob = im_list_to_blob(processed_ims, 3, color_dtype)
         blob_rescale = im_list_to_blob(processed_ims_rescale, 3)
-        blob_depth = im_list_to_blob(processed_ims_depth, 3)
+        blob_depth = im_list_to_blob(processed_ims_depth, depth_channels, depth_dtype)
 
         return blob, blob_rescale, blob_depth, blob_normal, np.array(im_scale_factors)
 
 
-    def im_segment_single_frame(self, sess, net, im, im_depth, meta_data, extents, points, symmetry, num_classes):
-        """segment image
+    def im_segment_single_frame(self, sess, net, im, im_depth, meta_data, extents, points, symmetry, num_classes, labels_only=False):
+        """segment image, labels_only skips the vertex branch and Hough voting,
+        which vote_single_frame can run afterwards
         """
 
         # compute image blob
-        im_blob, im_rescale_blob, im_depth_blob, im_normal_blob, im_scale_factors = self.get_image_blob(im, im_depth, meta_data)
+        with span('blob build'):
+            im_blob, im_rescale_blob, im_depth_blob, im_normal_blob, im_scale_factors = self.get_image_blob(im, im_depth, meta_data)
         im_scale = im_scale_factors[0]
 
         # construct the meta data
@@ -562,33 +627,35 @@ class ImageListener:
             else:
                 feed_dict = {net.data: data_blob, net.gt_label_2d: label_blob, net.keep_prob: 1.0}
 
-        sess.run(net.enqueue_op, feed_dict=feed_dict)
+        with span('enqueue'):
+            sess.run(net.enqueue_op, feed_dict=feed_dict)
 
-        if self.cfg.TEST.VERTEX_REG_2D:
+        if self.cfg.TEST.VERTEX_REG_2D and not labels_only:
             if self.cfg.TEST.POSE_REG:
-                labels_2d, probs, vertex_pred, rois, poses_init, poses_pred = \
-                    sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), \
-                              net.get_output('rois'), net.get_output('poses_init'), net.get_output('poses_tanh')])
+                with span('sess.run'):
+                    labels_2d, probs, vertex_pred, rois, poses_init, poses_pred = \
+                        sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), \
+                                  net.get_output('rois'), net.get_output('poses_init'), net.get_output('poses_tanh')])
 
                 # non-maximum suppression
-                keep = nms(rois, 0.5)
-                rois = rois[keep, :]
-                poses_init = poses_init[keep, :]
-                poses_pred = poses_pred[keep, :]
-                # print rois
+                with span('nms'):
+                    keep = nms(rois, 0.5)
+                    rois = rois[keep, :]
+                    poses_init = poses_init[keep, :]
+                    poses_pred = poses_pred[keep, :]
 
                 # combine poses
-                num = rois.shape[0]
-                poses = poses_init
-                for i in xrange(num):
-                    class_id = int(rois[i, 1])
-                    if class_id >= 0:
-                        poses[i, :4] = poses_pred[i, 4*class_id:4*class_id+4]
+                with span('pose combine'):
+                    num = rois.shape[0]
+                    poses = poses_init
+                    for i in xrange(num):
+                        class_id = int(rois[i, 1])
+                        if class_id >= 0:
+                            poses[i, :4] = poses_pred[i, 4*class_id:4*class_id+4]
             else:
-                labels_2d, probs, vertex_pred, rois, poses = \
-                    sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), net.get_output('rois'), net.get_output('poses_init')])
-                # print rois
-                # print rois.shape
+                with span('sess.run'):
+                    labels_2d, probs, vertex_pred, rois, poses = \
+                        sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), net.get_output('rois'), net.get_output('poses_init')])
                 # non-maximum suppression
                 # keep = nms(rois[:, 2:], 0.5)
                 # rois = rois[keep, :]
@@ -599,10 +666,56 @@ class ImageListener:
                 #rois = []
                 #poses = []
             vertex_pred = vertex_pred[0, :, :, :]
+        elif self.cfg.TEST.VERTEX_REG_2D:
+            # keep the features and the inputs of voting for vote_single_frame
+            with span('sess.run'):
+                labels_2d, probs, conv4_3, conv5_3 = sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), \
+                    net.get_output('conv4_3'), net.get_output('conv5_3')])
+            self.vote_feed = {net.get_output('label_2d'): labels_2d, net.get_output('conv4_3'): conv4_3, net.get_output('conv5_3'): conv5_3, \
+                              net.keep_prob_queue: 1.0, net.get_output('extents'): extents, net.get_output('meta_data'): meta_data_blob, \
+                              net.get_output('poses'): pose_blob}
+            vertex_pred = []
+            rois = []
+            poses = []
         else:
-            labels_2d, probs = sess.run([net.get_output('label_2d'), net.get_output('prob_normalized')])
+            with span('sess.run'):
+                labels_2d, probs = sess.run([net.get_output('label_2d'), net.get_output('prob_normalized')])
             vertex_pred = []
             rois = []
             poses = []
 
         return labels_2d[0,:,:].astype(np.int32), probs[0,:,:,:], vertex_pred, rois, poses
+
+    def vote_single_frame(self, sess, net):
+        """vertex branch and Hough voting of the last labels_only frame
+
+        The fed features and labels stand in for the dequeued frame, so the
+        convolutions of the segmentation are not run again.
+        """
+        if self.cfg.TEST.POSE_REG:
+            with span('sess.run'):
+                vertex_pred, rois, poses_init, poses_pred = sess.run([net.get_output('vertex_pred'), net.get_output('rois'), \
+                    net.get_output('poses_init'), net.get_output('poses_tanh')], feed_dict=self.vote_feed)
+
+            # non-maximum suppression
+            with span('nms'):
+                keep = nms(rois, 0.5)
+                rois = rois[keep, :]
+                poses_init = poses_init[keep, :]
+                poses_pred = poses_pred[keep, :]
+
+            # combine poses
+            with span('pose combine'):
+                num = rois.shape[0]
+                poses = poses_init
+                for i in xrange(num):
+                    class_id = int(rois[i, 1])
+                    if class_id >= 0:
+                        poses[i, :4] = poses_pred[i, 4*class_id:4*class_id+4]
+        else:
+            with span('sess.run'):
+                vertex_pred, rois, poses = sess.run([net.get_output('vertex_pred'), net.get_output('rois'), net.get_output('poses_init')], \
+                    feed_dict=self.vote_feed)
+        self.vote_feed = None
+
+        return vertex_pred[0, :, :, :], rois, poses
@@ -19,12 +19,16 @@ import networks.resnet50
 import tensorflow as tf
 from fcn.config import cfg
 
+# raw input blobs are only converted in the graph of vgg16_convs
+assert not cfg.INPUT_RAW or (cfg.TRAIN.SINGLE_FRAME and cfg.NETWORK == 'VGG16'), \
+    'cfg.INPUT_RAW is only supported by vgg16_convs'
+
 if cfg.TRAIN.SINGLE_FRAME:
     if cfg.NETWORK == 'VGG16':
         __sets['vgg16_convs'] = networks.vgg16_convs(cfg.INPUT, cfg.TRAIN.NUM_CLASSES, cfg.TRAIN.NUM_UNITS, cfg.TRAIN.SCALES_BASE, \
                                                      cfg.TRAIN.THRESHOLD_LABEL, cfg.TRAIN.VOTING_THRESHOLD, \
                                                      cfg.TRAIN.VERTEX_REG_2D, cfg.TRAIN.VERTEX_REG_3D, \
-                                                     cfg.TRAIN.POSE_REG, cfg.TRAIN.ADAPT, cfg.TRAIN.TRAINABLE, cfg.IS_TRAIN)
+                                                     cfg.TRAIN.POSE_REG, cfg.TRAIN.ADAPT, cfg.TRAIN.TRAINABLE, cfg.IS_TRAIN, cfg.INPUT_RAW)
     if cfg.NETWORK == 'VGG16FULL':
         __sets['vgg16_full'] = networks.vgg16_full(cfg.INPUT, cfg.TRAIN.NUM_CLASSES, cfg.TRAIN.NUM_UNITS, cfg.TRAIN.SCALES_BASE, \
                                                      cfg.TRAIN.VERTEX_REG_2D, cfg.TRAIN.VERTEX_REG_3D, cfg.TRAIN.POSE_REG, \
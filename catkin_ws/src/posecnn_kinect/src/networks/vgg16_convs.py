@@ -1,8 +1,9 @@
 import tensorflow as tf
 from networks.network import Network
+from fcn.config import cfg
 
 class vgg16_convs(Network):
-    def __init__(self, input_format, num_classes, num_units, scales, threshold_label, vote_threshold, vertex_reg_2d=False, vertex_reg_3d=False, pose_reg=False, adaptation=False, trainable=True, is_train=True):
+    def __init__(self, input_format, num_classes, num_units, scales, threshold_label, vote_threshold, vertex_reg_2d=False, vertex_reg_3d=False, pose_reg=False, adaptation=False, trainable=True, is_train=True, input_raw=False):
         self.inputs = []
         self.input_format = input_format
         self.num_classes = num_classes
@@ -12,6 +13,7 @@ class vgg16_convs(Network):
         self.vertex_reg_2d = vertex_reg_2d
         self.vertex_reg_3d = vertex_reg_3d
         self.vertex_reg = vertex_reg_2d or vertex_reg_3d
+        self.input_raw = input_raw
         self.pose_reg = pose_reg
         self.adaptation = adaptation
         self.trainable = trainable
@@ -28,8 +30,16 @@ class vgg16_convs(Network):
             self.vote_threshold = vote_threshold
             self.vote_percentage = 0.02
 
-        self.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
-        if input_format == 'RGBD':
+        if input_raw and input_format == 'DEPTH':
+            # raw images are queued and converted by normalize_input
+            self.data = tf.placeholder(tf.uint16, shape=[None, None, None, 1])
+        elif input_raw:
+            self.data = tf.placeholder(tf.uint8, shape=[None, None, None, 3])
+        else:
+            self.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+        if input_format == 'RGBD' and input_raw:
+            self.data_p = tf.placeholder(tf.uint16, shape=[None, None, None, 1])
+        elif input_format == 'RGBD':
             self.data_p = tf.placeholder(tf.float32, shape=[None, None, None, 3])
         self.gt_label_2d = tf.placeholder(tf.int32, shape=[None, None, None])
         self.keep_prob = tf.placeholder(tf.float32)
@@ -46,7 +56,7 @@ class vgg16_convs(Network):
         queue_size = 25
         if input_format == 'RGBD':
             if self.vertex_reg:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.float32, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, self.data_p.dtype, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.data_p, self.gt_label_2d, self.keep_prob, \
                                              self.vertex_targets, self.vertex_weights, self.poses, \
                                              self.extents, self.meta_data, self.points, self.symmetry])
@@ -55,27 +65,49 @@ class vgg16_convs(Network):
                                     'vertex_weights': vertex_weights, 'poses': poses, 'extents': extents, \
                                     'meta_data': meta_data, 'points': points, 'symmetry': symmetry})
             else:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.float32, tf.int32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, self.data_p.dtype, tf.int32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.data_p, self.gt_label_2d, self.keep_prob])
                 data, data_p, gt_label_2d, self.keep_prob_queue = q.dequeue()
                 self.layers = dict({'data': data, 'data_p': data_p, 'gt_label_2d': gt_label_2d})
         else:
             if self.vertex_reg:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.gt_label_2d, self.keep_prob, self.vertex_targets, self.vertex_weights, self.poses, self.extents, self.meta_data, self.points, self.symmetry])
                 data, gt_label_2d, self.keep_prob_queue, vertex_targets, vertex_weights, poses, extents, meta_data, points, symmetry = q.dequeue()
                 self.layers = dict({'data': data, 'gt_label_2d': gt_label_2d, 'vertex_targets': vertex_targets, 'vertex_weights': vertex_weights, 
                                     'poses': poses, 'extents': extents, 'meta_data': meta_data, 'points': points, 'symmetry': symmetry})
             else:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.int32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, tf.int32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.gt_label_2d, self.keep_prob])
                 data, gt_label_2d, self.keep_prob_queue = q.dequeue()
                 self.layers = dict({'data': data, 'gt_label_2d': gt_label_2d})
         self.close_queue_op = q.close(cancel_pending_enqueues=True)
         self.queue_size = q.size()
+        if self.input_raw:
+            self.layers['data'] = self.normalize_input(self.layers['data'])
+            if input_format == 'RGBD':
+                self.layers['data_p'] = self.normalize_input(self.layers['data_p'])
 
         self.setup()
 
+    def normalize_input(self, data):
+        """Float input of raw uint8 images or uint16 depth, as the blobs of the minibatch and of testing.
+
+        Depth is scaled to [0, 255] by the maximum of each image when training
+        and clipped at 2000 depth units when testing, and tiled to 3 channels.
+        The means are subtracted from both.
+        """
+        pixel_means = tf.constant(cfg.PIXEL_MEANS.reshape((1, 1, 1, 3)), dtype=tf.float32)
+        if data.dtype == tf.uint8:
+            return tf.cast(data, tf.float32) - pixel_means
+        depth = tf.cast(data, tf.float32)
+        if self.is_train:
+            depth_max = tf.reduce_max(depth, reduction_indices=[1, 2, 3], keep_dims=True)
+            depth = depth / tf.maximum(depth_max, 1.0) * 255
+        else:
+            depth = tf.clip_by_value(depth / 2000.0, 0, 1) * 255
+        return tf.tile(depth, [1, 1, 1, 3]) - pixel_means
+
     def setup(self):
         (self.feed('data')
              .conv(3, 3, 64, 1, 1, name='conv1_1', c_i=3, trainable=self.trainable)
@@ -0,0 +1,143 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Per-frame latency tracing.
+
+    with span('sess.run'):
+        ...
+
+records the wall time of the block when cfg.TEST.TRACE is on, as does
+s = begin('preprocess') ... s.end(). When it is off both return a shared
+no-op object. Spans nest by time and carry the id of their thread, so
+ICP worker threads show up as their own rows.
+
+Events go into a fixed size ring buffer. A writer takes the next slot
+from an itertools.count, whose increment is atomic under the GIL, so
+recording takes no lock; old events are overwritten once the buffer is
+full. dump() writes the buffer as Chrome trace JSON, to be opened in
+chrome://tracing or Perfetto. With cfg.TEST.TRACE_FILE set the buffer is
+also dumped at exit, and dump_on_signal() dumps it on SIGUSR1.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import signal
+import threading
+import time
+from fcn.config import cfg
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def end(self):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span(object):
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+    def end(self):
+        self.tracer.add(self.name, self.start, time.time() - self.start, self.args)
+
+class Tracer(object):
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._counter = itertools.count()
+        self._count = 0
+
+    def span(self, name, args=None):
+        return _Span(self, name, args)
+
+    def add(self, name, start, duration, args=None):
+        """Record an event of duration seconds that started at time start."""
+        index = next(self._counter)
+        self._slots[index % self.capacity] = (index, name, start, duration, threading.current_thread().ident, args)
+        self._count = max(self._count, index + 1)
+
+    def count(self):
+        """Number of events recorded so far, including overwritten ones."""
+        return self._count
+
+    def events(self, since=0):
+        """Events (index, name, start, duration, thread, args) recorded after the first since, oldest first."""
+        events = [e for e in self._slots if e is not None and e[0] >= since]
+        events.sort(key=lambda e: e[0])
+        return events
+
+    def dump(self, filename):
+        """Write the buffered events as Chrome trace JSON."""
+        pid = os.getpid()
+        trace = [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, \
+                  'pid': pid, 'tid': tid, 'args': args or {}} \
+                 for _, name, start, duration, tid, args in self.events()]
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(filename, 'w') as fid:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, fid)
+        return len(trace)
+
+_tracer = None
+_lock = threading.Lock()
+
+def get_tracer():
+    """The process wide tracer, created with cfg.TEST.TRACE_CAPACITY on first use."""
+    global _tracer
+    if _tracer is None:
+        with _lock:
+            if _tracer is None:
+                _tracer = Tracer(cfg.TEST.TRACE_CAPACITY)
+                if cfg.TEST.TRACE_FILE:
+                    atexit.register(dump)
+    return _tracer
+
+def span(name, **args):
+    """Context manager timing a block, a no-op unless cfg.TEST.TRACE is on."""
+    if not cfg.TEST.TRACE:
+        return _NULL_SPAN
+    return get_tracer().span(name, args)
+
+def begin(name, **args):
+    """Start a span that is closed by its end(), for blocks too long for a with statement."""
+    if not cfg.TEST.TRACE:
+        return _NULL_SPAN
+    return get_tracer().span(name, args).__enter__()
+
+def dump(filename=None):
+    """Write the trace to filename, cfg.TEST.TRACE_FILE by default."""
+    filename = filename or cfg.TEST.TRACE_FILE
+    if _tracer is None or not filename:
+        return 0
+    num = _tracer.dump(filename)
+    print 'trace of {} events written to {}'.format(num, filename)
+    return num
+
+def dump_on_signal(signum=signal.SIGUSR1):
+    """Dump the trace to cfg.TEST.TRACE_FILE when the process gets signum, call from the main thread."""
+    signal.signal(signum, lambda *unused: dump())
@@ -4,6 +4,7 @@ import os
 import datasets
 import datasets.gmu_scene
 import datasets.imdb
+from utils.confusion import ConfusionMatrix
 import cPickle
 import numpy as np
 import cv2
@@ -222,7 +223,7 @@ class gmu_scene(datasets.imdb):
         print 'evaluating segmentations'
         # compute histogram
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
+        confusion = ConfusionMatrix(n_cl)
 
         # make image dir
         image_dir = os.path.join(output_dir, 'images')
@@ -239,12 +240,12 @@ class gmu_scene(datasets.imdb):
         for im_ind, index in enumerate(self.image_index):
             # read ground truth labels
             im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = im.astype(np.float32)
+            gt_labels = im
 
             # predicated labels
             sg_labels = segmentations[im_ind]['labels']
 
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+            confusion.add(gt_labels, sg_labels)
 
             """
             # label image
@@ -267,6 +268,8 @@ class gmu_scene(datasets.imdb):
             print filename
             scipy.io.savemat(filename, labels)
 
+        hist = confusion.hist.astype(np.float64)
+
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
         print 'overall accuracy', acc
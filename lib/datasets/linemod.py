@@ -11,6 +11,7 @@ import PIL
 import sys
 import scipy
 from fcn.config import cfg
+from utils.confusion import ConfusionMatrix
 from utils.pose_error import *
 from utils.se3 import *
 from utils.cython_bbox import bbox_overlaps
@@ -392,20 +393,15 @@ class linemod(datasets.imdb):
 
         # evaluate segmentation
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
-
-        gt_labels = gt_labels.astype(np.float32)
         sg_labels = segmentation['labels']
-        hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+        iou = ConfusionMatrix(n_cl).add(gt_labels, sg_labels, per_frame=True)
 
         # per-class IU
         print 'per-class segmentation IoU'
-        intersection = np.diag(hist)
-        union = hist.sum(1) + hist.sum(0) - np.diag(hist)
-        index = np.where(union > 0)[0]
+        index = np.where(~np.isnan(iou))[0]
         for i in range(len(index)):
             ind = index[i]
-            print '{} {}'.format(self._classes[ind], intersection[ind] / union[ind])
+            print '{} {}'.format(self._classes[ind], iou[ind])
 
         if 'few' in self._image_set:
             threshold = 0.1 * self._diameters[self._cls_index - 1]
@@ -627,7 +623,7 @@ class linemod(datasets.imdb):
         print 'evaluating segmentations'
         # compute histogram
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
+        confusion = ConfusionMatrix(n_cl)
 
         # make image dir
         image_dir = os.path.join(output_dir, 'images')
@@ -656,7 +652,7 @@ class linemod(datasets.imdb):
         for im_ind, index in enumerate(self.image_index):
             # read ground truth labels
             im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = im.astype(np.float32)
+            gt_labels = im
             if 'test' in self._image_set:
                 I = np.where(gt_labels == self._cls_index)
                 gt_labels[:, :] = 0
@@ -669,7 +665,7 @@ class linemod(datasets.imdb):
                 sg_labels = results_mat['labels']
             else:
                 sg_labels = segmentations[im_ind]['labels']
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+            confusion.add(gt_labels, sg_labels)
 
             # evaluate pose
             if cfg.TEST.POSE_REG:
@@ -819,6 +815,8 @@ class linemod(datasets.imdb):
             scipy.io.savemat(filename, labels)
             #'''
 
+        hist = confusion.hist.astype(np.float64)
+
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
         print 'overall accuracy', acc
@@ -5,13 +5,18 @@ import datasets
 import datasets.lov
 import datasets.imdb
 import cPickle
+import hashlib
 import numpy as np
 import cv2
 import PIL
 import sys
 import scipy
 from fcn.config import cfg
+from utils.confusion import ConfusionMatrix
 from utils.pose_error import *
+from utils.pose_metrics import PoseEvaluator
+from utils.pose_auc import pose_curves, save_curves
+from utils.eval_runner import ShardedRunner, merge_records
 from utils.cython_bbox import bbox_overlaps
 from transforms3d.quaternions import quat2mat, mat2quat
 from rpn_layer.generate_anchors import generate_anchors
@@ -370,7 +375,7 @@ class lov(datasets.imdb):
         # make matlab result dir
         import scipy.io
         mat_dir = os.path.join(output_dir, 'mat')
-        if not os.path.exists(mat_dir):
+        if cfg.TEST.SAVE_MAT and not os.path.exists(mat_dir):
             os.makedirs(mat_dir)
 
         sg_labels = segmentation['labels']
@@ -389,9 +394,10 @@ class lov(datasets.imdb):
                 results = {'labels': sg_labels, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
             else:
                 results = {'labels': sg_labels, 'rois_rgb': rois_rgb, 'poses_rgb': poses_rgb, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
-            filename = os.path.join(mat_dir, '%06d.mat' % im_ind)
-            print filename
-            scipy.io.savemat(filename, results, do_compression=True)
+            if cfg.TEST.SAVE_MAT:
+                filename = os.path.join(mat_dir, '%06d.mat' % im_ind)
+                print filename
+                scipy.io.savemat(filename, results, do_compression=True)
 
 
     def evaluate_result(self, im_ind, segmentation, gt_labels, meta_data, output_dir):
@@ -399,25 +405,20 @@ class lov(datasets.imdb):
         # make matlab result dir
         import scipy.io
         mat_dir = os.path.join(output_dir, 'mat')
-        if not os.path.exists(mat_dir):
+        if cfg.TEST.SAVE_MAT and not os.path.exists(mat_dir):
             os.makedirs(mat_dir)
 
         # evaluate segmentation
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
-
-        gt_labels = gt_labels.astype(np.float32)
         sg_labels = segmentation['labels']
-        hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+        iou = ConfusionMatrix(n_cl).add(gt_labels, sg_labels, per_frame=True)
 
         # per-class IU
         print 'per-class segmentation IoU'
-        intersection = np.diag(hist)
-        union = hist.sum(1) + hist.sum(0) - np.diag(hist)
-        index = np.where(union > 0)[0]
+        index = np.where(~np.isnan(iou))[0]
         for i in range(len(index)):
             ind = index[i]
-            print '{} {}'.format(self._classes[ind], intersection[ind] / union[ind])
+            print '{} {}'.format(self._classes[ind], iou[ind])
 
         # evaluate pose
         if cfg.TEST.POSE_REG:
@@ -434,9 +435,10 @@ class lov(datasets.imdb):
                 results = {'labels': sg_labels, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
             else:
                 results = {'labels': sg_labels, 'rois_rgb': rois_rgb, 'poses_rgb': poses_rgb, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
-            filename = os.path.join(mat_dir, '%06d.mat' % im_ind)
-            print filename
-            scipy.io.savemat(filename, results, do_compression=True)
+            if cfg.TEST.SAVE_MAT:
+                filename = os.path.join(mat_dir, '%06d.mat' % im_ind)
+                print filename
+                scipy.io.savemat(filename, results, do_compression=True)
 
             poses_gt = meta_data['poses']
             if len(poses_gt.shape) == 2:
@@ -515,59 +517,38 @@ class lov(datasets.imdb):
                         print 'threshold: {}'.format(0.1 * np.linalg.norm(self._extents[cls_index, :]))
         
 
-    def evaluate_segmentations(self, segmentations, output_dir):
-        print 'evaluating segmentations'
-        # compute histogram
-        n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
-
-        # make image dir
-        image_dir = os.path.join(output_dir, 'images')
-        if not os.path.exists(image_dir):
-            os.makedirs(image_dir)
-
-        # make matlab result dir
+    def _evaluate_frames(self, segmentations, start, end):
+        """Confusion histogram and pose error records of frames [start, end)."""
         import scipy.io
-        mat_dir = os.path.join(output_dir, 'mat')
-        if not os.path.exists(mat_dir):
-            os.makedirs(mat_dir)
-
+        n_cl = self.num_classes
+        confusion = ConfusionMatrix(n_cl)
         count_all = np.zeros((self.num_classes,), dtype=np.float32)
-        count_correct = np.zeros((self.num_classes,), dtype=np.float32)
-        count_correct_refined = np.zeros((self.num_classes,), dtype=np.float32)
-        count_correct_icp = np.zeros((self.num_classes,), dtype=np.float32)
-        threshold = np.zeros((self.num_classes,), dtype=np.float32)
-        for i in xrange(self.num_classes):
-            threshold[i] = 0.1 * np.linalg.norm(self._extents[i, :])
 
-        # for each image
-        for im_ind, index in enumerate(self.image_index):
+        # (estimate, ground truth) pairs, evaluated in a batch per shard
+        pair_ind = []
+        pair_cls = []
+        pair_gt = []
+        pair_est = {'poses': [], 'poses_refined': [], 'poses_icp': []}
+
+        for im_ind in xrange(start, end):
+            index = self.image_index[im_ind]
             # read ground truth labels
-            im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = im.astype(np.float32)
+            gt_labels = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
 
             # predicated labels
             sg_labels = segmentations[im_ind]['labels']
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+            confusion.add(gt_labels, sg_labels)
 
             # evaluate pose
             if cfg.TEST.POSE_REG:
                 # load meta data
                 meta_data = scipy.io.loadmat(self.metadata_path_from_index(index))
-            
+
                 rois = segmentations[im_ind]['rois']
                 poses = segmentations[im_ind]['poses']
                 poses_new = segmentations[im_ind]['poses_refined']
                 poses_icp = segmentations[im_ind]['poses_icp']
 
-                '''
-                # save matlab result
-                results = {'labels': sg_labels, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
-                filename = os.path.join(mat_dir, '%04d.mat' % im_ind)
-                print filename
-                scipy.io.savemat(filename, results, do_compression=True)
-                '''
-
                 poses_gt = meta_data['poses']
                 if len(poses_gt.shape) == 2:
                     poses_gt = np.reshape(poses_gt, (3, 4, 1))
@@ -576,73 +557,104 @@ class lov(datasets.imdb):
                 for j in xrange(num):
                     if meta_data['cls_indexes'][j] <= 0:
                         continue
-                    cls = self.classes[int(meta_data['cls_indexes'][j])]
                     count_all[int(meta_data['cls_indexes'][j])] += 1
-    
+
                     for k in xrange(rois.shape[0]):
                         cls_index = int(rois[k, 1])
                         if cls_index == meta_data['cls_indexes'][j]:
+                            pair_ind.append(im_ind)
+                            pair_cls.append(cls_index)
+                            pair_gt.append(poses_gt[:, :, j])
+                            for key, poses_key in (('poses', poses), ('poses_refined', poses_new), ('poses_icp', poses_icp)):
+                                if key != 'poses' and not cfg.TEST.POSE_REFINE:
+                                    continue
+                                RT = np.zeros((3, 4), dtype=np.float32)
+                                RT[:3, :3] = quat2mat(poses_key[k, :4])
+                                RT[:, 3] = poses_key[k, 4:7]
+                                pair_est[key].append(RT)
+
+        # one record per matched pair: add (adi for symmetric objects), rotation and translation errors,
+        # and adi of every object for ADD-S
+        records = None
+        if len(pair_cls) > 0:
+            symmetric = [cls in ('024_bowl', '036_wood_block', '061_foam_brick') for cls in self.classes]
+            evaluator = PoseEvaluator(self._points, symmetric)
+            evaluator_s = PoseEvaluator(self._points, [True] * self.num_classes)
+            records = {'im_ind': np.array(pair_ind, dtype=np.int64), 'cls': np.array(pair_cls, dtype=np.int64)}
+            for key in pair_est.keys():
+                if len(pair_est[key]) == 0:
+                    continue
+                errors = evaluator.evaluate(records['cls'], np.array(pair_est[key]), np.array(pair_gt))
+                errors_s = evaluator_s.evaluate(records['cls'], np.array(pair_est[key]), np.array(pair_gt))
+                records[key] = np.stack((errors['add'], errors['rotation'], errors['translation'], errors_s['add']), axis=1)
 
-                            RT = np.zeros((3, 4), dtype=np.float32)
-                            RT[:3, :3] = quat2mat(poses[k, :4])
-                            RT[:, 3] = poses[k, 4:7]
+        return {'hist': confusion.hist, 'count_all': count_all, 'records': records}
 
-                            if cfg.TEST.POSE_REFINE:
-                                RT_new = np.zeros((3, 4), dtype=np.float32)
-                                RT_new[:3, :3] = quat2mat(poses_new[k, :4])
-                                RT_new[:, 3] = poses_new[k, 4:7]
 
-                                RT_icp = np.zeros((3, 4), dtype=np.float32)
-                                RT_icp[:3, :3] = quat2mat(poses_icp[k, :4])
-                                RT_icp[:, 3] = poses_icp[k, 4:7]
+    def evaluate_records(self, segmentations, output_dir):
+        """Confusion matrix, ground truth counts and pose error records of all frames.
 
-                            error_rotation = re(RT[:3, :3], poses_gt[:3, :3, j])
-                            error_translation = te(RT[:, 3], poses_gt[:, 3, j])
-                            if cls == '024_bowl' or cls == '036_wood_block' or cls == '061_foam_brick':
-                                error = adi(RT[:3, :3], RT[:, 3], poses_gt[:3, :3, j], poses_gt[:, 3, j], self._points[cls_index])
-                            else:
-                                error = add(RT[:3, :3], RT[:, 3], poses_gt[:3, :3, j], poses_gt[:, 3, j], self._points[cls_index])
-
-                            if error < threshold[cls_index]:
-                                count_correct[cls_index] += 1
-
-                            if cfg.TEST.POSE_REFINE:
-                                error_rotation_new = re(RT_new[:3, :3], poses_gt[:3, :3, j])
-                                error_translation_new = te(RT_new[:, 3], poses_gt[:, 3, j])
-                                if cls == '024_bowl' or cls == '036_wood_block' or cls == '061_foam_brick':
-                                    error_new = adi(RT_new[:3, :3], RT_new[:, 3], poses_gt[:3, :3, j], poses_gt[:, 3, j], self._points[cls_index])
-                                else:
-                                    error_new = add(RT_new[:3, :3], RT_new[:, 3], poses_gt[:3, :3, j], poses_gt[:, 3, j], self._points[cls_index])
-
-                                if error_new < threshold[cls_index]:
-                                    count_correct_refined[cls_index] += 1
-
-                                error_rotation_icp = re(RT_icp[:3, :3], poses_gt[:3, :3, j])
-                                error_translation_icp = te(RT_icp[:, 3], poses_gt[:, 3, j])
-                                if cls == '024_bowl' or cls == '036_wood_block' or cls == '061_foam_brick':
-                                    error_icp = adi(RT_icp[:3, :3], RT_icp[:, 3], poses_gt[:3, :3, j], poses_gt[:, 3, j], self._points[cls_index])
-                                else:
-                                    error_icp = add(RT_icp[:3, :3], RT_icp[:, 3], poses_gt[:3, :3, j], poses_gt[:, 3, j], self._points[cls_index])
-
-                                if error_icp < threshold[cls_index]:
-                                    count_correct_icp[cls_index] += 1
-
-            '''
-            # label image
-            rgba = cv2.imread(self.image_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            image = rgba[:,:,:3]
-            alpha = rgba[:,:,3]
-            I = np.where(alpha == 0)
-            image[I[0], I[1], :] = 255
-            label_image = self.labels_to_image(image, sg_labels)
-
-            # save image
-            filename = os.path.join(image_dir, '%04d.png' % im_ind)
-            print filename
-            cv2.imwrite(filename, label_image)
-            '''
+        The frames are evaluated in checkpointed shards under output_dir, so
+        a rerun on the same results only reduces the shards.
+        """
+        n_cl = self.num_classes
+
+        # fingerprint of the test results, so that shards of older results are not reused
+        md5 = hashlib.md5()
+        md5.update('{} {} add,rotation,translation,adds'.format(cfg.TEST.POSE_REG, cfg.TEST.POSE_REFINE))
+        if hasattr(segmentations, 'fingerprint'):
+            md5.update(segmentations.fingerprint())
+        else:
+            for seg in segmentations:
+                for key in ('labels', 'rois', 'poses', 'poses_refined', 'poses_icp'):
+                    if key in seg:
+                        md5.update(np.ascontiguousarray(seg[key]).tobytes())
+
+        # evaluate shards of frames in parallel, finished shards are reused on a rerun
+        runner = ShardedRunner(lambda start, end: self._evaluate_frames(segmentations, start, end), \
+            len(self.image_index), cfg.TEST.EVAL_SHARD_SIZE, cfg.TEST.EVAL_WORKERS, \
+            os.path.join(output_dir, 'eval_shards'), md5.hexdigest())
+        shards = runner.run()
+
+        # reduction
+        confusion = ConfusionMatrix(n_cl)
+        count_all = np.zeros((self.num_classes,), dtype=np.float32)
+        for shard in shards:
+            confusion.merge(shard['hist'])
+            count_all += shard['count_all']
+        records = merge_records([shard['records'] for shard in shards])
+        filename = os.path.join(output_dir, 'pose_records.pkl')
+        with open(filename, 'wb') as fid:
+            cPickle.dump(records, fid, cPickle.HIGHEST_PROTOCOL)
+        return confusion, count_all, records
+
+
+    def evaluate_segmentations(self, segmentations, output_dir):
+        print 'evaluating segmentations'
+        n_cl = self.num_classes
+
+        # make image dir
+        image_dir = os.path.join(output_dir, 'images')
+        if not os.path.exists(image_dir):
+            os.makedirs(image_dir)
+
+        confusion, count_all, records = self.evaluate_records(segmentations, output_dir)
+
+        threshold = np.zeros((self.num_classes,), dtype=np.float32)
+        for i in xrange(self.num_classes):
+            threshold[i] = 0.1 * np.linalg.norm(self._extents[i, :])
+        counts = {}
+        for key in ('poses', 'poses_refined', 'poses_icp'):
+            counts[key] = np.zeros((self.num_classes,), dtype=np.float32)
+            if key in records:
+                correct = records[key][:, 0] < threshold[records['cls']]
+                counts[key] += np.bincount(records['cls'][correct], minlength=self.num_classes)
+        count_correct = counts['poses']
+        count_correct_refined = counts['poses_refined']
+        count_correct_icp = counts['poses_icp']
 
         # overall accuracy
+        hist = confusion.hist.astype(np.float64)
         acc = np.diag(hist).sum() / hist.sum()
         print 'overall accuracy', acc
         # per-class accuracy
@@ -679,6 +691,24 @@ class lov(datasets.imdb):
                     print '{} correct poses after ICP: {}, all poses: {}, accuracy: {}'.format( \
                         self.classes[i], count_correct_icp[i], count_all[i], float(count_correct_icp[i]) / float(count_all[i]))
 
+            # accuracy-threshold curves of ADD (ADD-S for symmetric objects) and ADD-S
+            curves = {}
+            for key in ('poses', 'poses_refined', 'poses_icp'):
+                if key not in records:
+                    continue
+                for column, metric in ((0, 'add'), (3, 'adds')):
+                    curves['{}_{}'.format(key, metric)] = pose_curves(records['cls'], records[key][:, column], \
+                        count_all, cfg.TEST.AUC_MAX_THRESHOLD, cfg.TEST.AUC_STEPS)
+            filename = os.path.join(output_dir, 'pose_curves.npz')
+            save_curves(filename, curves)
+            print 'accuracy curves saved to {}'.format(filename)
+
+            for name in sorted(curves.keys()):
+                print '{} AUC'.format(name)
+                for i in xrange(1, self.num_classes):
+                    print '{} {}'.format(self.classes[i], curves[name]['auc'][i])
+                print 'all {}'.format(curves[name]['auc_all'])
+
 
 if __name__ == '__main__':
     d = datasets.lov('train')
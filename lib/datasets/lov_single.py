@@ -11,6 +11,7 @@ import PIL
 import sys
 import scipy
 from fcn.config import cfg
+from utils.confusion import ConfusionMatrix
 from utils.pose_error import *
 from utils.cython_bbox import bbox_overlaps
 from transforms3d.quaternions import quat2mat, mat2quat
@@ -426,20 +427,15 @@ class lov_single(datasets.imdb):
 
         # evaluate segmentation
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
-
-        gt_labels = gt_labels.astype(np.float32)
         sg_labels = segmentation['labels']
-        hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+        iou = ConfusionMatrix(n_cl).add(gt_labels, sg_labels, per_frame=True)
 
         # per-class IU
         print 'per-class segmentation IoU'
-        intersection = np.diag(hist)
-        union = hist.sum(1) + hist.sum(0) - np.diag(hist)
-        index = np.where(union > 0)[0]
+        index = np.where(~np.isnan(iou))[0]
         for i in range(len(index)):
             ind = index[i]
-            print '{} {}'.format(self._classes[ind], intersection[ind] / union[ind])
+            print '{} {}'.format(self._classes[ind], iou[ind])
 
         # evaluate pose
         if cfg.TEST.POSE_REG:
@@ -541,7 +537,7 @@ class lov_single(datasets.imdb):
         print 'evaluating segmentations'
         # compute histogram
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
+        confusion = ConfusionMatrix(n_cl)
 
         # make image dir
         image_dir = os.path.join(output_dir, 'images')
@@ -566,11 +562,11 @@ class lov_single(datasets.imdb):
         for im_ind, index in enumerate(self.image_index):
             # read ground truth labels
             im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = im.astype(np.float32)
+            gt_labels = im
 
             # predicated labels
             sg_labels = segmentations[im_ind]['labels']
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+            confusion.add(gt_labels, sg_labels)
 
             # evaluate pose
             if cfg.TEST.POSE_REG:
@@ -664,6 +660,8 @@ class lov_single(datasets.imdb):
             cv2.imwrite(filename, label_image)
             '''
 
+        hist = confusion.hist.astype(np.float64)
+
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
         print 'overall accuracy', acc
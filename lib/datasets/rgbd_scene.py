@@ -4,6 +4,7 @@ import os
 import datasets
 import datasets.rgbd_scene
 import datasets.imdb
+from utils.confusion import ConfusionMatrix
 import cPickle
 import numpy as np
 import cv2
@@ -213,7 +214,7 @@ class rgbd_scene(datasets.imdb):
         print 'evaluating segmentations'
         # compute histogram
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
+        confusion = ConfusionMatrix(n_cl)
 
         # make image dir
         image_dir = os.path.join(output_dir, 'images')
@@ -230,12 +231,12 @@ class rgbd_scene(datasets.imdb):
         for im_ind, index in enumerate(self.image_index):
             # read ground truth labels
             im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = im.astype(np.float32)
+            gt_labels = im
 
             # predicated labels
             sg_labels = segmentations[im_ind]['labels']
 
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+            confusion.add(gt_labels, sg_labels)
 
             '''
             # label image
@@ -259,6 +260,8 @@ class rgbd_scene(datasets.imdb):
             scipy.io.savemat(filename, labels)
             #'''
 
+        hist = confusion.hist.astype(np.float64)
+
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
         print 'overall accuracy', acc
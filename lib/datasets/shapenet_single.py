@@ -4,6 +4,7 @@ import os
 import datasets
 import datasets.shapenet_single
 import datasets.imdb
+from utils.confusion import ConfusionMatrix
 import cPickle
 import numpy as np
 import cv2
@@ -250,7 +251,7 @@ class shapenet_single(datasets.imdb):
         print 'evaluating segmentations'
         # compute histogram
         n_cl = self.num_classes
-        hist = np.zeros((n_cl, n_cl))
+        confusion = ConfusionMatrix(n_cl)
 
         # make image dir
         image_dir = os.path.join(output_dir, 'images')
@@ -272,7 +273,7 @@ class shapenet_single(datasets.imdb):
             # predicated labels
             sg_labels = segmentations[im_ind]['labels']
 
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+            confusion.add(gt_labels, sg_labels)
 
             """
             # label image
@@ -297,6 +298,8 @@ class shapenet_single(datasets.imdb):
             scipy.io.savemat(filename, labels)
             #"""
 
+        hist = confusion.hist.astype(np.float64)
+
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
         print 'overall accuracy', acc
@@ -30,6 +30,9 @@ cfg = __C
 
 __C.FLIP_X = False
 __C.INPUT = 'RGBD'
+# feed uint8 color and normals and uint16 depth of one channel, vgg16_convs
+# subtracts the means, scales and tiles the depth in the graph
+__C.INPUT_RAW = False
 __C.NETWORK = 'VGG16'
 __C.RIG = ''
 __C.CAD = ''
@@ -37,6 +40,19 @@ __C.POSE = ''
 __C.BACKGROUND = ''
 __C.USE_GPU_NMS = True
 
+# NMS implementation: 'EXT' uses the compiled gpu_nms/cpu_nms extensions,
+# 'PY' uses the batched numpy engine in nms/batch_nms.py (no CUDA needed)
+__C.NMS_BACKEND = 'EXT'
+# 'HARD' for greedy NMS, 'LINEAR' or 'GAUSSIAN' for soft-NMS (PY backend only)
+__C.NMS_METHOD = 'HARD'
+__C.NMS_SIGMA = 0.5
+# Use the precomputed IoU matrix for at most this many boxes
+__C.NMS_MATRIX_MAX = 400
+
+# Normal estimation of the NORMAL input: 'EXT' uses the compiled gpu_normals
+# extension, 'PY' the numpy version in normals/cpu_normals.py (no CUDA needed)
+__C.NORMALS_BACKEND = 'EXT'
+
 # Anchor scales for RPN
 __C.ANCHOR_SCALES = (8,16,32)
 
@@ -62,6 +78,9 @@ __C.TRAIN.VERTEX_REG_3D = False
 __C.TRAIN.LABEL_W = 1.0
 __C.TRAIN.VERTEX_W = 5.0
 __C.TRAIN.VERTEX_W_INSIDE = 10.0
+# queue the vertex targets and weights of the class of each pixel only, (H, W, 3) and (H, W),
+# vgg16_convs expands them to the 3 * num_classes channels with the labels, testing feeds the full layout
+__C.TRAIN.VERTEX_COMPACT = False
 __C.TRAIN.POSE_W = 1.0
 __C.TRAIN.THRESHOLD_LABEL = 1.0
 __C.TRAIN.VOTING_THRESHOLD = -1
@@ -80,17 +99,40 @@ if not os.path.exists(__C.TRAIN.SYNROOT):
     __C.TRAIN.SYNROOT = '/home/yuxiang/Projects/Deep_Pose/data/LOV/data_syn/'
 __C.TRAIN.SYNITER = 0
 __C.TRAIN.SYNNUM = 80000
+# read the offline synthetic frames from the packed shards of tools/generate_synthetic.py in SYNROOT
+__C.TRAIN.SYN_SHARDS = False
+# frames per shard written by tools/generate_synthetic.py
+__C.TRAIN.SYN_SHARD_SIZE = 1000
 __C.TRAIN.SYN_RATIO = 1
 __C.TRAIN.SYN_CLASS_INDEX = 1
 __C.TRAIN.SYN_TNEAR = 0.5
 __C.TRAIN.SYN_TFAR = 2.0
 __C.TRAIN.SYN_SAMPLE_OBJECT = True
 __C.TRAIN.SYN_SAMPLE_POSE = False
+# objects of an online synthetic frame need this many visible pixels
+__C.TRAIN.SYN_MIN_PIXELS = 800
+# sample the online synthetic scenes in python and skip the ones predicted to fail SYN_MIN_PIXELS, see utils/scene_sampler.py
+__C.TRAIN.SYN_PREDICT_VISIBILITY = False
+# a scene is skipped below SYN_VISIBILITY_MARGIN * SYN_MIN_PIXELS predicted pixels
+__C.TRAIN.SYN_VISIBILITY_MARGIN = 0.75
+# the depth order is tested in a z-buffer this many times smaller than the image
+__C.TRAIN.SYN_VISIBILITY_SCALE = 8
+
+# keep the decoded real frames in a LRU cache of this many MB, 0 to decode them every time
+__C.TRAIN.FRAME_CACHE = 0
+# frames evicted from FRAME_CACHE go to a memory mapped file of FRAME_CACHE_SPILL MB, best on a local SSD
+__C.TRAIN.FRAME_CACHE_SPILL_FILE = ''
+__C.TRAIN.FRAME_CACHE_SPILL = 0
+# directory of the normal images of the real and adaptation frames for the NORMAL input, '' to compute them every time
+__C.TRAIN.NORMAL_CACHE = ''
 
 # domain adaptation
 __C.TRAIN.ADAPT = False
 __C.TRAIN.ADAPT_ROOT = ''
 __C.TRAIN.ADAPT_NUM = 400
+# keep the adaptation frames decoded in memory shared by the loader threads, about
+# 1.5 MB per 640x480 frame
+__C.TRAIN.ADAPT_CACHE = True
 __C.TRAIN.ADAPT_RATIO = 1
 __C.TRAIN.ADAPT_WEIGHT = 0.1
 
@@ -131,6 +173,19 @@ __C.TRAIN.SNAPSHOT_INFIX = ''
 
 __C.TRAIN.DISPLAY = 20
 
+# profile the train step with full tracing every this many iterations, 0 for never,
+# writes profile_ops.txt and timeline_iter_*.json to the output directory, see utils.step_profile
+__C.TRAIN.PROFILE_ITERS = 0
+# number of rows of the ranked op tables
+__C.TRAIN.PROFILE_TOP = 30
+
+# capacity of the input queue of vgg16_convs, an element holds a minibatch
+__C.TRAIN.QUEUE_SIZE = 25
+# host memory in MB the queue may take, when > 0 it caps QUEUE_SIZE, see tools/memory_report.py
+__C.TRAIN.QUEUE_MEMORY = 0
+# fraction of the GPU memory reserved by the training session
+__C.TRAIN.GPU_MEMORY_FRACTION = 0.6
+
 # Whether to add ground truth boxes to the pool when sampling regions
 __C.TRAIN.USE_GT = False
 
@@ -215,9 +270,63 @@ __C.TEST.POSE_REFINE = False
 __C.TEST.SYNTHETIC = False
 __C.TEST.VOTING_THRESHOLD = -1
 
+# evaluate the results at the end of test_net_single_frame; a finished result
+# store is evaluated whenever the test is run again
+__C.TEST.EVALUATE = False
+# evaluation: number of processes, 0 evaluates in the caller
+__C.TEST.EVAL_WORKERS = 0
+# number of frames per checkpointed evaluation shard
+__C.TEST.EVAL_SHARD_SIZE = 100
+# write one .mat result file per frame, e.g. for the MATLAB toolbox;
+# the results are also kept in the result store of the output dir
+__C.TEST.SAVE_MAT = True
+# accuracy-threshold curves of ADD and ADD-S: max threshold in meters (also the
+# upper limit of the AUC) and number of thresholds in the grid
+__C.TEST.AUC_MAX_THRESHOLD = 0.1
+__C.TEST.AUC_STEPS = 1000
+
+# ICP refinement: objects are refined one at a time in order of confidence
+# time budget of ICP per frame in seconds, -1 for none
+__C.TEST.ICP_DEADLINE = -1.0
+# ICP error threshold in meters
+__C.TEST.ICP_ERROR_THRESHOLD = 0.01
+# max roi center motion in pixels to reuse the previous refined pose of a video,
+# 0 refines every frame from scratch
+__C.TEST.ICP_TRACK_RADIUS = 0.0
+# converged tracks are refined again after this many skipped frames
+__C.TEST.ICP_TRACK_MAX_SKIP = 10
+
+# Tracking in the ROS listeners: while the segmentation of every tracked
+# object overlaps its previous mask, skip Hough voting and move the poses
+__C.TEST.TRACKING = False
+# min mask IoU with the previous frame to keep tracking
+__C.TEST.TRACK_IOU = 0.7
+# max number of tracked frames before running Hough voting again
+__C.TEST.TRACK_MAX_AGE = 30
+# pixels of an untracked class that trigger Hough voting
+__C.TEST.TRACK_MIN_PIXELS = 500
+
+# latency tracing of the single frame pipeline and the ROS listeners, see utils.trace
+__C.TEST.TRACE = False
+# number of events kept in the ring buffer
+__C.TEST.TRACE_CAPACITY = 65536
+# Chrome trace JSON written at exit and on SIGUSR1, '' for none
+__C.TEST.TRACE_FILE = ''
+
 # Scales to compute real features
 __C.TEST.SCALES_BASE = (0.25, 0.5, 1.0, 2.0, 3.0)
 
+# Cropped inference for a known workspace: '' for the full frame,
+# 'BOX' for the fixed pixel box ROI_BOX, 'DEPTH' for the pixels whose
+# 3D points fall into ROI_WORKSPACE
+__C.TEST.ROI_CROP = ''
+# workspace box in pixels (x1, y1, x2, y2)
+__C.TEST.ROI_BOX = (0, 0, 640, 480)
+# workspace in camera coordinates (xmin, ymin, zmin, xmax, ymax, zmax) in meters
+__C.TEST.ROI_WORKSPACE = (-0.5, -0.5, 0.25, 0.5, 0.5, 1.5)
+# margin in pixels around the crop
+__C.TEST.ROI_MARGIN = 16
+
 # voxel grid size
 __C.TEST.GRID_SIZE = 256
 
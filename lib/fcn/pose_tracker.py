@@ -0,0 +1,148 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Per-object pose tracks across frames.
+
+After a frame with full Hough voting, each detected object becomes a
+track holding its roi, pose and segmentation mask. On the next frames only
+the segmentation is computed. While the mask of every track overlaps its
+previous mask and no untracked object shows up, the tracks are moved by
+the mask motion instead of voting again.
+"""
+
+import numpy as np
+
+class PoseTracker(object):
+
+    def __init__(self, num_classes, iou_threshold=0.7, max_age=30, min_pixels=500, padding=0.25):
+        """
+        Arguments:
+            num_classes (int): number of classes including background
+            iou_threshold (float): min mask IoU with the previous frame to keep tracking
+            max_age (int): max number of tracked frames before voting again
+            min_pixels (int): pixels of an untracked class that count as a new object
+            padding (float): relative padding of the roi where the mask is compared
+        """
+        self.num_classes = num_classes
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_pixels = min_pixels
+        self.padding = padding
+        self.tracks = []
+        self.stats = {'full': 0, 'tracked': 0, 'drift': 0, 'new_object': 0, 'expired': 0}
+
+    def reset(self):
+        self.tracks = []
+
+    def state(self):
+        """Track state as a list of dicts: class, roi, pose, iou and age."""
+        return [{'cls': t['cls'], 'roi': t['roi'].tolist(), 'pose': t['pose'].tolist(), \
+                 'iou': float(t['iou']), 'age': t['age']} for t in self.tracks]
+
+    def _window(self, roi, height, width):
+        w = roi[4] - roi[2]
+        h = roi[5] - roi[3]
+        x1 = int(max(0, np.floor(roi[2] - self.padding * w)))
+        y1 = int(max(0, np.floor(roi[3] - self.padding * h)))
+        x2 = int(min(width, np.ceil(roi[4] + self.padding * w) + 1))
+        y2 = int(min(height, np.ceil(roi[5] + self.padding * h) + 1))
+        return x1, y1, x2, y2
+
+    def update(self, labels, rois, poses):
+        """Start new tracks from a frame with full voting.
+
+        Arguments:
+            labels (ndarray): (H, W) label map
+            rois (ndarray): (N, 7) rois [batch, cls, x1, y1, x2, y2, score]
+            poses (ndarray): (N, 7) poses [quaternion, translation]
+        """
+        height, width = labels.shape
+        self.tracks = []
+        self.stats['full'] += 1
+        for i in xrange(rois.shape[0]):
+            cls = int(rois[i, 1])
+            if cls <= 0 or not np.all(np.isfinite(rois[i, 2:6])):
+                continue
+            x1, y1, x2, y2 = self._window(rois[i], height, width)
+            mask = labels[y1:y2, x1:x2] == cls
+            if not mask.any():
+                continue
+            self.tracks.append({'cls': cls, 'roi': rois[i, :].astype(np.float32), \
+                'pose': poses[i, :7].astype(np.float32), 'window': (x1, y1, x2, y2), \
+                'mask': mask, 'iou': 1.0, 'age': 0})
+
+    def predict(self, labels, fx, fy):
+        """Move the tracks with the segmentation of a new frame.
+
+        Arguments:
+            labels (ndarray): (H, W) label map of the new frame
+            fx, fy (float): focal lengths at the label map resolution
+
+        Returns:
+            rois, poses (ndarray): the moved tracks, or (None, None) when the
+                frame needs full voting
+        """
+        if len(self.tracks) == 0:
+            return None, None
+
+        # a class with enough pixels and no track is a new object
+        counts = np.bincount(labels.ravel(), minlength=self.num_classes)
+        tracked = np.zeros((max(self.num_classes, counts.shape[0]),), dtype=np.bool_)
+        for t in self.tracks:
+            tracked[t['cls']] = True
+        tracked[0] = True
+        if np.any((counts >= self.min_pixels) & ~tracked[:counts.shape[0]]):
+            self.stats['new_object'] += 1
+            return None, None
+
+        height, width = labels.shape
+        moved = []
+        for t in self.tracks:
+            if t['age'] >= self.max_age:
+                self.stats['expired'] += 1
+                return None, None
+            x1, y1, x2, y2 = t['window']
+            mask = labels[y1:y2, x1:x2] == t['cls']
+            union = np.count_nonzero(mask | t['mask'])
+            iou = np.count_nonzero(mask & t['mask']) / float(max(union, 1))
+            if iou < self.iou_threshold:
+                self.stats['drift'] += 1
+                return None, None
+
+            # move the roi and the translation by the mask centroid shift
+            ys, xs = np.nonzero(mask)
+            ys_prev, xs_prev = np.nonzero(t['mask'])
+            du = xs.mean() - xs_prev.mean()
+            dv = ys.mean() - ys_prev.mean()
+            roi = t['roi'].copy()
+            roi[[2, 4]] += du
+            roi[[3, 5]] += dv
+            pose = t['pose'].copy()
+            pose[4] += du * pose[6] / fx
+            pose[5] += dv * pose[6] / fy
+            moved.append((roi, pose, iou))
+
+        rois = np.zeros((len(moved), 7), dtype=np.float32)
+        poses = np.zeros((len(moved), 7), dtype=np.float32)
+        for k, (roi, pose, iou) in enumerate(moved):
+            t = self.tracks[k]
+            x1, y1, x2, y2 = self._window(roi, height, width)
+            t['roi'] = roi
+            t['pose'] = pose
+            t['window'] = (x1, y1, x2, y2)
+            t['mask'] = labels[y1:y2, x1:x2] == t['cls']
+            t['iou'] = iou
+            t['age'] += 1
+            rois[k, :] = roi
+            poses[k, :] = pose
+        self.stats['tracked'] += 1
+        return rois, poses
+
+    def correct(self, poses):
+        """Replace the track poses, e.g. with the output of ICP."""
+        for k, t in enumerate(self.tracks):
+            t['pose'] = poses[k, :7].astype(np.float32)
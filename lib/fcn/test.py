@@ -8,6 +8,7 @@
 """Test a FCN on an imdb (image database)."""
 
 from fcn.config import cfg, get_output_dir
+from fcn.refine_scheduler import RefineScheduler
 import argparse
 from utils.timer import Timer
 from utils.blob import im_list_to_blob, pad_im, unpad_im, add_noise
@@ -16,17 +17,22 @@ from utils.se3 import *
 from utils.pose_error import *
 from utils.bbox_transform import clip_boxes, bbox_transform_inv
 from utils.nms import nms
+from utils.nms_wrapper import py_nms
+from utils.result_store import ResultStore
+from utils.trace import span, begin
+from utils.syn_decode import SynDecoder
 import numpy as np
 import cv2
 import cPickle
 import os
+import shutil
 import math
 import tensorflow as tf
 import time
 from transforms3d.quaternions import quat2mat, mat2quat
 import scipy.io
 from scipy.optimize import minimize
-from normals import gpu_normals
+from utils.normals_wrapper import compute_normals
 from scipy.spatial.distance import cdist
 # from synthesize import synthesizer
 # from pose_estimation import ransac
@@ -57,25 +63,36 @@ def _get_image_blob(im, im_depth, meta_data):
     im_rescale = cv2.resize(im_orig / 127.5 - 1, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
     processed_ims_rescale.append(im_rescale)
 
-    im_orig -= cfg.PIXEL_MEANS
     processed_ims = []
     im_scale_factors = []
     assert len(cfg.TEST.SCALES_BASE) == 1
 
-    im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    if cfg.INPUT_RAW:
+        # uint8 color and uint16 depth, the network subtracts the means and scales the depth
+        color_dtype, depth_dtype, depth_channels = np.uint8, np.uint16, 1
+        im = cv2.resize(im_orig.astype(np.uint8), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    else:
+        color_dtype, depth_dtype, depth_channels = np.float32, np.float32, 3
+        im_orig -= cfg.PIXEL_MEANS
+        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
     im_scale_factors.append(im_scale)
     processed_ims.append(im)
 
     # depth
-    im_orig = im_depth.astype(np.float32, copy=True)
-    # im_orig = im_orig / im_orig.max() * 255
-    im_orig = np.clip(im_orig / 2000.0, 0, 1) * 255
-    if len(im_orig.shape) < 3:
-        im_orig = np.tile(im_orig[:,:,np.newaxis], (1,1,3))
-    im_orig -= cfg.PIXEL_MEANS
-
     processed_ims_depth = []
-    im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    if cfg.INPUT_RAW:
+        # a single uint16 channel, im_list_to_blob keeps one
+        if len(im_depth.shape) == 3:
+            im_depth = im_depth[:, :, 0]
+        im = cv2.resize(im_depth.astype(np.uint16, copy=False), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    else:
+        im_orig = im_depth.astype(np.float32, copy=True)
+        # im_orig = im_orig / im_orig.max() * 255
+        im_orig = np.clip(im_orig / 2000.0, 0, 1) * 255
+        if len(im_orig.shape) < 3:
+            im_orig = np.tile(im_orig[:,:,np.newaxis], (1,1,3))
+        im_orig -= cfg.PIXEL_MEANS
+        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
     processed_ims_depth.append(im)
 
     if cfg.INPUT == 'NORMAL':
@@ -88,37 +105,125 @@ def _get_image_blob(im, im_depth, meta_data):
 
         # normals
         depth = im_depth.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
-        nmap = gpu_normals.gpu_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
+        nmap = compute_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
         im_normal = 127.5 * nmap + 127.5
         im_normal = im_normal.astype(np.uint8)
         im_normal = im_normal[:, :, (2, 1, 0)]
         im_normal = cv2.bilateralFilter(im_normal, 9, 75, 75)
-        im_orig = im_normal.astype(np.float32, copy=True)
-        im_orig -= cfg.PIXEL_MEANS
+        if cfg.INPUT_RAW:
+            im = cv2.resize(im_normal, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        else:
+            im_orig = im_normal.astype(np.float32, copy=True)
+            im_orig -= cfg.PIXEL_MEANS
+            im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
 
         processed_ims_normal = []
-        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims_normal.append(im)
-        blob_normal = im_list_to_blob(processed_ims_normal, 3)
+        blob_normal = im_list_to_blob(processed_ims_normal, 3, color_dtype)
     else:
         blob_normal = []
 
     # Create a blob to hold the input images
-    blob = im_list_to_blob(processed_ims, 3)
+    blob = im_list_to_blob(processed_ims, 3, color_dtype)
     blob_rescale = im_list_to_blob(processed_ims_rescale, 3)
-    blob_depth = im_list_to_blob(processed_ims_depth, 3)
+    blob_depth = im_list_to_blob(processed_ims_depth, depth_channels, depth_dtype)
 
     return blob, blob_rescale, blob_depth, blob_normal, np.array(im_scale_factors)
 
 
+def _get_crop_roi(im_depth, meta_data, voxelizer):
+    """Pixel box (x1, y1, x2, y2) of the workspace following cfg.TEST.ROI_CROP.
+
+    The box is grown by cfg.TEST.ROI_MARGIN and aligned so that it stays a
+    multiple of 16 after scaling by cfg.TEST.SCALES_BASE[0]. Returns None
+    when the full frame should be used.
+    """
+    height = im_depth.shape[0]
+    width = im_depth.shape[1]
+    if cfg.TEST.ROI_CROP == 'BOX':
+        x1, y1, x2, y2 = cfg.TEST.ROI_BOX
+    elif cfg.TEST.ROI_CROP == 'DEPTH':
+        # pixels whose 3D points are inside the workspace, nan for missing depth
+        X = voxelizer.backproject_camera(im_depth, meta_data, reuse=True)
+        w = cfg.TEST.ROI_WORKSPACE
+        with np.errstate(invalid='ignore'):
+            inside = (X[0] >= w[0]) & (X[0] <= w[3]) & (X[1] >= w[1]) & (X[1] <= w[4]) & (X[2] >= w[2]) & (X[2] <= w[5])
+        ys, xs = np.nonzero(inside.reshape((height, width)))
+        if xs.shape[0] == 0:
+            return None
+        x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+    else:
+        return None
+
+    margin = cfg.TEST.ROI_MARGIN
+    step = int(np.ceil(16 / cfg.TEST.SCALES_BASE[0]))
+    x1 = int(max(0, x1 - margin) // step * step)
+    y1 = int(max(0, y1 - margin) // step * step)
+    crop_width = int(np.ceil((min(width, x2 + margin) - x1) / float(step)) * step)
+    crop_height = int(np.ceil((min(height, y2 + margin) - y1) / float(step)) * step)
+    if crop_width >= width and crop_height >= height:
+        return None
+    crop_width = min(crop_width, width)
+    crop_height = min(crop_height, height)
+    x1 = min(x1, (width - crop_width) // step * step)
+    y1 = min(y1, (height - crop_height) // step * step)
+    return x1, y1, x1 + crop_width, y1 + crop_height
+
+
+def _uncrop_outputs(roi, im_scale, height, width, labels, probs, vertex_pred, rois):
+    """Paste the network outputs of a crop into full frame arrays at im_scale."""
+    x1 = int(roi[0] * im_scale)
+    y1 = int(roi[1] * im_scale)
+    height = int(height * im_scale)
+    width = int(width * im_scale)
+    h = labels.shape[0]
+    w = labels.shape[1]
+
+    labels_full = np.zeros((height, width), dtype=labels.dtype)
+    labels_full[y1:y1+h, x1:x1+w] = labels
+    # outside of the crop is background
+    probs_full = np.zeros((height, width, probs.shape[2]), dtype=probs.dtype)
+    probs_full[:, :, 0] = 1
+    probs_full[y1:y1+h, x1:x1+w, :] = probs
+    if len(vertex_pred) > 0:
+        vertex_full = np.zeros((height, width, vertex_pred.shape[2]), dtype=vertex_pred.dtype)
+        vertex_full[y1:y1+h, x1:x1+w, :] = vertex_pred
+        vertex_pred = vertex_full
+    if len(rois) > 0:
+        rois = rois.copy()
+        rois[:, (2, 4)] += x1
+        rois[:, (3, 5)] += y1
+    return labels_full, probs_full, vertex_pred, rois
+
+
 def im_segment_single_frame(sess, net, im, im_depth, meta_data, voxelizer, extents, points, symmetry, num_classes):
     """segment image
+
+    Traced spans: 'preprocess' with 'blob build', 'enqueue', 'sess.run'
+    (including Hough voting, which runs in the graph), 'nms', 'pose combine'
+    and 'postprocess'
     """
 
-    print "segmenting image"
+    preprocess = begin('preprocess')
+
+    # run on the workspace crop, the principal point is moved into the crop
+    # so that Hough voting returns poses in the camera frame as before
+    roi = _get_crop_roi(im_depth, meta_data, voxelizer)
+    if roi is not None:
+        full_height = im_depth.shape[0]
+        full_width = im_depth.shape[1]
+        x1, y1, x2, y2 = roi
+        im = im[y1:y2, x1:x2]
+        im_depth = im_depth[y1:y2, x1:x2]
+        meta_data = dict(meta_data)
+        K = np.array(meta_data['intrinsic_matrix'], dtype=np.float64)
+        K[0, 2] -= x1
+        K[1, 2] -= y1
+        meta_data['intrinsic_matrix'] = K
 
     # compute image blob
-    im_blob, im_rescale_blob, im_depth_blob, im_normal_blob, im_scale_factors = _get_image_blob(im, im_depth, meta_data)
+    with span('blob build'):
+        im_blob, im_rescale_blob, im_depth_blob, im_normal_blob, im_scale_factors = _get_image_blob(im, im_depth, meta_data)
     im_scale = im_scale_factors[0]
     # construct the meta data
     """
@@ -185,43 +290,41 @@ def im_segment_single_frame(sess, net, im, im_depth, meta_data, voxelizer, exten
                          net.meta_data: meta_data_blob, net.extents: extents, net.points: points, net.symmetry: symmetry, net.poses: pose_blob}
         else:
             feed_dict = {net.data: data_blob, net.gt_label_2d: label_blob, net.keep_prob: 1.0}
+    preprocess.end()
 
-    sess.run(net.enqueue_op, feed_dict=feed_dict)
+    with span('enqueue'):
+        sess.run(net.enqueue_op, feed_dict=feed_dict)
 
     if cfg.NETWORK == 'FCN8VGG':
-        labels_2d, probs = sess.run([net.label_2d, net.prob], feed_dict=feed_dict)
+        with span('sess.run'):
+            labels_2d, probs = sess.run([net.label_2d, net.prob], feed_dict=feed_dict)
     else:
         if cfg.TEST.VERTEX_REG_2D:
-            print "test1"
             if cfg.TEST.POSE_REG:
-                print "test2"
-
-                labels_2d, probs, vertex_pred, rois, poses_init, poses_pred = \
-                    sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), \
-                              net.get_output('rois'), net.get_output('poses_init'), net.get_output('poses_tanh')])
+                with span('sess.run'):
+                    labels_2d, probs, vertex_pred, rois, poses_init, poses_pred = \
+                        sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), \
+                                  net.get_output('rois'), net.get_output('poses_init'), net.get_output('poses_tanh')])
 
                 # non-maximum suppression
-                keep = nms(rois, 0.5)
-                rois = rois[keep, :]
-                poses_init = poses_init[keep, :]
-                poses_pred = poses_pred[keep, :]
-                print keep
-                print rois
+                with span('nms'):
+                    keep = nms(rois, 0.5)
+                    rois = rois[keep, :]
+                    poses_init = poses_init[keep, :]
+                    poses_pred = poses_pred[keep, :]
 
                 # combine poses
-                num = rois.shape[0]
-                poses = poses_init
-                for i in xrange(num):
-                    class_id = int(rois[i, 1])
-                    if class_id >= 0:
-                        poses[i, :4] = poses_pred[i, 4*class_id:4*class_id+4]
+                with span('pose combine'):
+                    num = rois.shape[0]
+                    poses = poses_init
+                    for i in xrange(num):
+                        class_id = int(rois[i, 1])
+                        if class_id >= 0:
+                            poses[i, :4] = poses_pred[i, 4*class_id:4*class_id+4]
             else:
-                print "test3"
-
-                labels_2d, probs, vertex_pred, rois, poses = \
-                    sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), net.get_output('rois'), net.get_output('poses_init')])
-                print rois
-                print rois.shape
+                with span('sess.run'):
+                    labels_2d, probs, vertex_pred, rois, poses = \
+                        sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred'), net.get_output('rois'), net.get_output('poses_init')])
                 # non-maximum suppression
                 # keep = nms(rois[:, 2:], 0.5)
                 # rois = rois[keep, :]
@@ -233,19 +336,28 @@ def im_segment_single_frame(sess, net, im, im_depth, meta_data, voxelizer, exten
                 #poses = []
             vertex_pred = vertex_pred[0, :, :, :]
         elif cfg.TEST.VERTEX_REG_3D:
-            labels_2d, probs, vertex_pred = \
-                sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred')])
+            with span('sess.run'):
+                labels_2d, probs, vertex_pred = \
+                    sess.run([net.get_output('label_2d'), net.get_output('prob_normalized'), net.get_output('vertex_pred')])
             rois = []
             poses = []
             vertex_pred = vertex_pred[0, :, :, :]
         else:
-            labels_2d, probs = sess.run([net.get_output('label_2d'), net.get_output('prob_normalized')])
+            with span('sess.run'):
+                labels_2d, probs = sess.run([net.get_output('label_2d'), net.get_output('prob_normalized')])
             vertex_pred = []
             rois = []
             poses = []
 
-    print "done image segmenting"
-    return labels_2d[0,:,:].astype(np.int32), probs[0,:,:,:], vertex_pred, rois, poses
+    postprocess = begin('postprocess')
+    labels_2d = labels_2d[0,:,:].astype(np.int32)
+    probs = probs[0,:,:,:]
+    if roi is not None:
+        labels_2d, probs, vertex_pred, rois = _uncrop_outputs(roi, im_scale, full_height, full_width, \
+            labels_2d, probs, vertex_pred, rois)
+    postprocess.end()
+
+    return labels_2d, probs, vertex_pred, rois, poses
 
 
 def im_segment(sess, net, im, im_depth, state, weights, points, meta_data, voxelizer, pose_world2live, pose_live2world):
@@ -1219,7 +1331,16 @@ def test_net_single_frame(sess, net, imdb, weights_filename, model_filename):
         num_images = cfg.TRAIN.SYNNUM
     else:
         num_images = len(imdb.image_index)
-    segmentations = [[] for _ in xrange(num_images)]
+
+    # results are appended frame by frame, a finished store is only evaluated
+    columns = ['rois', 'poses', 'poses_refined', 'poses_icp']
+    if not cfg.TEST.VERTEX_REG_2D:
+        columns += ['rois_rgb', 'poses_rgb']
+    segmentations = ResultStore(os.path.join(output_dir, 'results'), columns)
+    if len(segmentations) >= num_images:
+        if not cfg.TEST.SYNTHETIC:
+            imdb.evaluate_segmentations(segmentations, output_dir)
+        return
 
     # timers
     _t = {'im_segment' : Timer(), 'misc' : Timer()}
@@ -1258,6 +1379,10 @@ def test_net_single_frame(sess, net, imdb, weights_filename, model_filename):
 
     for i in perm:
 
+        # already written by an interrupted run
+        if i in segmentations:
+            continue
+
         if cfg.TEST.SYNTHETIC:
             # rgba
             filename = cfg.TRAIN.SYNROOT + '{:06d}-color.png'.format(i)
@@ -1473,7 +1598,7 @@ def test_net_single_frame(sess, net, imdb, weights_filename, model_filename):
             seg = {'labels': labels_new, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
         else:
             seg = {'labels': labels_new, 'rois_rgb': rois_rgb, 'poses_rgb': poses_rgb, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
-        segmentations[i] = seg
+        segmentations.append(i, seg)
         _t['misc'].toc()
 
         print 'im_segment: {:d}/{:d} {:.3f}s {:.3f}s' \
@@ -1507,14 +1632,9 @@ def test_net_single_frame(sess, net, imdb, weights_filename, model_filename):
             else:
                 vis_segmentations(im, im_depth, im_label, im_label_gt, imdb._class_colors)
 
-    '''
-    seg_file = os.path.join(output_dir, 'segmentations.pkl')
-    with open(seg_file, 'wb') as f:
-        cPickle.dump(segmentations, f, cPickle.HIGHEST_PROTOCOL)
-
     # evaluation
-    imdb.evaluate_segmentations(segmentations, output_dir)
-    '''
+    if cfg.TEST.EVALUATE and not cfg.TEST.SYNTHETIC:
+        imdb.evaluate_segmentations(segmentations, output_dir)
 
 ########################
 # test detection network
@@ -1636,32 +1756,27 @@ def test_net_detection(sess, net, imdb, weights_filename):
 
         _t['misc'].tic()
 
-        # skip j = 0, because it's the background class
-        all_dets = np.zeros((0, 6), dtype=np.float32)
-        all_poses = np.zeros((0, 7), dtype=np.float32)
+        # one class-aware NMS call over all classes, skip j = 0 (background)
         thresh = 0.02
-        for j in range(1, imdb.num_classes):
-            inds = np.where(scores[:, j] > thresh)[0]
-            cls_scores = scores[inds, j]
-            cls_boxes = boxes[inds, j*4:(j+1)*4]
-            cls_poses = poses[inds, j*4:(j+1)*4]
-            cls_dets = np.hstack((cls_boxes, cls_scores[:, np.newaxis])).astype(np.float32, copy=False)
-            keep = nms(cls_dets, cfg.TEST.NMS)
-            # only take the first one
-            if len(keep) > 1:
-                keep = [keep[0]]
-            cls_dets = cls_dets[keep, :]
-            cls_poses = cls_poses[keep, :]
-
-            num = cls_dets.shape[0]
-            if num > 0:
-                cls = j * np.ones((num, 1), dtype=np.float32)
-                cls_dets = np.hstack((cls, cls_dets))
-                all_dets = np.vstack((all_dets, cls_dets))
-
-                translation = np.zeros((num, 3), dtype=np.float32)
-                cls_poses = np.hstack((cls_poses, translation))
-                all_poses = np.vstack((all_poses, cls_poses))
+        inds, cls_inds = np.where(scores[:, 1:] > thresh)
+        cls_inds += 1
+        num_rois = boxes.shape[0]
+        cls_boxes = boxes.reshape((num_rois, -1, 4))[inds, cls_inds, :]
+        cls_scores = scores[inds, cls_inds]
+        cls_poses = poses.reshape((num_rois, -1, 4))[inds, cls_inds, :]
+        keep, keep_scores = py_nms(cls_boxes, cls_scores, cfg.TEST.NMS, classes=cls_inds)
+        # only take the first one of each class
+        _, first = np.unique(cls_inds[keep], return_index=True)
+        keep = keep[first]
+        keep_scores = keep_scores[first]
+
+        num = len(keep)
+        all_dets = np.zeros((num, 6), dtype=np.float32)
+        all_dets[:, 0] = cls_inds[keep]
+        all_dets[:, 1:5] = cls_boxes[keep, :]
+        all_dets[:, 5] = keep_scores
+        all_poses = np.zeros((num, 7), dtype=np.float32)
+        all_poses[:, :4] = cls_poses[keep, :]
 
         all_poses = compute_translations(all_dets, all_poses, imdb._points_all, meta_data['intrinsic_matrix'])
 
@@ -1887,7 +2002,12 @@ def test_net_images(sess, net, imdb, weights_filename, rgb_filenames, depth_file
         os.makedirs(output_dir)
 
     num_images = len(rgb_filenames)
-    segmentations = [[] for _ in xrange(num_images)]
+
+    # results of an earlier run are replaced, like the .mat files
+    result_dir = os.path.join(output_dir, 'results')
+    if os.path.exists(result_dir):
+        shutil.rmtree(result_dir)
+    segmentations = ResultStore(result_dir)
 
     # timers
     _t = {'im_segment' : Timer(), 'misc' : Timer()}
@@ -1917,6 +2037,10 @@ def test_net_images(sess, net, imdb, weights_filename, rgb_filenames, depth_file
         synthesizer.setup(cfg.TRAIN.SYN_WIDTH, cfg.TRAIN.SYN_HEIGHT)
         print "synthesizer setup done"
 
+        # the images are not frames of a video, no tracks between them
+        refiner = RefineScheduler(synthesizer, imdb._points_all, \
+            cfg.TEST.ICP_DEADLINE, cfg.TEST.ICP_ERROR_THRESHOLD, track_radius=0)
+
     for i in perm:
 
         # read color image
@@ -1962,7 +2086,6 @@ def test_net_images(sess, net, imdb, weights_filename, rgb_filenames, depth_file
                 zfar = 6.0
                 poses_new = np.zeros((poses.shape[0], 7), dtype=np.float32)
                 poses_icp = np.zeros((poses.shape[0], 7), dtype=np.float32)
-                error_threshold = 0.01
                 if cfg.TEST.POSE_REFINE:
                     print "refining pose 2"
                     labels_icp = labels.copy();
@@ -1983,19 +2106,14 @@ def test_net_images(sess, net, imdb, weights_filename, rgb_filenames, depth_file
                     parameters[5] = zfar
                     parameters[6] = factor
 
-                    height = labels_icp.shape[0]
-                    width = labels_icp.shape[1]
-                    num_roi = rois_icp.shape[0]
-                    channel_roi = rois_icp.shape[1]
-                    synthesizer.icp_python(labels_icp, im_depth, parameters, height, width, num_roi, channel_roi, \
-                                           rois_icp, poses, poses_new, poses_icp, error_threshold)
+                    poses_new, poses_icp = refiner.refine(labels_icp, im_depth, parameters, rois_icp, poses)
 
         _t['im_segment'].toc()
 
         _t['misc'].tic()
         labels_new = cv2.resize(labels, None, None, fx=1.0/im_scale, fy=1.0/im_scale, interpolation=cv2.INTER_NEAREST)
         seg = {'labels': labels_new, 'rois': rois, 'poses': poses, 'poses_refined': poses_new, 'poses_icp': poses_icp}
-        segmentations[i] = seg
+        segmentations.append(i, seg)
         _t['misc'].toc()
 
         print 'im_segment: {:d}/{:d} {:.3f}s {:.3f}s' \
@@ -2042,10 +2160,9 @@ def _render_synthetic_image(SYN, num_classes, backgrounds, intrinsic_matrix):
     im_syn = im_syn[::-1, :, :]
     depth_syn = depth_syn[::-1, :]
 
-    # convert depth
-    im_depth_raw = 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
-    I = np.where(depth_syn == 1)
-    im_depth_raw[I[0], I[1]] = 0
+    # convert depth in meters
+    decoder = SynDecoder(height, width, znear, zfar, 1.0)
+    im_depth_raw = decoder.depth(depth_syn, dtype=np.float32)
 
     # add background
     alpha = im_syn[:,:,3]
@@ -2054,8 +2171,7 @@ def _render_synthetic_image(SYN, num_classes, backgrounds, intrinsic_matrix):
     im = im_syn[:, :, :3]
 
     # compute labels from vertmap
-    label = np.round(vertmap_syn[:, :, 0]) + 1
-    label[np.isnan(label)] = 0
+    label = decoder.label(vertmap_syn)
 
     entry = {'image': im_syn[:,:,:3],
              'label' : label,
@@ -11,7 +11,9 @@ from fcn.config import cfg
 from gt_data_layer.layer import GtDataLayer
 from gt_single_data_layer.layer import GtSingleDataLayer
 from gt_synthesize_layer.layer import GtSynthesizeLayer
+from gt_synthesize_layer.minibatch import get_frame_cache
 from utils.timer import Timer
+from utils.step_profile import StepProfiler
 import numpy as np
 import os
 import tensorflow as tf
@@ -133,6 +135,7 @@ class SolverWrapper(object):
 
             if (iter+1) % (10 * cfg.TRAIN.DISPLAY) == 0:
                 print 'speed: {:.3f}s / iter'.format(timer.average_time)
+                print_frame_cache()
 
             if (iter+1) % cfg.TRAIN.SNAPSHOT_ITERS == 0:
                 last_snapshot_iter = iter
@@ -190,6 +193,7 @@ class SolverWrapper(object):
 
             if (iter+1) % (10 * cfg.TRAIN.DISPLAY) == 0:
                 print 'speed: {:.3f}s / iter'.format(timer.average_time)
+                print_frame_cache()
 
             if (iter+1) % cfg.TRAIN.SNAPSHOT_ITERS == 0:
                 last_snapshot_iter = iter
@@ -233,20 +237,26 @@ class SolverWrapper(object):
 
         # tf.train.write_graph(sess.graph_def, self.output_dir, 'model.pbtxt')
 
+        profiler = StepProfiler(sess.graph, self.output_dir, cfg.TRAIN.PROFILE_ITERS, cfg.TRAIN.PROFILE_TOP)
         last_snapshot_iter = -1
         timer = Timer()
         for iter in range(max_iters):
 
+            run_options, run_metadata = profiler.options(iter)
             timer.tic()
-            loss_value, loss_cls_value, loss_vertex_value, loss_pose_value, lr, _ = sess.run([loss, loss_cls, loss_vertex, loss_pose, learning_rate, train_op])
+            loss_value, loss_cls_value, loss_vertex_value, loss_pose_value, lr, _ = sess.run([loss, loss_cls, loss_vertex, loss_pose, learning_rate, train_op], \
+                options=run_options, run_metadata=run_metadata)
             # train_writer.add_summary(summary, iter)
             timer.toc()
+            if run_metadata is not None:
+                profiler.add(run_metadata, iter)
 
             print 'iter: %d / %d, loss: %.4f, loss_cls: %.4f, loss_vertex: %.4f, loss_pose: %.4f, lr: %.8f,  time: %.2f' %\
                     (iter+1, max_iters, loss_value, loss_cls_value, loss_vertex_value, loss_pose_value, lr, timer.diff)
 
             if (iter+1) % (10 * cfg.TRAIN.DISPLAY) == 0:
                 print 'speed: {:.3f}s / iter'.format(timer.average_time)
+                print_frame_cache()
 
             if (iter+1) % cfg.TRAIN.SNAPSHOT_ITERS == 0:
                 last_snapshot_iter = iter
@@ -301,6 +311,7 @@ class SolverWrapper(object):
 
             if (iter+1) % (10 * cfg.TRAIN.DISPLAY) == 0:
                 print 'speed: {:.3f}s / iter'.format(timer.average_time)
+                print_frame_cache()
 
             if (iter+1) % cfg.TRAIN.SNAPSHOT_ITERS == 0:
                 last_snapshot_iter = iter
@@ -357,6 +368,7 @@ class SolverWrapper(object):
 
             if (iter+1) % (10 * cfg.TRAIN.DISPLAY) == 0:
                 print 'speed: {:.3f}s / iter'.format(timer.average_time)
+                print_frame_cache()
 
             if (iter+1) % cfg.TRAIN.SNAPSHOT_ITERS == 0:
                 last_snapshot_iter = iter
@@ -380,6 +392,12 @@ def get_training_roidb(imdb):
     return imdb.roidb
 
 
+def print_frame_cache():
+    frame_cache = get_frame_cache()
+    if frame_cache is not None:
+        print 'frame cache: ' + frame_cache.summary()
+
+
 def load_and_enqueue(sess, net, data_layer, coord):
 
     iter = 0
@@ -538,7 +556,7 @@ def train_net(network, imdb, roidb, output_dir, pretrained_model=None, pretraine
     #config.gpu_options.per_process_gpu_memory_fraction = 0.85
     #config.gpu_options.allow_growth = True
     #with tf.Session(config=config) as sess:
-    gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=0.6, allow_growth=True)
+    gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=cfg.TRAIN.GPU_MEMORY_FRACTION, allow_growth=True)
     with tf.Session(config=tf.ConfigProto(allow_soft_placement=True, gpu_options=gpu_options)) as sess:
 
         # data layer
@@ -15,7 +15,7 @@ from fcn.config import cfg
 from utils.blob import im_list_to_blob, pad_im, chromatic_transform
 from utils.se3 import *
 import scipy.io
-from normals import gpu_normals
+from utils.normals_wrapper import compute_normals
 
 def get_minibatch(roidb, voxelizer):
     """Given a roidb, construct a minibatch sampled from it."""
@@ -125,7 +125,7 @@ def _get_image_blob(roidb, scale_ind):
 
         # normals
         depth = im_depth_raw.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
-        nmap = gpu_normals.gpu_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
+        nmap = compute_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
         im_normal = 127.5 * nmap + 127.5
         im_normal = im_normal.astype(np.uint8)
         im_normal = im_normal[:, :, (2, 1, 0)]
@@ -205,7 +205,7 @@ def _get_label_blob(roidb, voxelizer):
 
         # voxelization
         if i % cfg.TRAIN.NUM_STEPS == 0:
-            points = voxelizer.backproject_camera(im_depth, meta_data)
+            points = voxelizer.backproject_camera(im_depth, meta_data, reuse=True)
             voxelizer.voxelized = False
             voxelizer.voxelize(points)
             # store the RT for the first frame
@@ -15,7 +15,7 @@ from fcn.config import cfg
 from utils.blob import im_list_to_blob, pad_im, chromatic_transform
 from utils.se3 import *
 import scipy.io
-from normals import gpu_normals
+from utils.normals_wrapper import compute_normals
 from transforms3d.quaternions import mat2quat, quat2mat
 
 
@@ -126,7 +126,7 @@ def _get_image_blob(roidb, scale_ind):
 
         # normals
         depth = im_depth_raw.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
-        nmap = gpu_normals.gpu_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
+        nmap = compute_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
         im_normal = 127.5 * nmap + 127.5
         im_normal = im_normal.astype(np.uint8)
         im_normal = im_normal[:, :, (2, 1, 0)]
@@ -9,7 +9,7 @@
 """
 
 from fcn.config import cfg
-from gt_synthesize_layer.minibatch import get_minibatch
+from gt_synthesize_layer.minibatch import get_minibatch, get_adapt_cache, get_syn_shards
 import numpy as np
 import cv2
 from utils.blob import pad_im
@@ -36,6 +36,11 @@ class GtSynthesizeLayer(object):
         self._build_background_images()
         self._build_background_depth_images()
         self._read_camera_parameters()
+        if cfg.TRAIN.ADAPT and cfg.TRAIN.ADAPT_CACHE:
+            get_adapt_cache()
+        if cfg.TRAIN.SYNTHESIZE and cfg.TRAIN.SYN_SHARDS and not cfg.TRAIN.SYN_ONLINE:
+            # raise about missing frames here, not in a loader thread
+            get_syn_shards()
 
     def _shuffle_roidb_inds(self):
         """Randomly permute the training roidb."""
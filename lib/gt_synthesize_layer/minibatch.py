@@ -17,9 +17,104 @@ from fcn.config import cfg
 from utils.blob import im_list_to_blob, pad_im, chromatic_transform, add_noise
 from utils.se3 import *
 import scipy.io
-from normals import gpu_normals
+from utils.normals_wrapper import compute_normals
 from transforms3d.quaternions import mat2quat, quat2mat
 from utils.timer import Timer
+from utils.syn_shards import SynShards
+from utils.adapt_cache import AdaptCache, load_adapt_frame
+from utils.frame_cache import FrameCache
+from utils.normal_cache import NormalCache
+
+_syn_shards = None
+_adapt_cache = None
+_frame_cache = None
+_normal_cache = None
+
+def get_syn_shards():
+    """Packed shards of the offline synthetic frames in cfg.TRAIN.SYNROOT, opened and checked on first use."""
+    global _syn_shards
+    if _syn_shards is None:
+        shards = SynShards(cfg.TRAIN.SYNROOT)
+        # the layer samples frames from range(cfg.TRAIN.SYNNUM)
+        missing = shards.missing(cfg.TRAIN.SYNNUM)
+        if len(missing) > 0:
+            raise ValueError('cfg.TRAIN.SYNNUM is {} but {} of these frames, the first one {}, are not in the shards ' \
+                             'of {} ({} frames), run tools/generate_synthetic.py with --num {} or lower TRAIN.SYNNUM' \
+                             .format(cfg.TRAIN.SYNNUM, len(missing), missing[0], cfg.TRAIN.SYNROOT, len(shards), cfg.TRAIN.SYNNUM))
+        _syn_shards = shards
+    return _syn_shards
+
+def get_adapt_cache():
+    """Cache of the decoded frames in cfg.TRAIN.ADAPT_ROOT, shared by the loader threads."""
+    global _adapt_cache
+    if _adapt_cache is None:
+        _adapt_cache = AdaptCache(cfg.TRAIN.ADAPT_ROOT, cfg.TRAIN.ADAPT_NUM)
+    return _adapt_cache
+
+def _get_adapt_frame(index):
+    if cfg.TRAIN.ADAPT_CACHE:
+        return get_adapt_cache().get(index)
+    return load_adapt_frame(cfg.TRAIN.ADAPT_ROOT, index)
+
+def get_frame_cache():
+    """Cache of the decoded real frames if cfg.TRAIN.FRAME_CACHE is set, None otherwise."""
+    global _frame_cache
+    if _frame_cache is None and cfg.TRAIN.FRAME_CACHE > 0:
+        _frame_cache = FrameCache(cfg.TRAIN.FRAME_CACHE * 1048576, cfg.TRAIN.FRAME_CACHE_SPILL_FILE, \
+                                  cfg.TRAIN.FRAME_CACHE_SPILL * 1048576)
+    return _frame_cache
+
+def _load_color(filename):
+    # rgba with the pixels of alpha 0 set to 0
+    rgba = pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)
+    if rgba.shape[2] == 4:
+        im = np.copy(rgba[:,:,:3])
+        alpha = rgba[:,:,3]
+        I = np.where(alpha == 0)
+        im[I[0], I[1], :] = 0
+    else:
+        im = rgba
+    return {'color': im}
+
+def _load_depth(filename):
+    return {'depth': pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)}
+
+def _load_label(filename):
+    return {'label': pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)}
+
+def _load_meta(filename):
+    meta_data = scipy.io.loadmat(filename)
+    return dict((key, value) for key, value in meta_data.iteritems() \
+                if not key.startswith('__') and isinstance(value, np.ndarray) and value.dtype != np.object)
+
+_frame_loaders = {'color': _load_color, 'depth': _load_depth, 'label': _load_label, 'meta': _load_meta}
+
+def _read_frame(kind, filename):
+    """Decoded color, depth or label image or meta data of a real frame, read-only if cached."""
+    cache = get_frame_cache()
+    if kind == 'meta':
+        if cache is None:
+            return scipy.io.loadmat(filename)
+        # the label blob changes the meta data in place
+        return dict((key, value.copy()) for key, value in cache.get(kind, filename, _load_meta).iteritems())
+    if cache is None:
+        return _frame_loaders[kind](filename)[kind]
+    return cache.get(kind, filename, _frame_loaders[kind])[kind]
+
+def get_normal_cache():
+    """Cache of the normal images in cfg.TRAIN.NORMAL_CACHE if it is set, None otherwise."""
+    global _normal_cache
+    if _normal_cache is None and cfg.TRAIN.NORMAL_CACHE:
+        _normal_cache = NormalCache(cfg.TRAIN.NORMAL_CACHE)
+    return _normal_cache
+
+def _normal_image(im_depth_raw, fx, fy, cx, cy):
+    depth = im_depth_raw.astype(np.float32, copy=True) / 1000.0
+    nmap = compute_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
+    im_normal = 127.5 * nmap + 127.5
+    im_normal = im_normal.astype(np.uint8)
+    im_normal = im_normal[:, :, (2, 1, 0)]
+    return cv2.bilateralFilter(im_normal, 9, 75, 75)
 
 def get_minibatch(roidb, extents, points, symmetry, num_classes, backgrounds, intrinsic_matrix, \
     data_queue, db_inds_syn, is_syn, db_inds_adapt, is_adapt, is_symmetric):
@@ -94,21 +189,8 @@ def _get_image_blob(roidb, scale_ind, num_classes, backgrounds, intrinsic_matrix
     for i in xrange(num_images):
 
         if is_adapt:
-            if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD' or cfg.INPUT == 'NORMAL':
-                # depth raw
-                filename = cfg.TRAIN.ADAPT_ROOT + '{:06d}-depth.png'.format(db_inds_adapt[i])
-                im_depth_raw = pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)
-
-            # rgba
-            filename = cfg.TRAIN.ADAPT_ROOT + '{:06d}-color.png'.format(db_inds_adapt[i])
-            rgba = pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)
-            if rgba.shape[2] == 4:
-                im = np.copy(rgba[:,:,:3])
-                alpha = rgba[:,:,3]
-                I = np.where(alpha == 0)
-                im[I[0], I[1], :] = 0
-            else:
-                im = rgba
+            # color with the background set to 0 and raw depth, read-only when cached
+            im, im_depth_raw = _get_adapt_frame(db_inds_adapt[i])
         else:
             if is_syn:
                 if cfg.TRAIN.SYN_ONLINE:
@@ -117,6 +199,11 @@ def _get_image_blob(roidb, scale_ind, num_classes, backgrounds, intrinsic_matrix
                     if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD' or cfg.INPUT == 'NORMAL':
                         im_depth_raw = pad_im(data['depth'], 16)
                     rgba = pad_im(data['image'], 16)
+                elif cfg.TRAIN.SYN_SHARDS:
+                    data = get_syn_shards().read(db_inds_syn[i], ('color', 'depth'))
+                    if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD' or cfg.INPUT == 'NORMAL':
+                        im_depth_raw = pad_im(data['depth'], 16)
+                    rgba = pad_im(data['color'], 16)
                 else:
                     if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD' or cfg.INPUT == 'NORMAL':
                         # depth raw
@@ -155,17 +242,10 @@ def _get_image_blob(roidb, scale_ind, num_classes, backgrounds, intrinsic_matrix
             else:
                 if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD' or cfg.INPUT == 'NORMAL':
                     # depth raw
-                    im_depth_raw = pad_im(cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED), 16)
-
-                # rgba
-                rgba = pad_im(cv2.imread(roidb[i]['image'], cv2.IMREAD_UNCHANGED), 16)
-                if rgba.shape[2] == 4:
-                    im = np.copy(rgba[:,:,:3])
-                    alpha = rgba[:,:,3]
-                    I = np.where(alpha == 0)
-                    im[I[0], I[1], :] = 0
-                else:
-                    im = rgba
+                    im_depth_raw = _read_frame('depth', roidb[i]['depth'])
+
+                # rgba with the background set to 0
+                im = _read_frame('color', roidb[i]['image'])
 
         # chromatic transform
         if cfg.TRAIN.CHROMATIC:
@@ -177,15 +257,35 @@ def _get_image_blob(roidb, scale_ind, num_classes, backgrounds, intrinsic_matrix
         if roidb[i]['flipped']:
             im = im[:, ::-1, :]
 
-        im_orig = im.astype(np.float32, copy=True)
-        im_orig -= cfg.PIXEL_MEANS
         im_scale = cfg.TRAIN.SCALES_BASE[scale_ind]
-        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        if cfg.INPUT_RAW:
+            # uint8, the network subtracts the means
+            if im.dtype != np.uint8:
+                im = np.round(im).astype(np.uint8)
+            im = cv2.resize(np.ascontiguousarray(im), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        else:
+            im_orig = im.astype(np.float32, copy=True)
+            im_orig -= cfg.PIXEL_MEANS
+            im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         im_scales.append(im_scale)
         processed_ims.append(im)
 
         # depth
-        if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD':
+        if (cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD') and cfg.INPUT_RAW:
+            # uint16, the network scales by the maximum, tiles and subtracts the means
+            im_depth = im_depth_raw
+            if cfg.TRAIN.ADD_NOISE:
+                # the noise of the scaled depth in depth units
+                scale = max(float(im_depth_raw.max()), 1.0) / 255
+                im_depth = add_noise(im_depth_raw[:, :, np.newaxis] / scale) * scale
+                im_depth = np.round(im_depth).reshape(im_depth_raw.shape).astype(np.uint16)
+
+            if roidb[i]['flipped']:
+                im_depth = im_depth[:, ::-1]
+
+            im_depth = cv2.resize(np.ascontiguousarray(im_depth), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            processed_ims_depth.append(im_depth)
+        elif cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD':
             im_depth = im_depth_raw.astype(np.float32, copy=True) / float(im_depth_raw.max()) * 255
             im_depth = np.tile(im_depth[:,:,np.newaxis], (1,1,3))
 
@@ -202,34 +302,48 @@ def _get_image_blob(roidb, scale_ind, num_classes, backgrounds, intrinsic_matrix
 
         # normals
         if cfg.INPUT == 'NORMAL':
-            depth = im_depth_raw.astype(np.float32, copy=True) / 1000.0
             fx = intrinsic_matrix[0, 0] * im_scale
             fy = intrinsic_matrix[1, 1] * im_scale
             cx = intrinsic_matrix[0, 2] * im_scale
             cy = intrinsic_matrix[1, 2] * im_scale
-            nmap = gpu_normals.gpu_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
-            im_normal = 127.5 * nmap + 127.5
-            im_normal = im_normal.astype(np.uint8)
-            im_normal = im_normal[:, :, (2, 1, 0)]
-            im_normal = cv2.bilateralFilter(im_normal, 9, 75, 75)
+            # synthetic depth has a random background, only the depth files are cached
+            if is_adapt:
+                filename = cfg.TRAIN.ADAPT_ROOT + '{:06d}-depth.png'.format(db_inds_adapt[i])
+            elif not is_syn:
+                filename = roidb[i]['depth']
+            else:
+                filename = None
+            normal_cache = get_normal_cache()
+            if normal_cache is not None and filename is not None:
+                im_normal = normal_cache.get(filename, (fx, fy, cx, cy), \
+                    lambda: _normal_image(im_depth_raw, fx, fy, cx, cy))
+            else:
+                im_normal = _normal_image(im_depth_raw, fx, fy, cx, cy)
             if roidb[i]['flipped']:
                 im_normal = im_normal[:, ::-1, :]
 
-            im_orig = im_normal.astype(np.float32, copy=True)
-            im_orig -= cfg.PIXEL_MEANS
-            im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            if cfg.INPUT_RAW:
+                im_normal = cv2.resize(np.ascontiguousarray(im_normal), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            else:
+                im_orig = im_normal.astype(np.float32, copy=True)
+                im_orig -= cfg.PIXEL_MEANS
+                im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
             processed_ims_normal.append(im_normal)
 
     # Create a blob to hold the input images
-    blob = im_list_to_blob(processed_ims, 3)
+    if cfg.INPUT_RAW:
+        color_dtype, depth_dtype, depth_channels = np.uint8, np.uint16, 1
+    else:
+        color_dtype, depth_dtype, depth_channels = np.float32, np.float32, 3
+    blob = im_list_to_blob(processed_ims, 3, color_dtype)
 
     if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD':
-        blob_depth = im_list_to_blob(processed_ims_depth, 3)
+        blob_depth = im_list_to_blob(processed_ims_depth, depth_channels, depth_dtype)
     else:
         blob_depth = []
 
     if cfg.INPUT == 'NORMAL':
-        blob_normal = im_list_to_blob(processed_ims_normal, 3)
+        blob_normal = im_list_to_blob(processed_ims_normal, 3, color_dtype)
     else:
         blob_normal = []
 
@@ -275,7 +389,12 @@ def _get_label_blob(roidb, intrinsic_matrix, data_out, num_classes, db_inds_syn,
     processed_depth = []
     processed_label = []
     processed_meta_data = []
-    if cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D:
+    if (cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D) and cfg.TRAIN.VERTEX_COMPACT:
+        # the targets of the class of each pixel, the network expands them with the label blob
+        vertex_target_blob = np.zeros((num_images, blob_height, blob_width, 3), dtype=np.float32)
+        vertex_weight_blob = np.zeros((num_images, blob_height, blob_width), dtype=np.float32)
+        pose_blob = np.zeros((0, 13), dtype=np.float32)
+    elif cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D:
         vertex_target_blob = np.zeros((num_images, blob_height, blob_width, 3 * num_classes), dtype=np.float32)
         vertex_weight_blob = np.zeros((num_images, blob_height, blob_width, 3 * num_classes), dtype=np.float32)
         pose_blob = np.zeros((0, 13), dtype=np.float32)
@@ -301,8 +420,7 @@ def _get_label_blob(roidb, intrinsic_matrix, data_out, num_classes, db_inds_syn,
         im_scale = im_scales[i]
 
         if is_adapt:
-            filename = cfg.TRAIN.ADAPT_ROOT + '{:06d}-depth.png'.format(db_inds_adapt[i])
-            im_depth = pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)
+            _, im_depth = _get_adapt_frame(db_inds_adapt[i])
             meta_data = dict({'intrinsic_matrix': intrinsic_matrix, 'factor_depth': 1000.0})
         else:
             if is_syn:
@@ -311,6 +429,12 @@ def _get_label_blob(roidb, intrinsic_matrix, data_out, num_classes, db_inds_syn,
                     meta_data['cls_indexes'] = meta_data['cls_indexes'].flatten()
                     im_depth = pad_im(data_out[i]['depth'], 16)
                     im = pad_im(data_out[i]['label'], 16)
+                elif cfg.TRAIN.SYN_SHARDS:
+                    data = get_syn_shards().read(db_inds_syn[i], ('depth', 'label', 'meta'))
+                    meta_data = data['meta']
+                    meta_data['cls_indexes'] = meta_data['cls_indexes'].flatten()
+                    im_depth = pad_im(data['depth'], 16)
+                    im = pad_im(data['label'], 16)
                 else:
                     filename = cfg.TRAIN.SYNROOT + '{:06d}-meta.mat'.format(db_inds_syn[i])
                     meta_data = scipy.io.loadmat(filename)
@@ -323,21 +447,22 @@ def _get_label_blob(roidb, intrinsic_matrix, data_out, num_classes, db_inds_syn,
                     filename = cfg.TRAIN.SYNROOT + '{:06d}-label.png'.format(db_inds_syn[i])
                     im = pad_im(cv2.imread(filename, cv2.IMREAD_UNCHANGED), 16)
             else:
-                meta_data = scipy.io.loadmat(roidb[i]['meta_data'])
+                meta_data = _read_frame('meta', roidb[i]['meta_data'])
                 meta_data['cls_indexes'] = meta_data['cls_indexes'].flatten()
                 if os.path.exists(roidb[i]['depth']):
-                    im_depth = pad_im(cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED), 16)
+                    im_depth = _read_frame('depth', roidb[i]['depth'])
                 else:
                     im_depth = np.zeros((blob_height, blob_width), dtype=np.float32)
 
                 # read label image
-                im = pad_im(cv2.imread(roidb[i]['label'], cv2.IMREAD_UNCHANGED), 16)
+                im = _read_frame('label', roidb[i]['label'])
 
             height = im_depth.shape[0]
             width = im_depth.shape[1]
 
             # mask the label image according to depth
             if cfg.INPUT == 'DEPTH':
+                im = im.copy()
                 I = np.where(im_depth == 0)
                 if len(im.shape) == 2:
                     im[I[0], I[1]] = 0
@@ -431,10 +556,10 @@ def _get_label_blob(roidb, intrinsic_matrix, data_out, num_classes, db_inds_syn,
                     is_multi_instances = 0
                     mask = []
 
-                vertex_target_blob[i,:,:,:], vertex_weight_blob[i,:,:,:] = \
+                vertex_target_blob[i], vertex_weight_blob[i] = \
                     _generate_vertex_targets(im, meta_data['cls_indexes'], im_scale * center, poses, num_classes, vertmap, extents, \
                                              mask, is_multi_instances, cls_indexes_old, \
-                                             vertex_target_blob[i,:,:,:], vertex_weight_blob[i,:,:,:])
+                                             vertex_target_blob[i], vertex_weight_blob[i])
 
                 num = poses.shape[2]
                 qt = np.zeros((num, 13), dtype=np.float32)
@@ -545,6 +670,8 @@ def _generate_vertex_targets(im_label, cls_indexes, center, poses, num_classes,
 
     width = im_label.shape[1]
     height = im_label.shape[0]
+    # compact targets (H, W, 3) and weights (H, W) only hold the class of the pixel
+    compact = cfg.TRAIN.VERTEX_COMPACT
 
     if is_multi_instances:
         c = np.zeros((2, 1), dtype=np.float32)
@@ -552,6 +679,7 @@ def _generate_vertex_targets(im_label, cls_indexes, center, poses, num_classes,
             cls = int(cls_indexes[i])
             y, x = np.where((mask == cls_indexes_old[i]+1) & (im_label == cls))
             I = np.where((mask == cls_indexes_old[i]+1) & (im_label == cls))
+            k = 0 if compact else 3 * cls
             if len(x) > 0:
                 if cfg.TRAIN.VERTEX_REG_2D:
                     c[0] = center[i, 0]
@@ -563,21 +691,25 @@ def _generate_vertex_targets(im_label, cls_indexes, center, poses, num_classes,
                     # normalization
                     R = np.divide(R, np.tile(N, (2,1)))
                     # assignment
-                    vertex_targets[y, x, 3*cls+0] = R[0,:]
-                    vertex_targets[y, x, 3*cls+1] = R[1,:]
-                    vertex_targets[y, x, 3*cls+2] = math.log(z)
+                    vertex_targets[y, x, k+0] = R[0,:]
+                    vertex_targets[y, x, k+1] = R[1,:]
+                    vertex_targets[y, x, k+2] = math.log(z)
                 if cfg.TRAIN.VERTEX_REG_3D:
-                    vertex_targets[y, x, 3*cls:3*cls+3] = _scale_vertmap(vertmap, I, extents[cls, :])
+                    vertex_targets[y, x, k:k+3] = _scale_vertmap(vertmap, I, extents[cls, :])
 
-                vertex_weights[y, x, 3*cls+0] = cfg.TRAIN.VERTEX_W_INSIDE
-                vertex_weights[y, x, 3*cls+1] = cfg.TRAIN.VERTEX_W_INSIDE
-                vertex_weights[y, x, 3*cls+2] = cfg.TRAIN.VERTEX_W_INSIDE
+                if compact:
+                    vertex_weights[y, x] = cfg.TRAIN.VERTEX_W_INSIDE
+                else:
+                    vertex_weights[y, x, k+0] = cfg.TRAIN.VERTEX_W_INSIDE
+                    vertex_weights[y, x, k+1] = cfg.TRAIN.VERTEX_W_INSIDE
+                    vertex_weights[y, x, k+2] = cfg.TRAIN.VERTEX_W_INSIDE
     else:
         c = np.zeros((2, 1), dtype=np.float32)
         for i in xrange(1, num_classes):
             y, x = np.where(im_label == i)
             I = np.where(im_label == i)
             ind = np.where(cls_indexes == i)[0]
+            k = 0 if compact else 3 * i
             if len(x) > 0 and len(ind) > 0:
                 if cfg.TRAIN.VERTEX_REG_2D:
                     c[0] = center[ind, 0]
@@ -589,15 +721,18 @@ def _generate_vertex_targets(im_label, cls_indexes, center, poses, num_classes,
                     # normalization
                     R = np.divide(R, np.tile(N, (2,1)))
                     # assignment
-                    vertex_targets[y, x, 3*i+0] = R[0,:]
-                    vertex_targets[y, x, 3*i+1] = R[1,:]
-                    vertex_targets[y, x, 3*i+2] = math.log(z)
+                    vertex_targets[y, x, k+0] = R[0,:]
+                    vertex_targets[y, x, k+1] = R[1,:]
+                    vertex_targets[y, x, k+2] = math.log(z)
                 if cfg.TRAIN.VERTEX_REG_3D:
-                    vertex_targets[y, x, 3*i:3*i+3] = _scale_vertmap(vertmap, I, extents[i, :])
+                    vertex_targets[y, x, k:k+3] = _scale_vertmap(vertmap, I, extents[i, :])
 
-                vertex_weights[y, x, 3*i+0] = cfg.TRAIN.VERTEX_W_INSIDE
-                vertex_weights[y, x, 3*i+1] = cfg.TRAIN.VERTEX_W_INSIDE
-                vertex_weights[y, x, 3*i+2] = cfg.TRAIN.VERTEX_W_INSIDE
+                if compact:
+                    vertex_weights[y, x] = cfg.TRAIN.VERTEX_W_INSIDE
+                else:
+                    vertex_weights[y, x, k+0] = cfg.TRAIN.VERTEX_W_INSIDE
+                    vertex_weights[y, x, k+1] = cfg.TRAIN.VERTEX_W_INSIDE
+                    vertex_weights[y, x, k+2] = cfg.TRAIN.VERTEX_W_INSIDE
 
     return vertex_targets, vertex_weights
 
@@ -654,8 +789,9 @@ def _vis_minibatch(im_blob, im_depth_blob, depth_blob, label_blob, meta_data_blo
     for i in xrange(im_blob.shape[0]):
         fig = plt.figure()
         # show image
-        im = im_blob[i, :, :, :].copy()
-        im += cfg.PIXEL_MEANS
+        im = im_blob[i, :, :, :].astype(np.float32)
+        if not cfg.INPUT_RAW:
+            im += cfg.PIXEL_MEANS
         im = im[:, :, (2, 1, 0)]
         im = im.astype(np.uint8)
         ax = fig.add_subplot(2, 3, 1)
@@ -697,9 +833,13 @@ def _vis_minibatch(im_blob, im_depth_blob, depth_blob, label_blob, meta_data_blo
 
         # show depth image
         if cfg.INPUT == 'DEPTH' or cfg.INPUT == 'RGBD':
-            im_depth = im_depth_blob[i, :, :, :].copy()
-            im_depth += cfg.PIXEL_MEANS
-            im_depth = im_depth[:, :, (2, 1, 0)]
+            if cfg.INPUT_RAW:
+                im_depth = im_depth_blob[i, :, :, 0].astype(np.float32)
+                im_depth = np.tile(im_depth[:, :, np.newaxis] / max(im_depth.max(), 1) * 255, (1, 1, 3))
+            else:
+                im_depth = im_depth_blob[i, :, :, :].copy()
+                im_depth += cfg.PIXEL_MEANS
+                im_depth = im_depth[:, :, (2, 1, 0)]
             im_depth = im_depth.astype(np.uint8)
             ax = fig.add_subplot(2, 3, 2)
             plt.imshow(im_depth)
@@ -709,14 +849,17 @@ def _vis_minibatch(im_blob, im_depth_blob, depth_blob, label_blob, meta_data_blo
         label = label_blob[i, :, :]
         height = label.shape[0]
         width = label.shape[1]
-        num_classes = vertex_target_blob.shape[3] / 3
+        num_classes = extents.shape[0]
         if cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D:
             vertex_target = vertex_target_blob[i, :, :, :]
             center = np.zeros((height, width, 3), dtype=np.float32)
         for k in xrange(num_classes):
             index = np.where(label == k)
             if cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D and len(index[0]) > 0 and k > 0:
-                center[index[0], index[1], :] = vertex_target[index[0], index[1], 3*k:3*k+3]
+                if cfg.TRAIN.VERTEX_COMPACT:
+                    center[index[0], index[1], :] = vertex_target[index[0], index[1], :]
+                else:
+                    center[index[0], index[1], :] = vertex_target[index[0], index[1], 3*k:3*k+3]
         ax = fig.add_subplot(2, 3, 3)
         ax.set_title('label') 
         if cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D:
@@ -752,8 +895,9 @@ def _vis_minibatch_box(im_blob, gt_boxes):
     for i in xrange(im_blob.shape[0]):
         fig = plt.figure()
         # show image
-        im = im_blob[i, :, :, :].copy()
-        im += cfg.PIXEL_MEANS
+        im = im_blob[i, :, :, :].astype(np.float32)
+        if not cfg.INPUT_RAW:
+            im += cfg.PIXEL_MEANS
         im = im[:, :, (2, 1, 0)]
         im = im.astype(np.uint8)
         ax = fig.add_subplot(1, 2, 1)
@@ -1,8 +1,9 @@
 import tensorflow as tf
 from networks.network import Network
+from fcn.config import cfg
 
 class vgg16_convs(Network):
-    def __init__(self, input_format, num_classes, num_units, scales, threshold_label, vote_threshold, vertex_reg_2d=False, vertex_reg_3d=False, pose_reg=False, adaptation=False, trainable=True, is_train=True):
+    def __init__(self, input_format, num_classes, num_units, scales, threshold_label, vote_threshold, vertex_reg_2d=False, vertex_reg_3d=False, pose_reg=False, adaptation=False, trainable=True, is_train=True, queue_size=25, vertex_compact=False, input_raw=False):
         self.inputs = []
         self.input_format = input_format
         self.num_classes = num_classes
@@ -12,6 +13,8 @@ class vgg16_convs(Network):
         self.vertex_reg_2d = vertex_reg_2d
         self.vertex_reg_3d = vertex_reg_3d
         self.vertex_reg = vertex_reg_2d or vertex_reg_3d
+        self.vertex_compact = vertex_compact
+        self.input_raw = input_raw
         self.pose_reg = pose_reg
         self.adaptation = adaptation
         self.trainable = trainable
@@ -28,25 +31,37 @@ class vgg16_convs(Network):
             self.vote_threshold = vote_threshold
             self.vote_percentage = 0.02
 
-        self.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
-        if input_format == 'RGBD':
+        if input_raw and input_format == 'DEPTH':
+            # raw images are queued and converted by normalize_input
+            self.data = tf.placeholder(tf.uint16, shape=[None, None, None, 1])
+        elif input_raw:
+            self.data = tf.placeholder(tf.uint8, shape=[None, None, None, 3])
+        else:
+            self.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+        if input_format == 'RGBD' and input_raw:
+            self.data_p = tf.placeholder(tf.uint16, shape=[None, None, None, 1])
+        elif input_format == 'RGBD':
             self.data_p = tf.placeholder(tf.float32, shape=[None, None, None, 3])
         self.gt_label_2d = tf.placeholder(tf.int32, shape=[None, None, None])
         self.keep_prob = tf.placeholder(tf.float32)
-        if self.vertex_reg:
+        if self.vertex_reg and self.vertex_compact:
+            # targets and weights of the class of each pixel, expanded after the queue
+            self.vertex_targets = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+            self.vertex_weights = tf.placeholder(tf.float32, shape=[None, None, None])
+        elif self.vertex_reg:
             self.vertex_targets = tf.placeholder(tf.float32, shape=[None, None, None, 3 * num_classes])
             self.vertex_weights = tf.placeholder(tf.float32, shape=[None, None, None, 3 * num_classes])
+        if self.vertex_reg:
             self.poses = tf.placeholder(tf.float32, shape=[None, 13])
             self.extents = tf.placeholder(tf.float32, shape=[num_classes, 3])
             self.meta_data = tf.placeholder(tf.float32, shape=[None, 1, 1, 48])
             self.points = tf.placeholder(tf.float32, shape=[num_classes, None, 3])
             self.symmetry = tf.placeholder(tf.float32, shape=[num_classes])
 
-        # define a queue
-        queue_size = 25
+        # define a queue, an element holds a minibatch, see utils.memory_budget
         if input_format == 'RGBD':
             if self.vertex_reg:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.float32, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, self.data_p.dtype, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.data_p, self.gt_label_2d, self.keep_prob, \
                                              self.vertex_targets, self.vertex_weights, self.poses, \
                                              self.extents, self.meta_data, self.points, self.symmetry])
@@ -55,27 +70,67 @@ class vgg16_convs(Network):
                                     'vertex_weights': vertex_weights, 'poses': poses, 'extents': extents, \
                                     'meta_data': meta_data, 'points': points, 'symmetry': symmetry})
             else:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.float32, tf.int32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, self.data_p.dtype, tf.int32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.data_p, self.gt_label_2d, self.keep_prob])
                 data, data_p, gt_label_2d, self.keep_prob_queue = q.dequeue()
                 self.layers = dict({'data': data, 'data_p': data_p, 'gt_label_2d': gt_label_2d})
         else:
             if self.vertex_reg:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.gt_label_2d, self.keep_prob, self.vertex_targets, self.vertex_weights, self.poses, self.extents, self.meta_data, self.points, self.symmetry])
                 data, gt_label_2d, self.keep_prob_queue, vertex_targets, vertex_weights, poses, extents, meta_data, points, symmetry = q.dequeue()
                 self.layers = dict({'data': data, 'gt_label_2d': gt_label_2d, 'vertex_targets': vertex_targets, 'vertex_weights': vertex_weights, 
                                     'poses': poses, 'extents': extents, 'meta_data': meta_data, 'points': points, 'symmetry': symmetry})
             else:
-                q = tf.FIFOQueue(queue_size, [tf.float32, tf.int32, tf.float32])
+                q = tf.FIFOQueue(queue_size, [self.data.dtype, tf.int32, tf.float32])
                 self.enqueue_op = q.enqueue([self.data, self.gt_label_2d, self.keep_prob])
                 data, gt_label_2d, self.keep_prob_queue = q.dequeue()
                 self.layers = dict({'data': data, 'gt_label_2d': gt_label_2d})
         self.close_queue_op = q.close(cancel_pending_enqueues=True)
         self.queue_size = q.size()
+        if self.input_raw:
+            self.layers['data'] = self.normalize_input(self.layers['data'])
+            if input_format == 'RGBD':
+                self.layers['data_p'] = self.normalize_input(self.layers['data_p'])
+        if self.vertex_reg and self.vertex_compact:
+            self.layers['vertex_targets'], self.layers['vertex_weights'] = \
+                self.expand_vertex_targets(self.layers['gt_label_2d'], self.layers['vertex_targets'], self.layers['vertex_weights'])
 
         self.setup()
 
+    def normalize_input(self, data):
+        """Float input of raw uint8 images or uint16 depth, as the blobs of the minibatch and of testing.
+
+        Depth is scaled to [0, 255] by the maximum of each image when training
+        and clipped at 2000 depth units when testing, and tiled to 3 channels.
+        The means are subtracted from both.
+        """
+        pixel_means = tf.constant(cfg.PIXEL_MEANS.reshape((1, 1, 1, 3)), dtype=tf.float32)
+        if data.dtype == tf.uint8:
+            return tf.cast(data, tf.float32) - pixel_means
+        depth = tf.cast(data, tf.float32)
+        if self.is_train:
+            depth_max = tf.reduce_max(depth, reduction_indices=[1, 2, 3], keep_dims=True)
+            depth = depth / tf.maximum(depth_max, 1.0) * 255
+        else:
+            depth = tf.clip_by_value(depth / 2000.0, 0, 1) * 255
+        return tf.tile(depth, [1, 1, 1, 3]) - pixel_means
+
+    def expand_vertex_targets(self, labels, vertex_targets, vertex_weights):
+        """Per class layout of compact vertex targets (N, H, W, 3) and weights (N, H, W).
+
+        The 3 channels of a pixel go to channels 3 * label .. 3 * label + 2,
+        the other channels are 0. Pixels labeled -1 get no target.
+        """
+        mask = tf.one_hot(labels, self.num_classes, dtype=tf.float32)
+        shape = tf.shape(vertex_targets)
+        new_shape = tf.stack([shape[0], shape[1], shape[2], 3 * self.num_classes])
+        targets = tf.reshape(tf.expand_dims(mask, 4) * tf.expand_dims(vertex_targets, 3), new_shape)
+        weights = tf.reshape(tf.tile(tf.expand_dims(mask * tf.expand_dims(vertex_weights, 3), 4), [1, 1, 1, 1, 3]), new_shape)
+        targets.set_shape([None, None, None, 3 * self.num_classes])
+        weights.set_shape([None, None, None, 3 * self.num_classes])
+        return targets, weights
+
     def setup(self):
         (self.feed('data')
              .conv(3, 3, 64, 1, 1, name='conv1_1', c_i=3, trainable=self.trainable)
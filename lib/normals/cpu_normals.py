@@ -0,0 +1,52 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Normal maps of depth images on the CPU.
+
+cpu_normals computes what gpu_normals computes with the kernels of
+compute_normals.cu, as whole-image numpy operations: the depth is
+backprojected into a vertex map, with x from the row and y from the
+column as the kernel does, and the normal of a pixel is the normalized
+cross product of the differences to the vertices below and to the right
+of it. Pixels with depth 0 or beyond depthCutoff, pixels next to them and
+the last row and column are nan.
+"""
+
+import numpy as np
+
+def cpu_normals(depth, fx, fy, cx, cy, depthCutoff, device_id=0):
+    """(height, width, 3) float32 normals of a depth image in meters, device_id is not used."""
+    depth = np.asarray(depth, dtype=np.float32)
+    height, width = depth.shape
+
+    # vertex map
+    z = np.where((depth != 0) & (depth < depthCutoff), depth, np.float32(np.nan))
+    rows = np.arange(height, dtype=np.float32)[:, np.newaxis]
+    cols = np.arange(width, dtype=np.float32)[np.newaxis, :]
+    vx = z * (rows - np.float32(cx)) * np.float32(1.0 / fx)
+    vy = z * (cols - np.float32(cy)) * np.float32(1.0 / fy)
+
+    # differences to the next row and the next column
+    ax = vx[1:, :-1] - vx[:-1, :-1]
+    ay = vy[1:, :-1] - vy[:-1, :-1]
+    az = z[1:, :-1] - z[:-1, :-1]
+    bx = vx[:-1, 1:] - vx[:-1, :-1]
+    by = vy[:-1, 1:] - vy[:-1, :-1]
+    bz = z[:-1, 1:] - z[:-1, :-1]
+
+    nmap = np.empty((height, width, 3), dtype=np.float32)
+    nmap[-1, :, :] = np.nan
+    nmap[:, -1, :] = np.nan
+    n = nmap[:-1, :-1]
+    n[:, :, 0] = ay * bz - az * by
+    n[:, :, 1] = az * bx - ax * bz
+    n[:, :, 2] = ax * by - ay * bx
+
+    # zero vectors stay zero as in Eigen's normalized()
+    norm = np.sqrt(np.sum(n * n, axis=2, keepdims=True))
+    np.divide(n, norm, out=n, where=norm > 0)
+    return nmap
@@ -12,11 +12,16 @@ import os
 from fcn.config import cfg
 import numpy as np
 import numpy.random as npr
-from utils.cython_bbox import bbox_overlaps
 from utils.bbox_transform import bbox_transform
+from nms.batch_nms import bbox_iou_matrix
+from rpn_layer.snippets import rpn_timers
+
+# indexes of the anchors inside the image, keyed by anchor grid and image size
+_inside_cache = {}
 
 def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, all_anchors, num_anchors):
   """Same as the anchor target layer in original Fast/er RCNN """
+  rpn_timers['anchor_target'].tic()
   A = num_anchors
   total_anchors = all_anchors.shape[0]
   K = total_anchors / num_anchors
@@ -28,12 +33,15 @@ def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, all_anchors, num_ancho
   height, width = rpn_cls_score.shape[1:3]
 
   # only keep anchors inside the image
-  inds_inside = np.where(
-    (all_anchors[:, 0] >= -_allowed_border) &
-    (all_anchors[:, 1] >= -_allowed_border) &
-    (all_anchors[:, 2] < im_info[1] + _allowed_border) &  # width
-    (all_anchors[:, 3] < im_info[0] + _allowed_border)  # height
-  )[0]
+  key = (total_anchors, float(im_info[0]), float(im_info[1]), tuple(all_anchors[-1, :].tolist()))
+  if key not in _inside_cache:
+    _inside_cache[key] = np.where(
+      (all_anchors[:, 0] >= -_allowed_border) &
+      (all_anchors[:, 1] >= -_allowed_border) &
+      (all_anchors[:, 2] < im_info[1] + _allowed_border) &  # width
+      (all_anchors[:, 3] < im_info[0] + _allowed_border)  # height
+    )[0]
+  inds_inside = _inside_cache[key]
 
   # keep only inside anchors
   anchors = all_anchors[inds_inside, :]
@@ -44,9 +52,7 @@ def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, all_anchors, num_ancho
 
   # overlaps between the anchors and the gt boxes
   # overlaps (ex, gt)
-  overlaps = bbox_overlaps(
-    np.ascontiguousarray(anchors, dtype=np.float),
-    np.ascontiguousarray(gt_boxes, dtype=np.float))
+  overlaps = _anchor_overlaps(anchors, gt_boxes)
   argmax_overlaps = overlaps.argmax(axis=1)
   max_overlaps = overlaps[np.arange(len(inds_inside)), argmax_overlaps]
   gt_argmax_overlaps = overlaps.argmax(axis=0)
@@ -135,9 +141,26 @@ def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, all_anchors, num_ancho
     .reshape((1, height, width, A * 4))
 
   rpn_bbox_outside_weights = bbox_outside_weights
+  rpn_timers['anchor_target'].toc()
   return rpn_labels, rpn_bbox_targets, rpn_bbox_inside_weights, rpn_bbox_outside_weights
 
 
+def _anchor_overlaps(anchors, gt_boxes):
+  """ Overlaps (anchors x gt) of the inside anchors. Only anchors that
+  intersect the envelope of the gt boxes can have a non-zero overlap, so
+  the IoU is computed for those rows only """
+  gt = gt_boxes[:, :4].astype(np.float64)
+  overlaps = np.zeros((anchors.shape[0], gt.shape[0]), dtype=np.float64)
+  cand = np.where(
+    (anchors[:, 0] <= gt[:, 2].max()) &
+    (anchors[:, 1] <= gt[:, 3].max()) &
+    (anchors[:, 2] >= gt[:, 0].min()) &
+    (anchors[:, 3] >= gt[:, 1].min())
+  )[0]
+  overlaps[cand, :] = bbox_iou_matrix(anchors[cand, :].astype(np.float64), gt)
+  return overlaps
+
+
 def _unmap(data, count, inds, fill=0):
   """ Unmap a subset of item (data) back to the original set of items (of
   size count) """
@@ -11,11 +11,13 @@ import numpy as np
 from fcn.config import cfg
 from utils.bbox_transform import bbox_transform_inv, clip_boxes
 from utils.nms_wrapper import nms
+from rpn_layer.snippets import top_k_inds, rpn_timers
 
 def proposal_layer(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, _feat_stride, anchors, num_anchors):
   """A simplified version compared to fast/er RCNN
      For details please see the technical report
   """
+  rpn_timers['proposal'].tic()
   if type(cfg_key) == bytes:
       cfg_key = cfg_key.decode('utf-8')
   pre_nms_topN = cfg[cfg_key].RPN_PRE_NMS_TOP_N
@@ -26,27 +28,27 @@ def proposal_layer(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, _feat_stride,
   scores = rpn_cls_prob[:, :, :, num_anchors:]
   rpn_bbox_pred = rpn_bbox_pred.reshape((-1, 4))
   scores = scores.reshape((-1, 1))
-  proposals = bbox_transform_inv(anchors, rpn_bbox_pred)
-  proposals = clip_boxes(proposals, im_info[:2])
 
-  # Pick the top region proposals
-  order = scores.ravel().argsort()[::-1]
-  if pre_nms_topN > 0:
-    order = order[:pre_nms_topN]
-  proposals = proposals[order, :]
+  # Pick the top region proposals, only decode the boxes that survive
+  order = top_k_inds(scores, pre_nms_topN)
+  proposals = bbox_transform_inv(anchors[order, :], rpn_bbox_pred[order, :])
+  proposals = clip_boxes(proposals, im_info[:2])
   scores = scores[order]
 
-  # Non-maximal suppression
-  keep = nms(np.hstack((proposals, scores)), nms_thresh)
+  # Non-maximal suppression, stop once post_nms_topN boxes are kept
+  # with soft-NMS the decayed scores are written back to dets
+  dets = np.hstack((proposals, scores))
+  keep = nms(dets, nms_thresh, top_k=post_nms_topN)
 
   # Pick th top region proposals after NMS
   if post_nms_topN > 0:
     keep = keep[:post_nms_topN]
   proposals = proposals[keep, :]
-  scores = scores[keep]
+  scores = dets[keep, 4:5]
 
   # Only support single image as input
   batch_inds = np.zeros((proposals.shape[0], 1), dtype=np.float32)
   blob = np.hstack((batch_inds, proposals.astype(np.float32, copy=False)))
+  rpn_timers['proposal'].toc()
 
   return blob, scores
@@ -9,21 +9,56 @@ from __future__ import print_function
 
 import numpy as np
 from rpn_layer.generate_anchors import generate_anchors
+from utils.timer import Timer
+
+# per-call timers of the python RPN layers
+rpn_timers = {'anchors': Timer(), 'proposal': Timer(), 'anchor_target': Timer()}
+
+# shifted anchors keyed by feature map size and anchor settings
+_anchor_cache = {}
 
 def generate_anchors_pre(height, width, feat_stride, anchor_scales=(8,16,32), anchor_ratios=(0.5,1,2)):
   """ A wrapper function to generate anchors given different scales
     Also return the number of anchors in variable 'length'
   """
-  anchors = generate_anchors(ratios=np.array(anchor_ratios), scales=np.array(anchor_scales))
-  A = anchors.shape[0]
-  shift_x = np.arange(0, width) * feat_stride
-  shift_y = np.arange(0, height) * feat_stride
-  shift_x, shift_y = np.meshgrid(shift_x, shift_y)
-  shifts = np.vstack((shift_x.ravel(), shift_y.ravel(), shift_x.ravel(), shift_y.ravel())).transpose()
-  K = shifts.shape[0]
-  # width changes faster, so here it is H, W, C
-  anchors = anchors.reshape((1, A, 4)) + shifts.reshape((1, K, 4)).transpose((1, 0, 2))
-  anchors = anchors.reshape((K * A, 4)).astype(np.float32, copy=False)
+  rpn_timers['anchors'].tic()
+  key = (int(height), int(width), int(feat_stride),
+         tuple(np.ravel(anchor_scales).tolist()), tuple(np.ravel(anchor_ratios).tolist()))
+  if key not in _anchor_cache:
+    anchors = generate_anchors(ratios=np.array(anchor_ratios), scales=np.array(anchor_scales))
+    A = anchors.shape[0]
+    shift_x = np.arange(0, width) * feat_stride
+    shift_y = np.arange(0, height) * feat_stride
+    shift_x, shift_y = np.meshgrid(shift_x, shift_y)
+    shifts = np.vstack((shift_x.ravel(), shift_y.ravel(), shift_x.ravel(), shift_y.ravel())).transpose()
+    K = shifts.shape[0]
+    # width changes faster, so here it is H, W, C
+    anchors = anchors.reshape((1, A, 4)) + shifts.reshape((1, K, 4)).transpose((1, 0, 2))
+    anchors = anchors.reshape((K * A, 4)).astype(np.float32, copy=False)
+    # the cached grid is shared by every call, never write into it
+    anchors.flags.writeable = False
+    _anchor_cache[key] = anchors
+  anchors = _anchor_cache[key]
   length = np.int32(anchors.shape[0])
+  rpn_timers['anchors'].toc()
 
   return anchors, length
+
+
+def top_k_inds(scores, k):
+  """ Indexes of the k largest scores in descending order.
+    Uses argpartition so only the selected k are sorted
+  """
+  scores = scores.ravel()
+  if k <= 0 or k >= scores.shape[0]:
+    return scores.argsort()[::-1]
+  inds = np.argpartition(scores, scores.shape[0] - k)[-k:]
+  return inds[scores[inds].argsort()[::-1]]
+
+
+def print_rpn_timing():
+  for name in sorted(rpn_timers.keys()):
+    t = rpn_timers[name]
+    if t.calls > 0:
+      print('rpn {}: {:d} calls, {:.3f}ms average, {:.3f}ms last'.format( \
+            name, t.calls, t.average_time * 1000, t.diff * 1000))
@@ -348,14 +348,6 @@ void Synthesizer::render(int width, int height, float fx, float fy, float px, fl
               bool is_sampling, bool is_sampling_pose)
 {
   double threshold = 0.2; // 0.2 for YCB
-  int is_save = 0;
-
-  pangolin::OpenGlMatrixSpec projectionMatrix = pangolin::ProjectionMatrixRDF_TopLeft(width, height, fx, fy, px+0.5, py+0.5, znear, zfar);
-  pangolin::OpenGlMatrixSpec projectionMatrix_reverse = pangolin::ProjectionMatrixRDF_TopLeft(width, height, fx, -fy, px+0.5, height-(py+0.5), znear, zfar);
-
-  // show gt pose
-  glEnable(GL_DEPTH_TEST);
-  glBlendFunc(GL_SRC_ALPHA,GL_ONE_MINUS_SRC_ALPHA);
 
   // sample the number of objects in the scene
   int num;
@@ -471,6 +463,56 @@ void Synthesizer::render(int width, int height, float fx, float fy, float px, fl
     }
   }
 
+  render_scene(width, height, fx, fy, px, py, znear, zfar, class_ids, poses, color, depth, vertmap, centers_return);
+}
+
+
+void Synthesizer::render_scene_python(int width, int height, np::ndarray const & parameters,
+  np::ndarray const & color, np::ndarray const & depth, np::ndarray const & vertmap, np::ndarray const & class_indexes,
+  np::ndarray const & poses, np::ndarray const & centers_return)
+{
+  float* meta = reinterpret_cast<float*>(parameters.get_data());
+  float fx = meta[0];
+  float fy = meta[1];
+  float px = meta[2];
+  float py = meta[3];
+  float znear = meta[4];
+  float zfar = meta[5];
+
+  // the objects are the leading class indexes >= 0, with their poses as (qw, qx, qy, qz, tx, ty, tz)
+  float* class_data = reinterpret_cast<float*>(class_indexes.get_data());
+  float* pose_data = reinterpret_cast<float*>(poses.get_data());
+  std::vector<int> class_ids;
+  std::vector<Sophus::SE3d> scene_poses;
+  for (int i = 0; i < class_indexes.shape(0) && class_data[i] >= 0; i++)
+  {
+    float* pose = pose_data + i * 7;
+    Eigen::Quaterniond quaternion(pose[0], pose[1], pose[2], pose[3]);
+    Sophus::SE3d::Point translation(pose[4], pose[5], pose[6]);
+    class_ids.push_back(int(class_data[i]));
+    scene_poses.push_back(Sophus::SE3d(quaternion, translation));
+  }
+
+  render_scene(width, height, fx, fy, px, py, znear, zfar, class_ids, scene_poses,
+    reinterpret_cast<float*>(color.get_data()), reinterpret_cast<float*>(depth.get_data()),
+    reinterpret_cast<float*>(vertmap.get_data()), reinterpret_cast<float*>(centers_return.get_data()));
+}
+
+
+// render the objects class_ids at the given poses
+void Synthesizer::render_scene(int width, int height, float fx, float fy, float px, float py, float znear, float zfar,
+              const std::vector<int> & class_ids, const std::vector<Sophus::SE3d> & poses,
+              float* color, float* depth, float* vertmap, float* centers_return)
+{
+  int is_save = 0;
+  int num = class_ids.size();
+  int num_classes = pose_nums_.size();
+
+  pangolin::OpenGlMatrixSpec projectionMatrix_reverse = pangolin::ProjectionMatrixRDF_TopLeft(width, height, fx, -fy, px+0.5, height-(py+0.5), znear, zfar);
+
+  glEnable(GL_DEPTH_TEST);
+  glBlendFunc(GL_SRC_ALPHA,GL_ONE_MINUS_SRC_ALPHA);
+
   // setup lights
   std::vector<df::Light> lights;
 
@@ -556,9 +598,9 @@ void Synthesizer::render(int width, int height, float fx, float fy, float px, fl
     for (int i = 0; i < num; i++)
     {
       int class_id = class_ids[i];
-      float tx = poses_return[i * 7 + 4];
-      float ty = poses_return[i * 7 + 5];
-      float tz = poses_return[i * 7 + 6];
+      float tx = poses[i].translation()(0);
+      float ty = poses[i].translation()(1);
+      float tz = poses[i].translation()(2);
       center_x[class_id] = fx * (tx / tz) + px;
       center_y[class_id] = fy * (ty / tz) + py;
     }
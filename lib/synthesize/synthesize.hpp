@@ -119,6 +119,12 @@ class Synthesizer
   void render_python(int width, int height, np::ndarray const & parameters, 
     np::ndarray const & color, np::ndarray const & depth, np::ndarray const & vertmap, np::ndarray const & class_indexes, 
     np::ndarray const & poses_return, np::ndarray const & centers_return, bool is_sampling, bool is_sampling_pose);
+  void render_scene(int width, int height, float fx, float fy, float px, float py, float znear, float zfar,
+              const std::vector<int> & class_ids, const std::vector<Sophus::SE3d> & poses,
+              float* color, float* depth, float* vertmap, float* centers_return);
+  void render_scene_python(int width, int height, np::ndarray const & parameters,
+    np::ndarray const & color, np::ndarray const & depth, np::ndarray const & vertmap, np::ndarray const & class_indexes,
+    np::ndarray const & poses, np::ndarray const & centers_return);
 
   void render_poses_python(int num, int channel, int width, int height, np::ndarray const & parameters, 
     np::ndarray const & color, np::ndarray const & poses);
@@ -252,6 +258,7 @@ BOOST_PYTHON_MODULE(libsynthesizer)
     .def("init_rand", &Synthesizer::init_rand)
     .def("render_one_python", &Synthesizer::render_one_python)
     .def("render_python", &Synthesizer::render_python)
+    .def("render_scene_python", &Synthesizer::render_scene_python)
     .def("render_poses_python", &Synthesizer::render_poses_python)
     .def("render_poses_color_python", &Synthesizer::render_poses_color_python)
     .def("icp_python", &Synthesizer::icp_python)
@@ -0,0 +1,79 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Decoded frames of the domain adaptation set, shared between loader threads.
+
+Training with TRAIN.ADAPT reads the same ADAPT_NUM frames of ADAPT_ROOT
+over and over. AdaptCache keeps every frame decoded and padded as the
+minibatch uses it, the color with the pixels of alpha 0 set to 0 and the
+raw depth, in one anonymous memory map. A frame is decoded the first
+time it is asked for and the pages of the map are only allocated then.
+The load_and_enqueue threads of fcn.train all use the one cache of the
+process, so a frame decoded by one of them is seen by the others. Threads
+that decode the same frame at once write the same bytes. The arrays
+returned are read-only views of the cache, augmentation has to work on
+copies.
+"""
+
+import mmap
+import numpy as np
+import cv2
+from utils.blob import pad_im
+
+def load_adapt_frame(root, index):
+    """(color, depth) of frame index of root, padded to a multiple of 16, as the minibatch reads them."""
+    rgba = pad_im(cv2.imread(root + '{:06d}-color.png'.format(index), cv2.IMREAD_UNCHANGED), 16)
+    if rgba.shape[2] == 4:
+        im = np.copy(rgba[:,:,:3])
+        alpha = rgba[:,:,3]
+        I = np.where(alpha == 0)
+        im[I[0], I[1], :] = 0
+    else:
+        im = rgba
+    depth = pad_im(cv2.imread(root + '{:06d}-depth.png'.format(index), cv2.IMREAD_UNCHANGED), 16)
+    return im, depth
+
+class AdaptCache(object):
+
+    def __init__(self, root, num):
+        """Cache of the frames 0 .. num - 1 of root, the map is sized by frame 0."""
+        self.root = root
+        self.num = num
+
+        color, depth = load_adapt_frame(root, 0)
+        self.color_shape = color.shape
+        self.depth_shape = depth.shape
+        self.depth_dtype = depth.dtype
+        color_bytes = num * color.nbytes
+        depth_bytes = num * depth.nbytes
+        self._map = mmap.mmap(-1, color_bytes + depth_bytes + num)
+        self._colors = np.ndarray((num, ) + color.shape, dtype=np.uint8, buffer=self._map)
+        self._depths = np.ndarray((num, ) + depth.shape, dtype=depth.dtype, buffer=self._map, offset=color_bytes)
+        self._loaded = np.ndarray((num, ), dtype=np.uint8, buffer=self._map, offset=color_bytes + depth_bytes)
+        self._store(0, color, depth)
+
+    def _store(self, index, color, depth):
+        self._colors[index] = color
+        self._depths[index] = depth
+        self._loaded[index] = 1
+
+    def __len__(self):
+        return int(self._loaded.sum())
+
+    def get(self, index):
+        """(color, depth) of frame index as read-only arrays."""
+        if not self._loaded[index]:
+            color, depth = load_adapt_frame(self.root, index)
+            if color.shape != self.color_shape or depth.shape != self.depth_shape or depth.dtype != self.depth_dtype:
+                # not of the size of the cache, served from the disk every time
+                return color, depth
+            self._store(index, color, depth)
+        color = self._colors[index]
+        depth = self._depths[index]
+        color.flags.writeable = False
+        depth.flags.writeable = False
+        return color, depth
@@ -10,7 +10,7 @@
 import numpy as np
 import cv2
 
-def im_list_to_blob(ims, num_channels):
+def im_list_to_blob(ims, num_channels, dtype=np.float32):
     """Convert a list of images into a network input.
 
     Assumes images are already prepared (means subtracted, BGR order, ...).
@@ -18,7 +18,7 @@ def im_list_to_blob(ims, num_channels):
     max_shape = np.array([im.shape for im in ims]).max(axis=0)
     num_images = len(ims)
     blob = np.zeros((num_images, max_shape[0], max_shape[1], num_channels),
-                    dtype=np.float32)
+                    dtype=dtype)
     for i in xrange(num_images):
         im = ims[i]
         if num_channels == 1:
@@ -0,0 +1,97 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Confusion matrix of label maps for segmentation IoU.
+
+Label maps are counted in their own integer type (uint8 from cv2.imread,
+int32 from the network), so no full frame float copies are made. Pixels
+with a ground truth or predicted label outside [0, num_classes), and the
+padding where the two maps differ in size, are ignored. Counts are int64
+and matrices from several workers can be merged.
+"""
+
+import numpy as np
+
+def _as_labels(labels):
+    labels = np.asarray(labels)
+    if labels.dtype.kind == 'f':
+        labels = labels.astype(np.intp)
+    return labels
+
+def _valid(labels, num_classes):
+    if labels.dtype.kind == 'u':
+        return labels < num_classes
+    return (labels >= 0) & (labels < num_classes)
+
+def confusion_hist(gt, pred, num_classes, mask=None):
+    """(num_classes, num_classes) int64 counts of ground truth (rows) vs prediction (columns).
+
+    Arguments:
+        gt, pred (ndarray): label maps of the same shape, or 2D maps where the
+            larger one is padded at the bottom and right
+        num_classes (int): number of classes
+        mask (ndarray): optional boolean map of the pixels to count
+    """
+    gt = _as_labels(gt)
+    pred = _as_labels(pred)
+    if gt.shape != pred.shape:
+        assert gt.ndim == 2 and pred.ndim == 2, \
+            'label maps of shape {} and {} do not match'.format(gt.shape, pred.shape)
+        height = min(gt.shape[0], pred.shape[0])
+        width = min(gt.shape[1], pred.shape[1])
+        gt = gt[:height, :width]
+        pred = pred[:height, :width]
+        if mask is not None:
+            mask = mask[:height, :width]
+
+    index = gt.astype(np.intp)
+    index *= num_classes
+    index += pred
+
+    valid = _valid(gt, num_classes)
+    valid &= _valid(pred, num_classes)
+    if mask is not None:
+        valid &= mask
+    if not valid.all():
+        index = index[valid]
+
+    hist = np.bincount(index.ravel(), minlength=num_classes * num_classes)
+    return hist.reshape((num_classes, num_classes)).astype(np.int64)
+
+def iou_from_hist(hist):
+    """Per-class IoU of a confusion matrix, nan for classes in neither map."""
+    hist = np.asarray(hist, dtype=np.float64)
+    intersection = np.diag(hist)
+    union = hist.sum(1) + hist.sum(0) - intersection
+    iou = np.zeros(intersection.shape, dtype=np.float64)
+    iou[:] = np.nan
+    index = union > 0
+    iou[index] = intersection[index] / union[index]
+    return iou
+
+class ConfusionMatrix(object):
+
+    def __init__(self, num_classes):
+        self.num_classes = num_classes
+        self.hist = np.zeros((num_classes, num_classes), dtype=np.int64)
+
+    def add(self, gt, pred, mask=None, per_frame=False):
+        """Count a frame. With per_frame, returns the IoU of the frame alone."""
+        hist = confusion_hist(gt, pred, self.num_classes, mask)
+        self.hist += hist
+        if per_frame:
+            return iou_from_hist(hist)
+
+    def merge(self, other):
+        """Add the counts of another ConfusionMatrix or count matrix, e.g. of a worker."""
+        if isinstance(other, ConfusionMatrix):
+            other = other.hist
+        self.hist += np.asarray(other).astype(np.int64)
+        return self
+
+    def iou(self):
+        return iou_from_hist(self.hist)
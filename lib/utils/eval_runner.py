@@ -0,0 +1,122 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Sharded, resumable evaluation over the frames of a dataset.
+
+The frames are split into shards of consecutive indexes. Each shard is
+evaluated by func(start, end), in a process pool when num_workers > 0,
+and its result is pickled into the checkpoint directory. A rerun with
+the same key loads the finished shards and only evaluates the missing
+ones; a different key, e.g. a fingerprint of new test results, discards them.
+
+func is handed to the workers by fork, so it can be a closure over the
+imdb and the test results; only the shard results are pickled.
+"""
+
+import os
+import glob
+import cPickle
+import numpy as np
+from multiprocessing import Pool
+
+# the function of the running ShardedRunner, inherited by forked workers
+_shard_func = None
+
+def _run_shard(args):
+    start, end, filename = args
+    result = _shard_func(start, end)
+    if filename is not None:
+        # write then rename so that a crash never leaves a partial shard
+        with open(filename + '.tmp', 'wb') as fid:
+            cPickle.dump(result, fid, cPickle.HIGHEST_PROTOCOL)
+        os.rename(filename + '.tmp', filename)
+    return start, result
+
+class ShardedRunner(object):
+
+    def __init__(self, func, num_items, shard_size=100, num_workers=0, checkpoint_dir=None, key=''):
+        """
+        Arguments:
+            func: callable func(start, end) evaluating items [start, end)
+            num_items (int): number of items
+            shard_size (int): number of items per shard
+            num_workers (int): number of processes, 0 runs in the caller
+            checkpoint_dir (str): directory of the shard results, None for no checkpoints
+            key (str): identifies the inputs, checkpoints of another key are discarded
+        """
+        self.func = func
+        self.num_items = num_items
+        self.shard_size = max(1, shard_size)
+        self.num_workers = num_workers
+        self.checkpoint_dir = checkpoint_dir
+        self.key = key
+
+    def _filename(self, start, end):
+        if self.checkpoint_dir is None:
+            return None
+        return os.path.join(self.checkpoint_dir, 'shard_{:06d}_{:06d}.pkl'.format(start, end))
+
+    def run(self):
+        """Evaluate all shards. Returns the shard results in item order."""
+        global _shard_func
+
+        if self.checkpoint_dir is not None:
+            if not os.path.exists(self.checkpoint_dir):
+                os.makedirs(self.checkpoint_dir)
+            key_file = os.path.join(self.checkpoint_dir, 'key.txt')
+            key = None
+            if os.path.exists(key_file):
+                with open(key_file, 'r') as fid:
+                    key = fid.read()
+            if key != self.key:
+                for filename in glob.glob(os.path.join(self.checkpoint_dir, 'shard_*.pkl')):
+                    os.remove(filename)
+                with open(key_file, 'w') as fid:
+                    fid.write(self.key)
+
+        results = {}
+        tasks = []
+        for start in xrange(0, self.num_items, self.shard_size):
+            end = min(start + self.shard_size, self.num_items)
+            filename = self._filename(start, end)
+            if filename is not None and os.path.exists(filename):
+                with open(filename, 'rb') as fid:
+                    results[start] = cPickle.load(fid)
+            else:
+                tasks.append((start, end, filename))
+        num_shards = len(results) + len(tasks)
+        if len(results) > 0:
+            print '{} of {} shards loaded from {}'.format(len(results), num_shards, self.checkpoint_dir)
+
+        _shard_func = self.func
+        try:
+            if self.num_workers > 0 and len(tasks) > 1:
+                pool = Pool(self.num_workers)
+                try:
+                    for start, result in pool.imap_unordered(_run_shard, tasks):
+                        results[start] = result
+                        print 'shard {}: {:d}/{:d}'.format(start, len(results), num_shards)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                for task in tasks:
+                    start, result = _run_shard(task)
+                    results[start] = result
+                    print 'shard {}: {:d}/{:d}'.format(start, len(results), num_shards)
+        finally:
+            _shard_func = None
+
+        return [results[start] for start in sorted(results.keys())]
+
+
+def merge_records(records):
+    """Concatenate a list of record dicts with the same keys of (n, ...) arrays."""
+    records = [r for r in records if r is not None]
+    if len(records) == 0:
+        return {}
+    return dict((key, np.concatenate([r[key] for r in records])) for key in records[0].keys())
@@ -0,0 +1,122 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Byte budgeted cache of decoded training frames.
+
+Small training sets decode the same PNG and .mat files every epoch.
+FrameCache keeps what a loader returns for a file, a dict of numpy
+arrays, under a key made of the path, size and modification time of the
+file, so a rewritten file is decoded again. Entries live in a LRU of
+ram_bytes; entries evicted from it go to a memory mapped spill file of
+spill_bytes if one is given, written as a ring, so a local SSD holds
+the frames that do not fit in RAM. Cached arrays are read-only, copy
+them before changing them in place.
+"""
+
+import os
+import collections
+import threading
+import numpy as np
+
+class FrameCache(object):
+
+    def __init__(self, ram_bytes, spill_file=None, spill_bytes=0):
+        self.ram_bytes = ram_bytes
+        self.spill_bytes = spill_bytes if spill_file else 0
+        self._ram = collections.OrderedDict()
+        self._ram_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+
+        # spilled entries in the order they were written: key -> (offset, size, layout)
+        self._spilled = collections.OrderedDict()
+        self._spill_head = 0
+        self._spill = None
+        if self.spill_bytes > 0:
+            self._spill = np.memmap(spill_file, dtype=np.uint8, mode='w+', shape=(self.spill_bytes, ))
+
+    @staticmethod
+    def file_key(kind, filename):
+        st = os.stat(filename)
+        return (kind, os.path.abspath(filename), st.st_size, st.st_mtime)
+
+    def get(self, kind, filename, loader):
+        """Arrays of loader(filename) for the file, decoded on a miss."""
+        key = self.file_key(kind, filename)
+        with self._lock:
+            arrays = self._ram.pop(key, None)
+            if arrays is not None:
+                self.hits += 1
+                self._ram[key] = arrays
+                return arrays
+            if key in self._spilled:
+                self.spill_hits += 1
+                arrays = self._read_spill(key)
+                self._insert(key, arrays)
+                return arrays
+            self.misses += 1
+
+        arrays = loader(filename)
+        for value in arrays.itervalues():
+            value.flags.writeable = False
+        with self._lock:
+            if key not in self._ram:
+                self._insert(key, arrays)
+        return arrays
+
+    def _insert(self, key, arrays):
+        size = sum(value.nbytes for value in arrays.itervalues())
+        if size > self.ram_bytes:
+            self._write_spill(key, arrays, size)
+            return
+        self._ram[key] = arrays
+        self._ram_used += size
+        while self._ram_used > self.ram_bytes:
+            old_key, old_arrays = self._ram.popitem(last=False)
+            old_size = sum(value.nbytes for value in old_arrays.itervalues())
+            self._ram_used -= old_size
+            self._write_spill(old_key, old_arrays, old_size)
+
+    def _write_spill(self, key, arrays, size):
+        if self._spill is None or key in self._spilled or size > self.spill_bytes:
+            return
+        if self._spill_head + size > self.spill_bytes:
+            self._spill_head = 0
+        start, end = self._spill_head, self._spill_head + size
+        # drop every entry the write runs over, after a wrap these are not
+        # only the oldest ones
+        for old_key, (offset, old_size, _) in self._spilled.items():
+            if offset < end and offset + old_size > start:
+                del self._spilled[old_key]
+
+        layout = []
+        offset = start
+        for name, value in arrays.iteritems():
+            data = np.ascontiguousarray(value).view(np.uint8).ravel()
+            self._spill[offset:offset + data.size] = data
+            layout.append((name, offset, value.dtype, value.shape))
+            offset += data.size
+        self._spilled[key] = (start, size, layout)
+        self._spill_head = end
+
+    def _read_spill(self, key):
+        _, _, layout = self._spilled[key]
+        arrays = {}
+        for name, offset, dtype, shape in layout:
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            value = np.array(self._spill[offset:offset + nbytes]).view(dtype).reshape(shape)
+            value.flags.writeable = False
+            arrays[name] = value
+        return arrays
+
+    def summary(self):
+        total = self.hits + self.spill_hits + self.misses
+        return '{} lookups, {:.1f}% hit ({} ram, {} spill), {} frames / {:.1f} MB in ram, {} spilled'.format( \
+            total, 100.0 * (self.hits + self.spill_hits) / max(total, 1), self.hits, self.spill_hits, \
+            len(self._ram), self._ram_used / 1048576.0, len(self._spilled))
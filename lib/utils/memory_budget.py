@@ -0,0 +1,110 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Memory accounting of the training input queue.
+
+An element of the FIFOQueue of vgg16_convs holds a whole minibatch, and
+with vertex regression its largest tensors are the vertex targets and
+weights of H x W x 3 * num_classes floats each, 77 MB each per image
+of 480 x 640 with 22 classes, or 3.5 and 1.2 MB with
+cfg.TRAIN.VERTEX_COMPACT. The queue lives in host memory. The
+functions here compute the bytes of an element from cfg and size the
+queue from a budget in cfg.TRAIN.QUEUE_MEMORY.
+"""
+
+from collections import OrderedDict
+import numpy as np
+from fcn.config import cfg
+
+def tensor_bytes(shape, dtype=np.float32):
+    return int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+def queue_element_bytes(num_classes, height, width, batch_size=1, input_format='RGBD', \
+                        vertex_reg=True, num_points=0, num_objects=0, vertex_compact=False, input_raw=False):
+    """Bytes of the tensors of one queue element, in enqueue order.
+
+    Arguments:
+        num_classes (int): number of classes including the background
+        height, width (int): size of the network input after scaling
+        batch_size (int): images per minibatch
+        input_format (str): cfg.INPUT, RGBD adds the depth image
+        vertex_reg (bool): whether targets for vertex regression are queued
+        num_points (int): model points per class, 0 to leave them out
+        num_objects (int): poses per minibatch, 0 to leave them out
+        vertex_compact (bool): vertex targets of the class of each pixel only
+        input_raw (bool): uint8 color and uint16 depth of one channel
+
+    Returns:
+        sizes (OrderedDict): name -> bytes
+    """
+    sizes = OrderedDict()
+    if input_raw and input_format == 'DEPTH':
+        sizes['data'] = tensor_bytes((batch_size, height, width, 1), np.uint16)
+    elif input_raw:
+        sizes['data'] = tensor_bytes((batch_size, height, width, 3), np.uint8)
+    else:
+        sizes['data'] = tensor_bytes((batch_size, height, width, 3))
+    if input_format == 'RGBD' and input_raw:
+        sizes['data_p'] = tensor_bytes((batch_size, height, width, 1), np.uint16)
+    elif input_format == 'RGBD':
+        sizes['data_p'] = tensor_bytes((batch_size, height, width, 3))
+    sizes['gt_label_2d'] = tensor_bytes((batch_size, height, width), np.int32)
+    sizes['keep_prob'] = tensor_bytes(())
+    if vertex_reg:
+        if vertex_compact:
+            sizes['vertex_targets'] = tensor_bytes((batch_size, height, width, 3))
+            sizes['vertex_weights'] = tensor_bytes((batch_size, height, width))
+        else:
+            sizes['vertex_targets'] = tensor_bytes((batch_size, height, width, 3 * num_classes))
+            sizes['vertex_weights'] = tensor_bytes((batch_size, height, width, 3 * num_classes))
+        sizes['poses'] = tensor_bytes((num_objects, 13))
+        sizes['extents'] = tensor_bytes((num_classes, 3))
+        sizes['meta_data'] = tensor_bytes((batch_size, 1, 1, 48))
+        sizes['points'] = tensor_bytes((num_classes, num_points, 3))
+        sizes['symmetry'] = tensor_bytes((num_classes,))
+    return sizes
+
+def cfg_element_bytes(num_classes, num_points=0, batch_size=None):
+    """queue_element_bytes of the training minibatches configured in cfg, at the largest scale."""
+    scale = max(cfg.TRAIN.SCALES_BASE)
+    if batch_size is None:
+        batch_size = cfg.TRAIN.IMS_PER_BATCH if not cfg.TRAIN.SINGLE_FRAME else 1
+    return queue_element_bytes(num_classes, int(cfg.TRAIN.SYN_HEIGHT * scale), int(cfg.TRAIN.SYN_WIDTH * scale), \
+        batch_size, cfg.INPUT, cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D, num_points, \
+        vertex_compact=cfg.TRAIN.VERTEX_COMPACT, input_raw=cfg.INPUT_RAW)
+
+def capacity(element_bytes, budget_bytes, max_size, min_size=2):
+    """Number of elements of element_bytes that fit into budget_bytes, within [min_size, max_size]."""
+    if budget_bytes <= 0:
+        return max_size
+    return int(min(max(budget_bytes // max(element_bytes, 1), min_size), max_size))
+
+def queue_size(num_classes, num_points=0):
+    """Capacity of the training queue, cfg.TRAIN.QUEUE_SIZE capped by cfg.TRAIN.QUEUE_MEMORY (MB) if set.
+
+    The model points are left out unless num_points is given, they take
+    well below 1 MB next to the images of an element.
+    """
+    element = sum(cfg_element_bytes(num_classes, num_points).values())
+    return capacity(element, cfg.TRAIN.QUEUE_MEMORY * 1048576, cfg.TRAIN.QUEUE_SIZE)
+
+def recommend(budget_bytes, num_classes, num_points=0, max_batch=8, min_queue=2):
+    """(batch size, queue size, bytes) of the batch sizes whose queue fits into budget_bytes.
+
+    A queue of min_queue elements is enough to hide the latency of the data
+    layer, so the batch sizes are tried up to the largest for which that
+    many elements fit. The queue of each batch size takes the rest of the
+    budget, at most cfg.TRAIN.QUEUE_SIZE elements.
+    """
+    options = []
+    for batch_size in xrange(1, max_batch + 1):
+        element = sum(cfg_element_bytes(num_classes, num_points, batch_size).values())
+        if element * min_queue > budget_bytes:
+            break
+        size = capacity(element, budget_bytes, cfg.TRAIN.QUEUE_SIZE, min_queue)
+        options.append((batch_size, size, element * size))
+    return options
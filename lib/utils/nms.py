@@ -1,32 +1,12 @@
-import numpy as np
-
-def nms(dets, thresh):
-    cls = dets[:, 1]
-    x1 = dets[:, 2]
-    y1 = dets[:, 3]
-    x2 = dets[:, 4]
-    y2 = dets[:, 5]
-    scores = dets[:, 6]
-
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-
-    keep = []
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
+from __future__ import absolute_import
 
-        w = np.maximum(0.0, xx2 - xx1 + 1)
-        h = np.maximum(0.0, yy2 - yy1 + 1)
-        inter = w * h
-        ovr = inter / (areas[i] + areas[order[1:]] - inter)
-
-        inds = np.where(~((ovr > thresh) & (cls[order[1:]] == cls[i])))[0]
-        #inds = np.where(ovr <= thresh)[0]
-        order = order[inds + 1]
-
-    return keep
+import numpy as np
+from nms.batch_nms import batch_nms
+
+# dets (batch, cls, x1, y1, x2, y2, score), boxes of different classes
+# or batch indexes never suppress each other
+def nms(dets, thresh, top_k=-1):
+    if dets.shape[0] == 0:
+        return []
+    keep = batch_nms(dets[:, 2:6], dets[:, 6], thresh, classes=dets[:, 1], batch_inds=dets[:, 0], top_k=top_k)
+    return list(keep)
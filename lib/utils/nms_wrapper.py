@@ -9,15 +9,57 @@ from __future__ import division
 from __future__ import print_function
 
 from fcn.config import cfg
-from nms.gpu_nms import gpu_nms
-from nms.cpu_nms import cpu_nms
+from nms.batch_nms import batch_nms, batch_soft_nms
 
-def nms(dets, thresh, force_cpu=False):
-  """Dispatch to either CPU or GPU NMS implementations."""
+# the compiled extensions are optional when cfg.NMS_BACKEND == 'PY'
+try:
+  from nms.gpu_nms import gpu_nms
+except ImportError:
+  gpu_nms = None
+try:
+  from nms.cpu_nms import cpu_nms
+except ImportError:
+  cpu_nms = None
+
+def nms(dets, thresh, force_cpu=False, top_k=-1):
+  """Dispatch to either CPU or GPU NMS implementations.
+
+  The numpy path follows cfg.NMS_METHOD; with soft-NMS the decayed scores
+  of the kept boxes are written back to dets[keep, 4].
+  """
 
   if dets.shape[0] == 0:
     return []
-  if cfg.USE_GPU_NMS and not force_cpu:
-    return gpu_nms(dets, thresh, device_id=0)
+  if cfg.NMS_BACKEND == 'PY':
+    return _py_nms_dets(dets, thresh, top_k)
+  if cfg.USE_GPU_NMS and not force_cpu and gpu_nms is not None:
+    keep = gpu_nms(dets, thresh, device_id=0)
+  elif cpu_nms is not None:
+    keep = cpu_nms(dets, thresh)
   else:
-    return cpu_nms(dets, thresh)
+    # e.g. force_cpu with only the GPU extension built
+    return _py_nms_dets(dets, thresh, top_k)
+  if top_k > 0:
+    keep = keep[:top_k]
+  return keep
+
+def _py_nms_dets(dets, thresh, top_k):
+  keep, scores = py_nms(dets[:, :4], dets[:, 4], thresh, top_k=top_k)
+  dets[keep, 4] = scores
+  return list(keep)
+
+def py_nms(boxes, scores, thresh, classes=None, batch_inds=None, top_k=-1):
+  """Batched numpy NMS following cfg.NMS_METHOD.
+
+  Boxes of different classes or batch indexes never suppress each other.
+  Returns the kept indexes in descending (possibly decayed) score order
+  and their scores, decayed by soft-NMS or unchanged with 'HARD'.
+  """
+
+  if cfg.NMS_METHOD == 'HARD':
+    keep = batch_nms(boxes, scores, thresh, classes=classes, batch_inds=batch_inds, \
+                     top_k=top_k, matrix_max=cfg.NMS_MATRIX_MAX)
+    return keep, scores[keep]
+  return batch_soft_nms(boxes, scores, thresh, classes=classes, batch_inds=batch_inds, \
+                        top_k=top_k, method=cfg.NMS_METHOD, sigma=cfg.NMS_SIGMA, \
+                        matrix_max=cfg.NMS_MATRIX_MAX)
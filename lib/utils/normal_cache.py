@@ -0,0 +1,52 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""On-disk cache of the normal images of depth files.
+
+Training with the NORMAL input estimates the normals of the depth image
+and smooths them with a bilateral filter every time a frame is used.
+NormalCache keeps the uint8 normal image of a depth file as a PNG under
+root, named by the SHA-1 of the path, size and modification time of the
+file, as utils/frame_cache keys its entries, and of the camera
+parameters, so a rewritten file or another scale gets its own image.
+Images are written to a temporary file and renamed, workers sharing root
+never read a partial one.
+"""
+
+import os
+import hashlib
+import tempfile
+import cv2
+
+class NormalCache(object):
+
+    def __init__(self, root):
+        self.root = root
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def key(self, filename, params):
+        st = os.stat(filename)
+        sha = hashlib.sha1()
+        sha.update('{} {} {!r} '.format(os.path.abspath(filename), st.st_size, st.st_mtime))
+        sha.update(' '.join('{:.6f}'.format(p) for p in params))
+        return sha.hexdigest()
+
+    def get(self, filename, params, compute):
+        """Normal image of the depth file filename with camera params, compute() on a miss."""
+        path = os.path.join(self.root, self.key(filename, params) + '.png')
+        if os.path.exists(path):
+            im_normal = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if im_normal is not None:
+                return im_normal
+
+        im_normal = compute()
+        fd, tmp = tempfile.mkstemp(suffix='.png', dir=self.root)
+        os.close(fd)
+        cv2.imwrite(tmp, im_normal)
+        os.rename(tmp, path)
+        return im_normal
@@ -0,0 +1,21 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+from fcn.config import cfg
+from normals.cpu_normals import cpu_normals
+
+# the compiled extension is optional when cfg.NORMALS_BACKEND == 'PY'
+try:
+    from normals.gpu_normals import gpu_normals
+except ImportError:
+    gpu_normals = None
+
+def compute_normals(depth, fx, fy, cx, cy, depthCutoff, device_id=0):
+    """Dispatch to the CUDA or the numpy normal estimation, arguments as gpu_normals."""
+    if cfg.NORMALS_BACKEND == 'PY' or gpu_normals is None:
+        return cpu_normals(depth, fx, fy, cx, cy, depthCutoff, device_id)
+    return gpu_normals(depth, fx, fy, cx, cy, depthCutoff, device_id)
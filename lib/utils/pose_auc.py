@@ -0,0 +1,87 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Accuracy-threshold curves and their AUC for ADD and ADD-S.
+
+The accuracy at a threshold is the fraction of ground truth objects whose
+pose error is at most the threshold; objects without an estimate count as
+misses. The errors are sorted once and all thresholds of the grid are
+looked up with searchsorted. The AUC is computed in closed form from the
+errors below max_threshold and matches VOCap of the YCB-Video toolbox,
+which integrates the step curve taking the accuracy of each step at its
+right end.
+"""
+
+import numpy as np
+
+def accuracy_curve(errors, num_total, thresholds):
+    """Fraction of num_total objects with an error of at most each threshold."""
+    errors = np.sort(np.asarray(errors, dtype=np.float64))
+    num = max(float(num_total), errors.shape[0])
+    if num == 0:
+        return np.zeros(thresholds.shape, dtype=np.float64) * np.nan
+    return np.searchsorted(errors, thresholds, side='right') / num
+
+def area_under_curve(errors, num_total, max_threshold):
+    """Normalized area under the accuracy curve of the errors on [0, max_threshold]."""
+    errors = np.asarray(errors, dtype=np.float64)
+    num = max(float(num_total), errors.shape[0])
+    if num == 0:
+        return np.nan
+    errors = errors[errors <= max_threshold]
+    if errors.shape[0] == 0:
+        return 0.0
+    # sum over steps of width e_k - e_(k-1) at accuracy k / num, plus the last step up to max_threshold
+    return ((max_threshold - errors).sum() + errors.max()) / (num * max_threshold)
+
+def pose_curves(classes, errors, count_all, max_threshold=0.1, num_steps=1000):
+    """Per class and overall curves of one error metric.
+
+    Arguments:
+        classes (ndarray): (n,) class index of each estimate
+        errors (ndarray): (n,) error of each estimate, e.g. ADD in meters
+        count_all (ndarray): (num_classes,) number of ground truth objects per class
+        max_threshold (float): end of the threshold grid and of the AUC
+        num_steps (int): number of thresholds in the grid
+
+    Returns:
+        curves (dict): 'thresholds' (num_steps,), 'accuracy' (num_classes, num_steps),
+            'auc' (num_classes,), 'accuracy_all' (num_steps,) and 'auc_all'
+    """
+    classes = np.asarray(classes, dtype=np.int64)
+    errors = np.asarray(errors, dtype=np.float64)
+    num_classes = len(count_all)
+    thresholds = np.linspace(0, max_threshold, num_steps + 1)[1:]
+
+    accuracy = np.zeros((num_classes, num_steps), dtype=np.float64)
+    auc = np.zeros((num_classes,), dtype=np.float64)
+    accuracy[:] = np.nan
+    auc[:] = np.nan
+
+    # sort by class then error, each class is one contiguous run
+    order = np.lexsort((errors, classes))
+    classes = classes[order]
+    errors = errors[order]
+    bounds = np.searchsorted(classes, np.arange(num_classes + 1))
+    for cls in xrange(num_classes):
+        if count_all[cls] == 0:
+            continue
+        e = errors[bounds[cls]:bounds[cls + 1]]
+        accuracy[cls] = accuracy_curve(e, count_all[cls], thresholds)
+        auc[cls] = area_under_curve(e, count_all[cls], max_threshold)
+
+    return {'thresholds': thresholds, 'accuracy': accuracy, 'auc': auc,
+            'accuracy_all': accuracy_curve(errors, np.sum(count_all), thresholds),
+            'auc_all': area_under_curve(errors, np.sum(count_all), max_threshold)}
+
+def save_curves(filename, curves):
+    """Write {name: pose_curves(...)} into one compressed npz, keys are name_field."""
+    arrays = {}
+    for name, c in curves.items():
+        for field, value in c.items():
+            arrays['{}_{}'.format(name, field)] = np.asarray(value, dtype=np.float32)
+    np.savez_compressed(filename, **arrays)
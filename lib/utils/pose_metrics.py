@@ -0,0 +1,140 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Batched pose errors for many (estimate, ground truth) pairs.
+
+Computes the same errors as utils.pose_error (add, adi, re, te, reproj)
+for a whole batch of pairs of one class at a time. For adi the model
+points of each symmetric class go into one KD-tree in the model frame,
+built once. The ground truth points are mapped into the model frame of
+the estimate, R_est^T (R_gt p + t_gt - t_est), and looked up there, which
+gives the same nearest neighbor distances as a tree over the transformed
+estimated points.
+"""
+
+import numpy as np
+from scipy import spatial
+
+def _transform(pts, R, t):
+    """Transform (p, 3) points by n poses R (n, 3, 3), t (n, 3) into (n, p, 3)."""
+    n = R.shape[0]
+    x = np.dot(pts, R.reshape((n * 3, 3)).T).reshape((pts.shape[0], n, 3))
+    return x.transpose((1, 0, 2)) + t[:, np.newaxis, :]
+
+def _nn_dists(tree, x):
+    """Nearest neighbor distances on all cores, the keyword depends on the scipy version."""
+    try:
+        return tree.query(x, k=1, workers=-1)[0]
+    except TypeError:
+        return tree.query(x, k=1, n_jobs=-1)[0]
+
+class PoseEvaluator(object):
+
+    def __init__(self, points, symmetric, chunk_size=256):
+        """
+        Arguments:
+            points: per class (num_points, 3) model points, a list or an array
+            symmetric: per class flag, True uses adi (ADD-S) instead of add
+            chunk_size (int): max number of pairs transformed at once
+        """
+        self.points = points
+        self.symmetric = np.array(symmetric, dtype=np.bool_)
+        self.chunk_size = chunk_size
+        self._trees = {}
+
+    def tree(self, cls):
+        """KD-tree over the model points of a class, built on first use."""
+        if cls not in self._trees:
+            self._trees[cls] = spatial.cKDTree(np.asarray(self.points[cls], dtype=np.float64))
+        return self._trees[cls]
+
+    def add(self, cls, R_est, t_est, R_gt, t_gt):
+        """ADD of n pairs: R (n, 3, 3), t (n, 3). Returns (n,) errors."""
+        pts = np.asarray(self.points[cls], dtype=np.float64)
+        errors = np.zeros((R_est.shape[0],), dtype=np.float64)
+        for s in range(0, R_est.shape[0], self.chunk_size):
+            e = slice(s, s + self.chunk_size)
+            # (R_est - R_gt) p + (t_est - t_gt)
+            delta = _transform(pts, R_est[e] - R_gt[e], t_est[e] - t_gt[e])
+            errors[e] = np.sqrt(np.einsum('npi,npi->np', delta, delta)).mean(axis=1)
+        return errors
+
+    def adi(self, cls, R_est, t_est, R_gt, t_gt):
+        """ADD-S of n pairs with the cached model frame KD-tree. Returns (n,) errors."""
+        pts = np.asarray(self.points[cls], dtype=np.float64)
+        tree = self.tree(cls)
+        errors = np.zeros((R_est.shape[0],), dtype=np.float64)
+        for s in range(0, R_est.shape[0], self.chunk_size):
+            e = slice(s, s + self.chunk_size)
+            # ground truth points in the model frame of the estimate
+            R_inv = R_est[e].transpose((0, 2, 1))
+            R = np.matmul(R_inv, R_gt[e])
+            t = np.matmul(R_inv, (t_gt[e] - t_est[e])[:, :, np.newaxis])[:, :, 0]
+            dists = _nn_dists(tree, _transform(pts, R, t).reshape((-1, 3)))
+            errors[e] = dists.reshape((-1, pts.shape[0])).mean(axis=1)
+        return errors
+
+    def reproj(self, cls, K, R_est, t_est, R_gt, t_gt):
+        """Mean reprojection error in pixels of n pairs. Returns (n,) errors."""
+        pts = np.asarray(self.points[cls], dtype=np.float64)
+        errors = np.zeros((R_est.shape[0],), dtype=np.float64)
+        for s in range(0, R_est.shape[0], self.chunk_size):
+            e = slice(s, s + self.chunk_size)
+            pixels = []
+            for R, t in ((R_est[e], t_est[e]), (R_gt[e], t_gt[e])):
+                x = np.dot(_transform(pts, R, t), K.T)
+                pixels.append(x[:, :, :2] / x[:, :, 2:3])
+            delta = pixels[0] - pixels[1]
+            errors[e] = np.sqrt(np.einsum('npi,npi->np', delta, delta)).mean(axis=1)
+        return errors
+
+    @staticmethod
+    def re(R_est, R_gt):
+        """Rotation errors in degrees of n pairs. Returns (n,) errors."""
+        error_cos = 0.5 * (np.einsum('nij,nji->n', R_est, np.linalg.inv(R_gt)) - 1.0)
+        return np.degrees(np.arccos(np.clip(error_cos, -1.0, 1.0)))
+
+    @staticmethod
+    def te(t_est, t_gt):
+        """Translation errors of n pairs. Returns (n,) errors."""
+        return np.sqrt(((t_gt - t_est) ** 2).sum(axis=1))
+
+    def evaluate(self, classes, RT_est, RT_gt, K=None):
+        """Errors of all pairs of a dataset, grouped by class internally.
+
+        Arguments:
+            classes (ndarray): (n,) class index of each pair
+            RT_est, RT_gt (ndarray): (n, 3, 4) estimated and ground truth poses
+            K (ndarray): optional (3, 3) intrinsic matrix for the reprojection error
+
+        Returns:
+            errors (dict): (n,) arrays 'add' (adi for symmetric classes),
+                'rotation', 'translation' and with K 'reprojection'
+        """
+        classes = np.asarray(classes, dtype=np.int64)
+        RT_est = np.asarray(RT_est, dtype=np.float64)
+        RT_gt = np.asarray(RT_gt, dtype=np.float64)
+        n = classes.shape[0]
+        errors = {'add': np.zeros((n,), dtype=np.float64),
+                  'rotation': self.re(RT_est[:, :, :3], RT_gt[:, :, :3]) if n > 0 else np.zeros((0,)),
+                  'translation': self.te(RT_est[:, :, 3], RT_gt[:, :, 3])}
+        if K is not None:
+            errors['reprojection'] = np.zeros((n,), dtype=np.float64)
+
+        for cls in np.unique(classes):
+            index = np.where(classes == cls)[0]
+            R_est = RT_est[index, :, :3]
+            t_est = RT_est[index, :, 3]
+            R_gt = RT_gt[index, :, :3]
+            t_gt = RT_gt[index, :, 3]
+            if self.symmetric[cls]:
+                errors['add'][index] = self.adi(cls, R_est, t_est, R_gt, t_gt)
+            else:
+                errors['add'][index] = self.add(cls, R_est, t_est, R_gt, t_gt)
+            if K is not None:
+                errors['reprojection'][index] = self.reproj(cls, K, R_est, t_est, R_gt, t_gt)
+        return errors
@@ -0,0 +1,97 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Batch rendering of the object poses of many frames.
+
+load_pose_index reads the poses of all meta files once into flat arrays,
+cached in an npz so later runs skip the .mat files, and pose_qt turns
+them into the (class, quaternion, translation) rows of
+render_poses_python for all objects at once. AsyncWriter encodes and
+writes the rendered images on a thread pool, cv2 releases the GIL while
+encoding, so the renderer does not wait for the disk.
+"""
+
+import os
+import collections
+import numpy as np
+import scipy.io
+import cv2
+from multiprocessing.pool import ThreadPool
+from utils.se3 import se3_mul_batch, mat2quat_batch
+
+def load_pose_index(filenames, cache=None):
+    """Poses of the frames of the meta files.
+
+    Returns:
+        index (dict): 'offsets' (n + 1,) objects of frame k are
+            offsets[k]:offsets[k + 1], 'cls' (m,) class index and
+            'poses' (m, 3, 4) pose of every object
+    """
+    filenames = np.array(filenames)
+    if cache is not None and os.path.exists(cache):
+        index = dict(np.load(cache))
+        if np.array_equal(index['filenames'], filenames):
+            return index
+        print 'pose index {} is of other frames, rebuilding it'.format(cache)
+
+    counts = np.zeros((len(filenames), ), dtype=np.int64)
+    cls = []
+    poses = []
+    for k, filename in enumerate(filenames):
+        meta_data = scipy.io.loadmat(filename)
+        p = meta_data['poses']
+        if len(p.shape) == 2:
+            p = np.reshape(p, (3, 4, 1))
+        counts[k] = p.shape[2]
+        cls.append(meta_data['cls_indexes'].flatten())
+        poses.append(p.transpose((2, 0, 1)))
+
+    index = {'filenames': filenames, 'offsets': np.concatenate(([0], np.cumsum(counts))), \
+             'cls': np.concatenate(cls).astype(np.int64), \
+             'poses': np.concatenate(poses).astype(np.float32).reshape((-1, 3, 4))}
+    if cache is not None:
+        np.savez(cache, **index)
+    return index
+
+def pose_qt(index, model_transforms=None):
+    """(m, 8) float32 rows of class index, quaternion and translation of all objects.
+
+    model_transforms (3, 4, num_classes - 1), if given, are applied to the
+    poses first, RT = pose * model_transform of the class.
+    """
+    RT = index['poses']
+    if model_transforms is not None:
+        RT = se3_mul_batch(RT, model_transforms.transpose((2, 0, 1))[index['cls'] - 1])
+    qt = np.zeros((RT.shape[0], 8), dtype=np.float32)
+    qt[:, 0] = index['cls']
+    qt[:, 1:5] = mat2quat_batch(RT[:, :, :3])
+    qt[:, 5:] = RT[:, :, 3]
+    return qt
+
+class AsyncWriter(object):
+
+    def __init__(self, num_threads=4, max_pending=16):
+        self._pool = ThreadPool(num_threads)
+        self._pending = collections.deque()
+        self.max_pending = max_pending
+
+    def write(self, filename, image):
+        """Queue an image for cv2.imwrite, blocks while max_pending writes are in flight."""
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().get()
+        self._pending.append(self._pool.apply_async(_imwrite, (filename, image)))
+
+    def close(self):
+        """Wait for all writes, raising the error of a failed one."""
+        while self._pending:
+            self._pending.popleft().get()
+        self._pool.close()
+        self._pool.join()
+
+def _imwrite(filename, image):
+    if not cv2.imwrite(filename, np.ascontiguousarray(image)):
+        raise IOError('failed to write {}'.format(filename))
@@ -0,0 +1,184 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Append-only store of per-frame test results.
+
+A store is a directory of flat files:
+
+    labels.bin    PNG encoded label maps, one after the other
+    <column>.bin  float32 rows of each result column, e.g. rois or poses
+    columns.txt   name and row width of the columns
+    frames.bin    one fixed width int64 record per frame: frame index,
+                  label offset, label size, height, width, then
+                  (first row, number of rows) for every column
+
+Frames are appended while testing, so nothing is kept in memory. The frame
+record is written last, so a crash leaves at most an uncommitted tail
+which is cut off when the store is opened again. Reading memory maps the
+files, so indexing a frame only touches its own bytes and works in forked
+evaluation workers.
+
+store[i] returns the same dict as the segmentations list used to hold,
+or [] for a frame that was not written.
+"""
+
+import os
+import hashlib
+import numpy as np
+import cv2
+
+class ResultStore(object):
+
+    def __init__(self, path, columns=('rois', 'poses', 'poses_refined', 'poses_icp')):
+        """
+        Arguments:
+            path (str): store directory, created if missing
+            columns: names of the per-frame arrays besides the label map,
+                only used when the store is new
+        """
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        column_file = os.path.join(path, 'columns.txt')
+        if os.path.exists(column_file):
+            with open(column_file, 'r') as fid:
+                items = [line.split() for line in fid if line.strip()]
+            self.columns = [item[0] for item in items]
+            self.widths = dict((item[0], int(item[1])) for item in items)
+        else:
+            self.columns = list(columns)
+            self.widths = dict((name, -1) for name in self.columns)
+            self._write_columns()
+
+        self.record_size = 5 + 2 * len(self.columns)
+        self._maps = {}
+        self._load_frames()
+
+    def _write_columns(self):
+        with open(os.path.join(self.path, 'columns.txt'), 'w') as fid:
+            for name in self.columns:
+                fid.write('{} {}\n'.format(name, self.widths[name]))
+
+    def _file(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def _load_frames(self):
+        """Read the frame records and cut off anything not committed by one."""
+        records = np.zeros((0, self.record_size), dtype=np.int64)
+        filename = self._file('frames')
+        if os.path.exists(filename):
+            records = np.fromfile(filename, dtype=np.int64)
+            num = records.shape[0] // self.record_size
+            records = records[:num * self.record_size].reshape((num, self.record_size))
+        self.records = records
+        self.index = dict((int(frame), k) for k, frame in enumerate(records[:, 0]))
+
+        # committed sizes of the data files
+        self.label_size = int((records[:, 1] + records[:, 2]).max()) if records.shape[0] > 0 else 0
+        self.num_rows = {}
+        for c, name in enumerate(self.columns):
+            rows = records[:, 5 + 2 * c] + records[:, 6 + 2 * c]
+            self.num_rows[name] = int(rows.max()) if records.shape[0] > 0 else 0
+
+        sizes = [('frames', records.size * 8), ('labels', self.label_size)]
+        for name in self.columns:
+            sizes.append((name, self.num_rows[name] * max(self.widths[name], 0) * 4))
+        for name, size in sizes:
+            filename = self._file(name)
+            if os.path.exists(filename) and os.path.getsize(filename) > size:
+                with open(filename, 'r+b') as fid:
+                    fid.truncate(size)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, frame):
+        return int(frame) in self.index
+
+    def frames(self):
+        """Indexes of the written frames in writing order."""
+        return self.records[:, 0].tolist()
+
+    def append(self, frame, seg):
+        """Append the results of a frame, a dict with 'labels' and the columns."""
+        labels = np.asarray(seg['labels'])
+        dtype = np.uint8 if labels.size == 0 or labels.max() < 256 else np.uint16
+        ok, data = cv2.imencode('.png', labels.astype(dtype))
+        assert ok, 'cannot encode the label map of frame {}'.format(frame)
+        data = data.tobytes()
+
+        record = np.zeros((self.record_size,), dtype=np.int64)
+        record[0] = frame
+        record[1] = self.label_size
+        record[2] = len(data)
+        record[3] = labels.shape[0]
+        record[4] = labels.shape[1]
+
+        for c, name in enumerate(self.columns):
+            rows = np.asarray(seg.get(name, []), dtype=np.float32)
+            if rows.size == 0:
+                record[5 + 2 * c] = self.num_rows[name]
+                continue
+            rows = rows.reshape((rows.shape[0], -1))
+            if self.widths[name] < 0:
+                self.widths[name] = rows.shape[1]
+                self._write_columns()
+            assert rows.shape[1] == self.widths[name], \
+                'column {} has width {}, got {}'.format(name, self.widths[name], rows.shape[1])
+            with open(self._file(name), 'ab') as fid:
+                fid.write(np.ascontiguousarray(rows).tobytes())
+            record[5 + 2 * c] = self.num_rows[name]
+            record[6 + 2 * c] = rows.shape[0]
+            self.num_rows[name] += rows.shape[0]
+
+        with open(self._file('labels'), 'ab') as fid:
+            fid.write(data)
+        self.label_size += len(data)
+
+        # the frame record commits the frame
+        with open(self._file('frames'), 'ab') as fid:
+            fid.write(record.tobytes())
+        self.index[int(frame)] = self.records.shape[0]
+        self.records = np.vstack((self.records, record[np.newaxis, :]))
+
+    def _map(self, name, size):
+        """Memory map of the first size bytes of a data file, remapped when it grew."""
+        if name not in self._maps or self._maps[name].shape[0] < size:
+            self._maps[name] = np.memmap(self._file(name), dtype=np.uint8, mode='r')
+        return self._maps[name]
+
+    def __getitem__(self, frame):
+        if int(frame) not in self.index:
+            return []
+        record = self.records[self.index[int(frame)]]
+
+        offset, size = int(record[1]), int(record[2])
+        data = np.array(self._map('labels', offset + size)[offset:offset + size])
+        labels = cv2.imdecode(data, cv2.IMREAD_UNCHANGED).astype(np.int32)
+        seg = {'labels': labels.reshape((int(record[3]), int(record[4])))}
+
+        for c, name in enumerate(self.columns):
+            start, num = int(record[5 + 2 * c]), int(record[6 + 2 * c])
+            width = max(self.widths[name], 0)
+            if num == 0:
+                seg[name] = np.zeros((0, width), dtype=np.float32)
+                continue
+            data = self._map(name, (start + num) * width * 4)[start * width * 4:(start + num) * width * 4]
+            seg[name] = np.frombuffer(data.tobytes(), dtype=np.float32).reshape((num, width))
+        return seg
+
+    def fingerprint(self):
+        """md5 of the committed contents of the store."""
+        md5 = hashlib.md5(self.records.tobytes())
+        sizes = [('labels', self.label_size)]
+        for name in self.columns:
+            sizes.append((name, self.num_rows[name] * max(self.widths[name], 0) * 4))
+        for name, size in sizes:
+            if size > 0:
+                md5.update(self._map(name, size)[:size].tobytes())
+        return md5.hexdigest()
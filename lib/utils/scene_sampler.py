@@ -0,0 +1,219 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Scene sampling for the online synthesizer with a visibility test.
+
+The synthesizer samples the objects and poses of a scene itself and
+train_net.py throws the rendered frame away when an object has fewer
+than min_pixels visible pixels. SceneSampler samples the scenes of
+Synthesizer::render and Synthesizer::render_one in numpy instead and
+predicts the visible pixels of every object before the frame is
+rendered with render_scene_python:
+
+    1. the box of the projected model points, clipped to the image, has
+       to hold min_pixels pixels
+    2. the model points of objects whose boxes overlap are splatted into
+       a z-buffer of scale times lower resolution, closed over the gaps
+       between the points, the cells where an object is the nearest one
+       estimate its visible area
+
+Scenes predicted to fail are resampled without rendering. The test is
+coarse, the threshold is margin * min_pixels so that it rejects few
+scenes the renderer would accept, and the frames are still checked after
+rendering. stats counts the scenes at every step.
+"""
+
+import numpy as np
+import scipy.ndimage
+from transforms3d.euler import euler2quat
+from utils.se3 import quat2mat_batch
+
+def load_pose_lists(pose_file):
+    """(n, 7) poses (qw, qx, qy, qz, tx, ty, tz) of every class, read like Synthesizer::loadPoses."""
+    with open(pose_file) as f:
+        filenames = [line.strip() for line in f if line.strip()]
+    return [np.loadtxt(filename, dtype=np.float32).reshape((-1, 7)) for filename in filenames]
+
+class SceneSampler(object):
+
+    def __init__(self, points, intrinsic_matrix, width, height, min_pixels=800, margin=0.75, scale=8,
+                 pose_lists=None, seed=None, closing=2):
+        """points (num_classes, m, 3) model points with the background first, pose_lists for sampled poses."""
+        self.points = points.astype(np.float32)
+        self.intrinsic_matrix = intrinsic_matrix
+        self.width = width
+        self.height = height
+        self.min_pixels = min_pixels
+        self.margin = margin
+        self.scale = scale
+        self.closing = closing
+        self.pose_lists = pose_lists
+        self.rng = np.random.RandomState(seed)
+        self.stats = {'sampled': 0, 'box': 0, 'depth': 0, 'rendered': 0, 'accepted': 0}
+
+    def _random_rotation(self):
+        # AngleAxis(roll, x) * AngleAxis(pitch, y) * AngleAxis(yaw, z) of the synthesizer
+        roll, pitch, yaw = np.radians(self.rng.uniform(0, 360, 3))
+        return euler2quat(roll, pitch, yaw, axes='rxyz')
+
+    def _qt(self, quaternions, translations):
+        num = quaternions.shape[0]
+        poses = np.zeros((num, 7), dtype=np.float32)
+        poses[:, :4] = quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+        poses[:, 4:] = translations
+        return poses
+
+    def _sample_render(self, tnear, tfar, sample_object, sample_pose):
+        # as Synthesizer::render
+        num_classes = self.points.shape[0] - 1
+        if sample_object:
+            num = self.rng.randint(5, 8)
+            class_ids = self.rng.permutation(num_classes)[:num]
+        else:
+            num = num_classes
+            class_ids = np.arange(num_classes)
+
+        quaternions = np.zeros((num, 4))
+        translations = np.zeros((num, 3))
+        for i in xrange(num):
+            while True:
+                if sample_pose:
+                    pose_list = self.pose_lists[class_ids[i]]
+                    pose = pose_list[self.rng.randint(pose_list.shape[0])]
+                    q = pose[:4] + self.rng.uniform(-0.2, 0.2, 4)
+                    t = pose[4:] + self.rng.uniform(-0.1, 0.1, 3)
+                else:
+                    q = self._random_rotation()
+                    t = np.array([self.rng.uniform(-0.1, 0.1), self.rng.uniform(-0.1, 0.1), self.rng.uniform(tnear, tfar)])
+                if i == 0 or np.min(np.linalg.norm(translations[:i] - t, axis=1)) >= 0.2:
+                    break
+            quaternions[i] = q
+            translations[i] = t
+        return class_ids, self._qt(quaternions, translations)
+
+    def _sample_one(self, which_class, extents):
+        # as Synthesizer::render_one
+        num_classes = self.points.shape[0] - 1
+        num = 1 if self.rng.randint(2) == 0 else 2
+        class_ids = [which_class]
+        quaternions = np.zeros((num, 4))
+        translations = np.zeros((num, 3))
+        quaternions[0] = self._random_rotation()
+        translations[0] = [self.rng.uniform(-0.1, 0.1), self.rng.uniform(-0.1, 0.1), self.rng.uniform(0.5, 2.0)]
+        if num > 1:
+            class_id = self.rng.choice([k for k in xrange(num_classes) if k != which_class])
+            class_ids.append(class_id)
+            extent = np.mean(extents[class_id + 1])
+            quaternions[1] = self.rng.uniform(-1, 1, 4)
+            sign = self.rng.choice([-1, 1], 2)
+            translations[1, :2] = translations[0, :2] + sign * extent * self.rng.uniform(0.2, 0.4, 2)
+            translations[1, 2] = translations[0, 2] - self.rng.uniform(0.1, 0.2)
+        return np.array(class_ids), self._qt(quaternions, translations)
+
+    def visible_pixels(self, class_ids, poses, targets=None):
+        """Predicted visible pixels of the objects.
+
+        Only the objects in targets (all by default) need min_pixels, the
+        others are occluders. Returns (pixels, step) where step is 'box'
+        or 'depth' if a target fails that test and None otherwise.
+        """
+        num = len(class_ids)
+        if targets is None:
+            targets = np.arange(num)
+        threshold = self.margin * self.min_pixels
+
+        # project the model points of every object
+        X = self.points[np.asarray(class_ids) + 1]
+        R = quat2mat_batch(poses[:, :4])
+        X = np.matmul(X, R.transpose((0, 2, 1))) + poses[:, None, 4:]
+        z = np.maximum(X[:, :, 2], 1e-6)
+        K = self.intrinsic_matrix
+        u = K[0, 0] * X[:, :, 0] / z + K[0, 2]
+        v = K[1, 1] * X[:, :, 1] / z + K[1, 2]
+
+        # boxes clipped to the image
+        x1 = np.clip(u.min(axis=1), 0, self.width)
+        y1 = np.clip(v.min(axis=1), 0, self.height)
+        x2 = np.clip(u.max(axis=1), 0, self.width)
+        y2 = np.clip(v.max(axis=1), 0, self.height)
+        pixels = (x2 - x1) * (y2 - y1)
+        if np.any(pixels[targets] < threshold):
+            return pixels, 'box'
+
+        # only objects whose box overlaps another box can be occluded
+        overlap = (x1[:, None] < x2[None, :]) & (x1[None, :] < x2[:, None]) \
+                & (y1[:, None] < y2[None, :]) & (y1[None, :] < y2[:, None])
+        np.fill_diagonal(overlap, False)
+        if not np.any(overlap[targets]):
+            return pixels, None
+
+        # low resolution z-buffer of the model points, the holes between the
+        # points of an object are closed at the median depth of the object
+        sc = self.scale
+        gh = (self.height + sc - 1) // sc
+        gw = (self.width + sc - 1) // sc
+        zbuffer = np.full((num, gh * gw), np.inf)
+        inside = (u >= 0) & (u < self.width) & (v >= 0) & (v < self.height) & (X[:, :, 2] > 0)
+        for i in xrange(num):
+            cells = (v[i, inside[i]] // sc).astype(np.int64) * gw + (u[i, inside[i]] // sc).astype(np.int64)
+            np.minimum.at(zbuffer[i], cells, z[i, inside[i]])
+            occupied = np.isfinite(zbuffer[i]).reshape((gh, gw))
+            mask = scipy.ndimage.binary_fill_holes(scipy.ndimage.binary_closing(occupied, iterations=self.closing))
+            if np.any(occupied):
+                zbuffer[i, (mask & ~occupied).ravel()] = np.median(z[i, inside[i]])
+        owners = np.argmin(zbuffer, axis=0)[np.isfinite(zbuffer).any(axis=0)]
+        visible = np.bincount(owners, minlength=num) * sc * sc
+
+        occluded = np.any(overlap, axis=1)
+        pixels[occluded] = np.minimum(pixels[occluded], visible[occluded])
+        if np.any(pixels[targets] < threshold):
+            return pixels, 'depth'
+        return pixels, None
+
+    def _accept(self, class_ids, poses, targets):
+        self.stats['sampled'] += 1
+        _, step = self.visible_pixels(class_ids, poses, targets)
+        if step is not None:
+            self.stats[step] += 1
+            return False
+        self.stats['rendered'] += 1
+        return True
+
+    def sample(self, num_classes, tnear, tfar, sample_object, sample_pose):
+        """(class_indexes, poses) of a scene of render_scene_python, class_indexes padded with -1 to num_classes."""
+        while True:
+            class_ids, poses = self._sample_render(tnear, tfar, sample_object, sample_pose)
+            if self._accept(class_ids, poses, None):
+                break
+        class_indexes = -1 * np.ones((num_classes, ), dtype=np.float32)
+        class_indexes[:len(class_ids)] = class_ids
+        poses_all = np.zeros((num_classes, 7), dtype=np.float32)
+        poses_all[:len(class_ids)] = poses
+        return class_indexes, poses_all
+
+    def sample_one(self, which_class, extents):
+        """(class_indexes, poses) of a scene of render_one, the object which_class first and maybe an occluder."""
+        while True:
+            class_ids, poses = self._sample_one(which_class, extents)
+            if self._accept(class_ids, poses, [0]):
+                break
+        class_indexes = -1 * np.ones((2, ), dtype=np.float32)
+        class_indexes[:len(class_ids)] = class_ids
+        poses_all = np.zeros((2, 7), dtype=np.float32)
+        poses_all[:len(class_ids)] = poses
+        return class_indexes, poses_all
+
+    def record(self, accepted):
+        """Count the outcome of the check after rendering."""
+        if accepted:
+            self.stats['accepted'] += 1
+
+    def summary(self):
+        stats = self.stats
+        return '{} scenes sampled, {} rejected by box, {} by depth, {} rendered, {} accepted ({:.1f}% of the renders)'.format( \
+            stats['sampled'], stats['box'], stats['depth'], stats['rendered'], stats['accepted'], \
+            100.0 * stats['accepted'] / max(stats['rendered'], 1))
@@ -30,3 +30,48 @@ def se3_mul(RT1, RT2):
     return RT_new
     
 
+
+# batched versions of n poses, RT is n x 3 x 4, R is n x 3 x 3 and quaternions are n x 4 in w, x, y, z order
+def se3_mul_batch(RT1, RT2):
+    RT_new = np.zeros((RT1.shape[0], 3, 4), dtype=np.float32)
+    RT_new[:, :, :3] = np.matmul(RT1[:, :, :3], RT2[:, :, :3])
+    RT_new[:, :, 3] = np.matmul(RT1[:, :, :3], RT2[:, :, 3:4])[:, :, 0] + RT1[:, :, 3]
+    return RT_new
+
+def quat2mat_batch(q):
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    R = np.empty((q.shape[0], 3, 3), dtype=np.float32)
+    R[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    R[:, 0, 1] = 2 * (x * y - z * w)
+    R[:, 0, 2] = 2 * (x * z + y * w)
+    R[:, 1, 0] = 2 * (x * y + z * w)
+    R[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    R[:, 1, 2] = 2 * (y * z - x * w)
+    R[:, 2, 0] = 2 * (x * z - y * w)
+    R[:, 2, 1] = 2 * (y * z + x * w)
+    R[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+def mat2quat_batch(R):
+    # Shepperd's method, each rotation uses the largest of w, x, y, z as pivot, w >= 0 as in transforms3d
+    R = np.asarray(R, dtype=np.float64)
+    trace = R[:, 0, 0] + R[:, 1, 1] + R[:, 2, 2]
+    pivot = np.argmax(np.stack([trace, R[:, 0, 0], R[:, 1, 1], R[:, 2, 2]], axis=1), axis=1)
+    q = np.zeros((R.shape[0], 4), dtype=np.float64)
+
+    I = pivot == 0
+    s = 2 * np.sqrt(np.maximum(1 + trace[I], 1e-12))
+    q[I] = np.stack([s / 4, (R[I, 2, 1] - R[I, 1, 2]) / s, (R[I, 0, 2] - R[I, 2, 0]) / s, (R[I, 1, 0] - R[I, 0, 1]) / s], axis=1)
+    I = pivot == 1
+    s = 2 * np.sqrt(np.maximum(1 + R[I, 0, 0] - R[I, 1, 1] - R[I, 2, 2], 1e-12))
+    q[I] = np.stack([(R[I, 2, 1] - R[I, 1, 2]) / s, s / 4, (R[I, 0, 1] + R[I, 1, 0]) / s, (R[I, 0, 2] + R[I, 2, 0]) / s], axis=1)
+    I = pivot == 2
+    s = 2 * np.sqrt(np.maximum(1 - R[I, 0, 0] + R[I, 1, 1] - R[I, 2, 2], 1e-12))
+    q[I] = np.stack([(R[I, 0, 2] - R[I, 2, 0]) / s, (R[I, 0, 1] + R[I, 1, 0]) / s, s / 4, (R[I, 1, 2] + R[I, 2, 1]) / s], axis=1)
+    I = pivot == 3
+    s = 2 * np.sqrt(np.maximum(1 - R[I, 0, 0] - R[I, 1, 1] + R[I, 2, 2], 1e-12))
+    q[I] = np.stack([(R[I, 1, 0] - R[I, 0, 1]) / s, (R[I, 0, 2] + R[I, 2, 0]) / s, (R[I, 1, 2] + R[I, 2, 1]) / s, s / 4], axis=1)
+
+    q[q[:, 0] < 0] *= -1
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
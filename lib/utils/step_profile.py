@@ -0,0 +1,117 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Op-level profile of training steps.
+
+Every cfg.TRAIN.PROFILE_ITERS iterations the train step runs with
+FULL_TRACE. The step stats of the traced steps are accumulated per op
+type and per node: compute time and the bytes allocated. The ranked
+tables are written to profile_ops.txt in the output directory, and the
+step itself to a Chrome timeline, to be opened in chrome://tracing.
+
+GPU ops show up twice in the step stats, as the kernel launch on the
+device and as the kernel on the stream. Kernels are counted from
+stream:all only and launches are kept as their own 'launch' rows, so
+the time of a custom op with a slow host side is still visible.
+"""
+
+import os
+import re
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+_LABEL = re.compile(r'^[^=]+= *([A-Za-z0-9_]+)\(')
+
+def _device_kind(device):
+    device = device.lower()
+    if 'stream:all' in device:
+        return 'gpu'
+    if 'stream:' in device or 'memcpy' in device:
+        return None
+    if 'gpu' in device:
+        return 'launch'
+    return 'cpu'
+
+class StepProfiler(object):
+
+    def __init__(self, graph, output_dir, every, top=30):
+        self.output_dir = output_dir
+        self.every = every
+        self.top = top
+        self.op_types = dict((op.name, op.type) for op in graph.get_operations())
+        self.steps = 0
+        self.step_time = 0.0
+        # (op type, kind) and (node, kind) -> [calls, microseconds, bytes]
+        self.by_type = {}
+        self.by_node = {}
+
+    def options(self, iter):
+        """(options, run_metadata) to pass to sess.run, (None, None) on unprofiled iterations."""
+        if self.every <= 0 or (iter + 1) % self.every != 0:
+            return None, None
+        return tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), tf.RunMetadata()
+
+    def _op_type(self, node):
+        name = node.node_name.split(':')[0]
+        if name in self.op_types:
+            return self.op_types[name]
+        match = _LABEL.match(node.timeline_label)
+        if match is not None:
+            return match.group(1)
+        return name
+
+    def add(self, run_metadata, iter):
+        """Accumulate the step stats of a profiled step and write the tables and its timeline."""
+        start = None
+        end = None
+        for dev_stats in run_metadata.step_stats.dev_stats:
+            kind = _device_kind(dev_stats.device)
+            if kind is None:
+                continue
+            for node in dev_stats.node_stats:
+                micros = node.all_end_rel_micros
+                allocated = sum(m.total_bytes for m in node.memory)
+                for table, key in ((self.by_type, (self._op_type(node), kind)), (self.by_node, (node.node_name, kind))):
+                    entry = table.setdefault(key, [0, 0, 0])
+                    entry[0] += 1
+                    entry[1] += micros
+                    entry[2] += allocated
+                if kind != 'launch':
+                    start = node.all_start_micros if start is None else min(start, node.all_start_micros)
+                    end = node.all_start_micros + micros if end is None else max(end, node.all_start_micros + micros)
+        self.steps += 1
+        if start is not None:
+            self.step_time += end - start
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        trace = timeline.Timeline(run_metadata.step_stats)
+        filename = os.path.join(self.output_dir, 'timeline_iter_{:d}.json'.format(iter + 1))
+        with open(filename, 'w') as fid:
+            fid.write(trace.generate_chrome_trace_format(show_memory=True))
+
+        tables = self.tables()
+        with open(os.path.join(self.output_dir, 'profile_ops.txt'), 'w') as fid:
+            fid.write(tables)
+        print tables
+        print 'timeline written to {}'.format(filename)
+
+    def _table(self, title, table):
+        step = max(self.step_time, 1.0)
+        lines = ['{:48s} {:>6s} {:>8s} {:>10s} {:>9s} {:>7s} {:>10s}'.format( \
+            title, 'device', 'calls', 'ms / step', 'ms / call', '% step', 'MB / step')]
+        rows = sorted(table.items(), key=lambda item: -item[1][1])
+        for (name, kind), (calls, micros, allocated) in rows[:self.top]:
+            lines.append('{:48s} {:>6s} {:8d} {:10.3f} {:9.3f} {:7.2f} {:10.2f}'.format( \
+                name[-48:], kind, calls // self.steps, micros / 1000.0 / self.steps, micros / 1000.0 / max(calls, 1), \
+                100.0 * micros / step, allocated / 1048576.0 / self.steps))
+        return '\n'.join(lines)
+
+    def tables(self):
+        """Ranked tables of the accumulated steps, op types then the slowest nodes."""
+        header = 'profile of {:d} steps, {:.2f} ms / step'.format(self.steps, self.step_time / 1000.0 / max(self.steps, 1))
+        return '\n\n'.join([header, self._table('op type', self.by_type), self._table('node', self.by_node)]) + '\n'
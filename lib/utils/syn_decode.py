@@ -0,0 +1,91 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Conversion of the synthesizer outputs to color, depth and label images.
+
+The synthesizer returns the color as floats in [0, 1], the OpenGL depth
+buffer and a vertex map whose first channel is the class index plus the
+x coordinate. SynDecoder turns them into uint8 color, uint16 depth and
+uint8 labels. Every conversion runs through a float32 scratch image of
+the decoder in place, in the order of operations of the expressions the
+tools used before, so the results are the same to the bit while a frame
+makes no full-size float temporaries:
+
+    depth = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * d - 1)), 0 where d == 1
+    label = np.round(vertmap[:, :, 0]) + 1, 0 where nan
+
+A decoder keeps state, use one per rendering thread. Outputs are new
+arrays unless out is given, since they are often queued.
+"""
+
+import numpy as np
+
+class SynDecoder(object):
+
+    def __init__(self, height, width, znear, zfar, factor_depth):
+        self.znear = znear
+        self.zfar = zfar
+        self.factor_depth = factor_depth
+        self._scratch = np.empty((height, width), dtype=np.float32)
+        self._scratch_color = np.empty((height, width, 4), dtype=np.float32)
+
+    def _buffer(self, shape):
+        if self._scratch.shape != shape:
+            self._scratch = np.empty(shape, dtype=np.float32)
+        return self._scratch
+
+    def color(self, im_syn, out=None):
+        """uint8 color of the float color image in [0, 1]."""
+        if self._scratch_color.shape != im_syn.shape:
+            self._scratch_color = np.empty(im_syn.shape, dtype=np.float32)
+        buf = self._scratch_color
+        np.multiply(im_syn, 255, out=buf)
+        np.clip(buf, 0, 255, out=buf)
+        if out is None:
+            out = np.empty(im_syn.shape, dtype=np.uint8)
+        np.copyto(out, buf, casting='unsafe')
+        return out
+
+    def depth(self, depth_syn, out=None, dtype=np.uint16):
+        """Depth in units of 1 / factor_depth of the depth buffer, (H, W) or its first channel, 0 for the background."""
+        if depth_syn.ndim == 3:
+            depth_syn = depth_syn[:, :, 0]
+        buf = self._buffer(depth_syn.shape)
+        np.multiply(depth_syn, 2, out=buf)
+        buf -= 1
+        buf *= self.zfar - self.znear
+        np.subtract(self.zfar + self.znear, buf, out=buf)
+        np.divide(self.factor_depth * 2 * self.zfar * self.znear, buf, out=buf)
+        buf[depth_syn == 1] = 0
+        if out is None:
+            out = np.empty(depth_syn.shape, dtype=dtype)
+        np.copyto(out, buf, casting='unsafe')
+        return out
+
+    def label(self, vertmap_syn, out=None):
+        """uint8 labels of the class index channel of the vertex map, 0 where nothing is rendered."""
+        buf = self._buffer(vertmap_syn.shape[:2])
+        np.rint(vertmap_syn[:, :, 0], out=buf)
+        buf += 1
+        # fmax returns the other operand for nan
+        np.fmax(buf, 0, out=buf)
+        if out is None:
+            out = np.empty(buf.shape, dtype=np.uint8)
+        np.copyto(out, buf, casting='unsafe')
+        return out
+
+    def vertmap(self, vertmap_syn):
+        """Strip the class index off the first channel and zero nan, in place."""
+        buf = self._buffer(vertmap_syn.shape[:2])
+        np.rint(vertmap_syn[:, :, 0], out=buf)
+        vertmap_syn[:, :, 0] -= buf
+        vertmap_syn[np.isnan(vertmap_syn)] = 0
+        return vertmap_syn
+
+def class_pixels(label, num_classes):
+    """Number of pixels of every class in a uint8 label map."""
+    return np.bincount(label.ravel(), minlength=num_classes)
@@ -0,0 +1,122 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Packed shards of offline synthetic frames.
+
+Frame i of a synthetic set of shard_size frames per shard lives in shard
+i // shard_size, made of two files in the data_syn directory:
+
+    shard_00000.bin  PNG encoded color (BGRA), depth (uint16) and label
+                     maps and the pickled meta data of every frame
+    shard_00000.idx  one int64 record per frame: frame index, then
+                     (offset, size) of color, depth, label and meta
+
+A shard is written to temporary files and renamed when it is complete,
+the .idx last, so a shard whose .idx exists is complete and a generator
+that is interrupted only redoes the shards it was working on. Reading
+memory maps the .bin files, so it works in forked workers and a frame
+only touches its own bytes.
+"""
+
+import os
+import cPickle
+import numpy as np
+import cv2
+
+FIELDS = ('color', 'depth', 'label', 'meta')
+
+def shard_name(root, shard, ext):
+    return os.path.join(root, 'shard_{:05d}.{}'.format(shard, ext))
+
+def shard_frames(shard, shard_size, num_frames):
+    """Frame indexes of a shard."""
+    return xrange(shard * shard_size, min((shard + 1) * shard_size, num_frames))
+
+def completed_shards(root):
+    """Indexes of the shards in root whose index file was written."""
+    if not os.path.exists(root):
+        return []
+    return sorted(int(name[6:11]) for name in os.listdir(root) \
+                  if name.startswith('shard_') and name.endswith('.idx'))
+
+class ShardWriter(object):
+
+    def __init__(self, root, shard):
+        self.root = root
+        self.shard = shard
+        if not os.path.exists(root):
+            os.makedirs(root)
+        self._fid = open(shard_name(root, shard, 'bin.tmp'), 'wb')
+        self._offset = 0
+        self._records = []
+
+    def _append(self, data):
+        self._fid.write(data)
+        offset = self._offset
+        self._offset += len(data)
+        return offset, len(data)
+
+    def add(self, frame, color, depth, label, meta):
+        """Append a frame: color (H, W, 4) uint8, depth (H, W) uint16, label (H, W) uint8 and the meta dict."""
+        record = [frame]
+        for image in (color, depth, label):
+            ok, data = cv2.imencode('.png', image)
+            assert ok, 'failed to encode frame {}'.format(frame)
+            record.extend(self._append(data.tobytes()))
+        record.extend(self._append(cPickle.dumps(meta, cPickle.HIGHEST_PROTOCOL)))
+        self._records.append(record)
+
+    def close(self):
+        """Commit the shard: flush the data, then publish it by renaming the index."""
+        self._fid.flush()
+        os.fsync(self._fid.fileno())
+        self._fid.close()
+        os.rename(shard_name(self.root, self.shard, 'bin.tmp'), shard_name(self.root, self.shard, 'bin'))
+        records = np.array(self._records, dtype=np.int64).reshape((-1, 1 + 2 * len(FIELDS)))
+        filename = shard_name(self.root, self.shard, 'idx.tmp')
+        records.tofile(filename)
+        os.rename(filename, shard_name(self.root, self.shard, 'idx'))
+        return records.shape[0]
+
+class SynShards(object):
+
+    def __init__(self, root):
+        self.root = root
+        self.index = {}
+        self._maps = {}
+        for shard in completed_shards(root):
+            records = np.fromfile(shard_name(root, shard, 'idx'), dtype=np.int64).reshape((-1, 1 + 2 * len(FIELDS)))
+            for record in records:
+                self.index[int(record[0])] = (shard, record[1:])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, frame):
+        return frame in self.index
+
+    def missing(self, num_frames):
+        """Indexes below num_frames of the frames not in a completed shard."""
+        return [frame for frame in xrange(num_frames) if frame not in self.index]
+
+    def _bytes(self, shard, offset, size):
+        if shard not in self._maps:
+            self._maps[shard] = np.memmap(shard_name(self.root, shard, 'bin'), dtype=np.uint8, mode='r')
+        return self._maps[shard][offset:offset + size]
+
+    def read(self, frame, fields=FIELDS):
+        """Decoded fields of a frame, color and depth as cv2.IMREAD_UNCHANGED would read the PNG files."""
+        shard, spans = self.index[frame]
+        out = {}
+        for field in fields:
+            k = FIELDS.index(field)
+            data = self._bytes(shard, spans[2 * k], spans[2 * k + 1])
+            if field == 'meta':
+                out[field] = cPickle.loads(data.tobytes())
+            else:
+                out[field] = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        return out
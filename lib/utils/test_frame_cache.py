@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Regression test of the FrameCache spill ring.
+
+Frames of random sizes go through a small LRU into a spill file a few
+frames long, so the ring wraps many times. Every frame is then looked up
+again and must come back with the bytes it was written with.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.frame_cache import FrameCache
+
+def make_frame(i, rng):
+    n = rng.randint(50, 1200)
+    return {'data': (np.arange(n, dtype=np.int64) * 31 + i).astype(np.uint8),
+            'index': np.array([i], dtype=np.int32)}
+
+def check_no_overlap(cache):
+    ranges = sorted((offset, offset + size) for offset, size, _ in cache._spilled.itervalues())
+    for (_, end), (start, _) in zip(ranges[:-1], ranges[1:]):
+        assert end <= start, 'spilled frames overlap: {} > {}'.format(end, start)
+
+def test_spill_wrap_around():
+    rng = np.random.RandomState(0)
+    root = tempfile.mkdtemp()
+    spill_hits = 0
+    try:
+        for trial in xrange(20):
+            cache = FrameCache(3000, os.path.join(root, 'spill.bin'), 5000)
+            frames = [make_frame(i, rng) for i in xrange(30)]
+            for i, frame in enumerate(frames):
+                filename = os.path.join(root, '{:02d}.bin'.format(i))
+                open(filename, 'wb').close()
+                cache.get('frame', filename, lambda f, frame=frame: frame)
+                check_no_overlap(cache)
+
+            # frames still cached must be exact, the others are decoded again
+            for i in rng.permutation(len(frames)):
+                frame = frames[i]
+                filename = os.path.join(root, '{:02d}.bin'.format(i))
+                arrays = cache.get('frame', filename, lambda f, frame=frame: frame)
+                for name in frame:
+                    assert np.array_equal(arrays[name], frame[name]), \
+                        'trial {}, lookup {}: wrong {}'.format(trial, i, name)
+                check_no_overlap(cache)
+            spill_hits += cache.spill_hits
+        assert spill_hits > 0
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    test_spill_wrap_around()
+    print 'ok'
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Regression test of SynDecoder against the conversions it replaced.
+
+The online synthesizer of tools/train_net.py queued the depth and labels
+computed by the expressions below, cast to uint16 and uint8 at the put.
+The decoded frames must be the same to the bit, and of the same dtypes.
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.syn_decode import SynDecoder
+
+height = 48
+width = 64
+znear = 0.25
+zfar = 6.0
+factor_depth = 1000.0
+
+def render(rng):
+    depth_syn = rng.uniform(0.5, 1.0, size=(height, width, 3)).astype(np.float32)
+    depth_syn[rng.rand(height, width) < 0.3] = 1
+    vertmap_syn = rng.uniform(-0.5, 0.5, size=(height, width, 3)).astype(np.float32)
+    vertmap_syn[:, :, 0] += rng.randint(-1, 22, size=(height, width))
+    vertmap_syn[rng.rand(height, width) < 0.2] = np.nan
+    return depth_syn, vertmap_syn
+
+def baseline(depth_syn, vertmap_syn):
+    depth_syn = depth_syn[:, :, 0]
+    im_depth_raw = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
+    I = np.where(depth_syn == 1)
+    im_depth_raw[I[0], I[1]] = 0
+    label = np.round(vertmap_syn[:, :, 0]) + 1
+    label[np.isnan(label)] = 0
+    return im_depth_raw, label
+
+def test_queued_frames():
+    rng = np.random.RandomState(0)
+    decoder = SynDecoder(height, width, znear, zfar, factor_depth)
+    for _ in xrange(20):
+        depth_syn, vertmap_syn = render(rng)
+        depth_ref, label_ref = baseline(depth_syn, vertmap_syn)
+
+        im_depth_raw = decoder.depth(depth_syn, dtype=np.float32)
+        label = decoder.label(vertmap_syn)
+        assert im_depth_raw.dtype == depth_ref.dtype
+        assert np.array_equal(im_depth_raw, depth_ref)
+
+        # as put on the queue
+        depth_queued = im_depth_raw.astype(np.uint16)
+        label_queued = label.astype(np.uint8)
+        assert np.array_equal(depth_queued, depth_ref.astype(np.uint16))
+        assert np.array_equal(label_queued, label_ref.astype(np.uint8))
+        assert np.array_equal(decoder.depth(depth_syn), depth_queued)
+
+if __name__ == '__main__':
+    test_queued_frames()
+    print 'ok'
@@ -25,6 +25,8 @@ class Voxelizer(object):
         self.voxelized = False
         self.height = 0
         self.width = 0
+        self._ray_cache = {}
+        self._points = None
 
     def setup(self, min_x, min_y, min_z, max_x, max_y, max_z):
         self.min_x = min_x
@@ -103,89 +105,89 @@ class Voxelizer(object):
         return indexes
 
 
-    # backproject pixels into 3D points
-    def backproject(self, im_depth, meta_data):
-        depth = im_depth.astype(np.float32, copy=True) / meta_data['factor_depth']
+    def _rays(self, key, compute):
+        # ray tables of the cameras seen last, frames of one camera reuse them
+        rays = self._ray_cache.get(key)
+        if rays is None:
+            if len(self._ray_cache) >= 8:
+                self._ray_cache.clear()
+            rays = compute()
+            self._ray_cache[key] = rays
+        return rays
+
+    def _points_buffer(self, num):
+        if self._points is None or self._points.shape[1] != num:
+            self._points = np.empty((3, num), dtype=np.float64)
+        return self._points
+
+    @staticmethod
+    def _pixels(height, width):
+        # homogeneous pixel coordinates, (3, height * width)
+        x, y = np.meshgrid(np.arange(width), np.arange(height))
+        ones = np.ones((height, width), dtype=np.float32)
+        return np.stack((x, y, ones), axis=2).reshape(width*height, 3).transpose()
 
-        # compute projection matrix
-        P = meta_data['projection_matrix']
-        P = np.matrix(P)
+    def _world_rays(self, P, C, height, width):
         Pinv = np.linalg.pinv(P)
+        x3d = np.dot(Pinv, self._pixels(height, width))
+        x3d = x3d[:3, :] / x3d[3, :]
 
-        # compute the 3D points        
+        # unit rays from the camera location
+        R = x3d - C
+        R /= np.linalg.norm(R, axis=0)
+        return R
+
+    # backproject pixels into 3D points
+    def backproject(self, im_depth, meta_data, reuse=False):
+        """(3, height * width) points of the depth image in world coordinates, nan for missing depth.
+
+        With reuse the points are written to a buffer of the voxelizer that
+        the next call with reuse overwrites.
+        """
+        depth = im_depth.astype(np.float32, copy=True) / meta_data['factor_depth']
         height = depth.shape[0]
         width = depth.shape[1]
         self.height = height
         self.width = width
 
-        # camera location
-        C = meta_data['camera_location']
-        C = np.matrix(C).transpose()
-        Cmat = np.tile(C, (1, width*height))
-
-        # construct the 2D points matrix
-        x, y = np.meshgrid(np.arange(width), np.arange(height))
-        ones = np.ones((height, width), dtype=np.float32)
-        x2d = np.stack((x, y, ones), axis=2).reshape(width*height, 3)
-
-        # backprojection
-        x3d = Pinv * x2d.transpose()
-        x3d[0,:] = x3d[0,:] / x3d[3,:]
-        x3d[1,:] = x3d[1,:] / x3d[3,:]
-        x3d[2,:] = x3d[2,:] / x3d[3,:]
-        x3d = x3d[:3,:]
-
-        # compute the ray
-        R = x3d - Cmat
-
-        # compute the norm
-        N = np.linalg.norm(R, axis=0)
-        
-        # normalization
-        R = np.divide(R, np.tile(N, (3,1)))
-
-        # compute the 3D points
-        X = Cmat + np.multiply(np.tile(depth.reshape(1, width*height), (3, 1)), R)
+        P = np.asarray(meta_data['projection_matrix'], dtype=np.float64)
+        C = np.asarray(meta_data['camera_location'], dtype=np.float64).reshape((3, 1))
+        R = self._rays(('world', P.tobytes(), C.tobytes(), height, width), \
+                       lambda: self._world_rays(P, C, height, width))
 
-        # mask
-        index = np.where(im_depth.flatten() == 0)
-        X[:,index] = np.nan
+        X = self._points_buffer(height * width) if reuse else None
+        X = np.multiply(depth.reshape((1, height * width)), R, out=X)
+        X += C
+        X[:, im_depth.ravel() == 0] = np.nan
+        return X
 
-        return np.array(X)
-
-    # backproject pixels into 3D points in camera's coordinate system
-    def backproject_camera(self, im_depth, meta_data):
-
-        depth = im_depth.astype(np.float32, copy=True) / meta_data['factor_depth']
-
-        # get intrinsic matrix
-        K = meta_data['intrinsic_matrix']
-        K = np.matrix(K)
-        Kinv = np.linalg.inv(K)
+    def _camera_rays(self, K, height, width):
+        Kinv = np.linalg.inv(np.matrix(K))
         if cfg.FLIP_X:
             Kinv[0, 0] = -1 * Kinv[0, 0]
             Kinv[0, 2] = -1 * Kinv[0, 2]
+        return np.array(Kinv * self._pixels(height, width))
 
-        # compute the 3D points        
-        width = depth.shape[1]
-        height = depth.shape[0]
-
-        # construct the 2D points matrix
-        x, y = np.meshgrid(np.arange(width), np.arange(height))
-        ones = np.ones((height, width), dtype=np.float32)
-        x2d = np.stack((x, y, ones), axis=2).reshape(width*height, 3)
-
-        # backprojection
-        R = Kinv * x2d.transpose()
+    # backproject pixels into 3D points in camera's coordinate system
+    def backproject_camera(self, im_depth, meta_data, reuse=False):
+        """(3, height * width) points of the depth image in the camera frame, nan for missing depth.
 
-        # compute the 3D points
-        X = np.multiply(np.tile(depth.reshape(1, width*height), (3, 1)), R)
+        The rays Kinv * (x, y, 1) of the pixels are cached per intrinsic
+        matrix and image size. With reuse the points are written to a buffer
+        of the voxelizer that the next call with reuse overwrites.
+        """
+        depth = im_depth.astype(np.float32, copy=True) / meta_data['factor_depth']
+        height = depth.shape[0]
+        width = depth.shape[1]
 
-        # mask
-        index = np.where(im_depth.flatten() == 0)
-        X[:,index] = np.nan
+        K = np.asarray(meta_data['intrinsic_matrix'], dtype=np.float64)
+        R = self._rays(('camera', K.tobytes(), cfg.FLIP_X, height, width), \
+                       lambda: self._camera_rays(K, height, width))
 
-        return np.array(X)
+        X = self._points_buffer(height * width) if reuse else None
+        X = np.multiply(depth.reshape((1, height * width)), R, out=X)
+        X[:, im_depth.ravel() == 0] = np.nan
+        return X
 
     def check_points(self, points, pose):
         # transform the points
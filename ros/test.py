@@ -4,7 +4,7 @@ import cv2
 import numpy as np
 from fcn.config import cfg
 from utils.blob import im_list_to_blob, pad_im, unpad_im, add_noise
-from normals import gpu_normals
+from utils.normals_wrapper import compute_normals
 from std_msgs.msg import String
 from sensor_msgs.msg import Image
 
@@ -71,26 +71,38 @@ def get_image_blob(im, im_depth, meta_data, cfg):
             in the image pyramid
     """
 
-    # RGB
-    im_orig = im.astype(np.float32, copy=True)
-    im_orig -= cfg.PIXEL_MEANS
     processed_ims = []
     im_scale_factors = []
     assert len(cfg.TEST.SCALES_BASE) == 1
     im_scale = cfg.TEST.SCALES_BASE[0]
 
-    im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    # RGB
+    if cfg.INPUT_RAW:
+        # uint8 color and uint16 depth, the network subtracts the means and
+        # clips the depth at 2000 instead of scaling it by its maximum
+        color_dtype, depth_dtype, depth_channels = np.uint8, np.uint16, 1
+        im = cv2.resize(im, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    else:
+        color_dtype, depth_dtype, depth_channels = np.float32, np.float32, 3
+        im_orig = im.astype(np.float32, copy=True)
+        im_orig -= cfg.PIXEL_MEANS
+        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
     im_scale_factors.append(im_scale)
     processed_ims.append(im)
 
     # depth
-    im_orig = im_depth.astype(np.float32, copy=True)
-    im_orig = im_orig / im_orig.max() * 255
-    im_orig = np.tile(im_orig[:,:,np.newaxis], (1,1,3))
-    im_orig -= cfg.PIXEL_MEANS
-
     processed_ims_depth = []
-    im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    if cfg.INPUT_RAW:
+        # a single uint16 channel, im_list_to_blob keeps one
+        if len(im_depth.shape) == 3:
+            im_depth = im_depth[:, :, 0]
+        im = cv2.resize(im_depth.astype(np.uint16, copy=False), None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+    else:
+        im_orig = im_depth.astype(np.float32, copy=True)
+        im_orig = im_orig / im_orig.max() * 255
+        im_orig = np.tile(im_orig[:,:,np.newaxis], (1,1,3))
+        im_orig -= cfg.PIXEL_MEANS
+        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
     processed_ims_depth.append(im)
 
     if cfg.INPUT == 'NORMAL':
@@ -103,24 +115,27 @@ def get_image_blob(im, im_depth, meta_data, cfg):
 
         # normals
         depth = im_depth.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
-        nmap = gpu_normals.gpu_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
+        nmap = compute_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
         im_normal = 127.5 * nmap + 127.5
         im_normal = im_normal.astype(np.uint8)
         im_normal = im_normal[:, :, (2, 1, 0)]
         im_normal = cv2.bilateralFilter(im_normal, 9, 75, 75)
 
         processed_ims_normal = []
-        im_orig = im_normal.astype(np.float32, copy=True)
-        im_orig -= cfg.PIXEL_MEANS
-        im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        if cfg.INPUT_RAW:
+            im_normal = cv2.resize(im_normal, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        else:
+            im_orig = im_normal.astype(np.float32, copy=True)
+            im_orig -= cfg.PIXEL_MEANS
+            im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims_normal.append(im_normal)
-        blob_normal = im_list_to_blob(processed_ims_normal, 3)
+        blob_normal = im_list_to_blob(processed_ims_normal, 3, color_dtype)
     else:
         blob_normal = []
 
     # Create a blob to hold the input images
-    blob = im_list_to_blob(processed_ims, 3)
-    blob_depth = im_list_to_blob(processed_ims_depth, 3)
+    blob = im_list_to_blob(processed_ims, 3, color_dtype)
+    blob_depth = im_list_to_blob(processed_ims_depth, depth_channels, depth_dtype)
         
     return blob, blob_depth, blob_normal, np.array(im_scale_factors)
 
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Benchmark the single frame pose pipeline stage by stage.
+
+Replays a fixed list of RGB-D frames, data/demo_images by default or the
+first frames of a dataset split, through im_segment_single_frame and the
+ICP refinement, as test_net_images does, with span tracing on. Reports
+the mean and the p50/p95/p99 latency of every traced stage per frame,
+frames per second and the peak RSS, and writes them as JSON. 'network'
+is the sum of 'enqueue' and 'sess.run', the forward pass including Hough
+voting, so every stage of earlier reports is still there. With
+TEST.TRACE_FILE set in the config the Chrome trace is written as well.
+--compare prints the ratios to an earlier JSON, e.g. of the parent commit.
+"""
+
+import _init_paths
+from fcn.test import im_segment_single_frame, _extract_vertmap
+from fcn.refine_scheduler import RefineScheduler
+from fcn.config import cfg, cfg_from_file
+from datasets.factory import get_imdb
+from utils.blob import pad_im, unpad_im
+from utils.voxelizer import Voxelizer
+from utils.trace import get_tracer, span, begin
+from collections import defaultdict
+import argparse
+import glob
+import json
+import resource
+import subprocess
+import os, sys
+import tensorflow as tf
+import numpy as np
+import scipy.io
+import cv2
+
+# traced spans in pipeline order, 'total' is the whole frame
+STAGES = ['read', 'preprocess', 'blob build', 'network', 'enqueue', 'sess.run', 'nms', 'pose combine', \
+          'postprocess', 'refine', 'icp', 'visualize', 'total']
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the single frame pipeline')
+    parser.add_argument('--gpu', dest='gpu_id', help='GPU id to use',
+                        default=0, type=int)
+    parser.add_argument('--model', dest='model',
+                        help='model to test',
+                        default=None, type=str)
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file', default=None, type=str)
+    parser.add_argument('--imdb', dest='imdb_name',
+                        help='dataset of the classes and models', default='lov_keyframe', type=str)
+    parser.add_argument('--network', dest='network_name',
+                        help='name of the network',
+                        default=None, type=str)
+    parser.add_argument('--cad', dest='cad_name',
+                        help='name of the CAD file',
+                        default=None, type=str)
+    parser.add_argument('--pose', dest='pose_name',
+                        help='name of the pose files',
+                        default=None, type=str)
+    parser.add_argument('--images', dest='images',
+                        help='directory of *-color.png and *-depth.png frames, or "imdb" for the dataset split',
+                        default='data/demo_images', type=str)
+    parser.add_argument('--intrinsics', dest='intrinsics',
+                        help='fx,fy,px,py of the image directory',
+                        default='1066.778,1067.487,312.9869,241.3109', type=str)
+    parser.add_argument('--num', dest='num_frames',
+                        help='number of measured frames, the frame list is repeated',
+                        default=100, type=int)
+    parser.add_argument('--warmup', dest='warmup',
+                        help='number of frames before measuring',
+                        default=5, type=int)
+    parser.add_argument('--visualize', dest='visualize',
+                        help='also time building the label image and vertex map',
+                        action='store_true')
+    parser.add_argument('--output', dest='output',
+                        help='JSON file of the results', default=None, type=str)
+    parser.add_argument('--compare', dest='compare',
+                        help='JSON file of an earlier run to compare with', default=None, type=str)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+
+def list_frames(args, imdb):
+    """(color file, depth file, meta data) of the frames to replay."""
+    frames = []
+    if args.images == 'imdb':
+        for index in imdb.image_index[:args.num_frames]:
+            meta_data = scipy.io.loadmat(imdb.metadata_path_from_index(index))
+            meta_data = {'intrinsic_matrix': meta_data['intrinsic_matrix'], \
+                         'factor_depth': float(meta_data['factor_depth'])}
+            frames.append((imdb.image_path_from_index(index), imdb.depth_path_from_index(index), meta_data))
+    else:
+        fx, fy, px, py = [float(x) for x in args.intrinsics.split(',')]
+        K = np.array([[fx, 0, px], [0, fy, py], [0, 0, 1]])
+        for filename in sorted(glob.glob(os.path.join(args.images, '*-color.png'))):
+            frames.append((filename, filename.replace('-color.png', '-depth.png'), \
+                           {'intrinsic_matrix': K, 'factor_depth': 1000.0}))
+    return frames
+
+
+def read_frame(rgb_filename, depth_filename):
+    rgba = pad_im(cv2.imread(rgb_filename, cv2.IMREAD_UNCHANGED), 16)
+    if rgba.shape[2] == 4:
+        im = np.copy(rgba[:,:,:3])
+        alpha = rgba[:,:,3]
+        I = np.where(alpha == 0)
+        im[I[0], I[1], :] = 0
+    else:
+        im = rgba
+    if os.path.isfile(depth_filename):
+        im_depth = pad_im(cv2.imread(depth_filename, cv2.IMREAD_UNCHANGED), 16)
+    else:
+        im_depth = np.zeros((im.shape[0], im.shape[1]), dtype=np.uint16)
+    return im, im_depth
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds of every stage that ran."""
+    stats = {}
+    for name in STAGES:
+        if len(samples[name]) == 0:
+            continue
+        x = 1000.0 * np.array(samples[name])
+        stats[name] = {'mean': float(x.mean()), 'p50': float(np.percentile(x, 50)), \
+                       'p95': float(np.percentile(x, 95)), 'p99': float(np.percentile(x, 99)), \
+                       'max': float(x.max()), 'calls': len(x)}
+    return stats
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=cfg.ROOT_DIR).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+
+    imdb = get_imdb(args.imdb_name)
+    frames = list_frames(args, imdb)
+    if len(frames) == 0:
+        print 'no frames in {}'.format(args.images)
+        sys.exit(1)
+    print '{} frames, {} warmup and {} measured'.format(len(frames), args.warmup, args.num_frames)
+
+    cfg.GPU_ID = args.gpu_id
+    cfg.TRAIN.NUM_STEPS = 1
+    cfg.TRAIN.GRID_SIZE = cfg.TEST.GRID_SIZE
+    cfg.TRAIN.TRAINABLE = False
+    cfg.CAD = args.cad_name
+    cfg.POSE = args.pose_name
+    cfg.IS_TRAIN = False
+    cfg.TEST.TRACE = True
+
+    from networks.factory import get_network
+    network = get_network(args.network_name)
+
+    saver = tf.train.Saver()
+    gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=0.6)
+    sess = tf.Session(config=tf.ConfigProto(allow_soft_placement=True, gpu_options=gpu_options))
+    saver.restore(sess, args.model)
+
+    voxelizer = Voxelizer(cfg.TEST.GRID_SIZE, imdb.num_classes)
+    voxelizer.setup(-3, -3, -3, 3, 3, 4)
+
+    refiner = None
+    if cfg.TEST.VERTEX_REG_2D and cfg.TEST.POSE_REG and cfg.TEST.POSE_REFINE:
+        from synthesize import libsynthesizer
+        synthesizer = libsynthesizer.Synthesizer(cfg.CAD, cfg.POSE)
+        synthesizer.setup(cfg.TRAIN.SYN_WIDTH, cfg.TRAIN.SYN_HEIGHT)
+        refiner = RefineScheduler(synthesizer, imdb._points_all, \
+            cfg.TEST.ICP_DEADLINE, cfg.TEST.ICP_ERROR_THRESHOLD, cfg.TEST.ICP_TRACK_RADIUS, cfg.TEST.ICP_TRACK_MAX_SKIP)
+
+    im_scale = cfg.TEST.SCALES_BASE[0]
+    samples = defaultdict(list)
+    for k in xrange(args.warmup + args.num_frames):
+        rgb_filename, depth_filename, meta_data = frames[k % len(frames)]
+        first = get_tracer().count()
+        total = begin('total', frame=k)
+
+        with span('read'):
+            im, im_depth = read_frame(rgb_filename, depth_filename)
+
+        labels, probs, vertex_pred, rois, poses = im_segment_single_frame(sess, network, im, im_depth, meta_data, \
+            voxelizer, imdb._extents, imdb._points_all, imdb._symmetry, imdb.num_classes)
+        labels = unpad_im(labels, 16)
+
+        if refiner is not None:
+            with span('refine'):
+                K = meta_data['intrinsic_matrix']
+                parameters = np.array([K[0, 0] * im_scale, K[1, 1] * im_scale, K[0, 2] * im_scale, K[1, 2] * im_scale, \
+                                       0.25, 6.0, meta_data['factor_depth']], dtype=np.float32)
+                depth = cv2.resize(im_depth, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+                poses_new, poses_icp = refiner.refine(labels.copy(), depth, parameters, rois, poses)
+
+        if args.visualize:
+            with span('visualize'):
+                im_label = imdb.labels_to_image(im, labels)
+                if cfg.TEST.VERTEX_REG_2D:
+                    vertmap = _extract_vertmap(labels, vertex_pred, imdb._extents, imdb.num_classes)
+
+        total.end()
+        if k >= args.warmup:
+            # sum the spans of the frame per name, e.g. ICP of several objects
+            durations = defaultdict(float)
+            for _, name, _, duration, _, _ in get_tracer().events(first):
+                durations[name] += duration
+                if name in ('enqueue', 'sess.run'):
+                    durations['network'] += duration
+            for name, duration in durations.items():
+                samples[name].append(duration)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    stats = summarize(samples)
+    result = {'commit': git_commit(), 'model': args.model, 'network': args.network_name, \
+              'images': args.images, 'frames': args.num_frames, 'warmup': args.warmup, \
+              'fps': args.num_frames / float(np.sum(samples['total'])), 'peak_rss_mb': rss, \
+              'pose_refine': bool(refiner is not None), 'stages': stats}
+
+    print '{:12s} {:>9s} {:>9s} {:>9s} {:>9s}'.format('stage (ms)', 'mean', 'p50', 'p95', 'p99')
+    for name in STAGES:
+        if name in stats:
+            s = stats[name]
+            print '{:12s} {:9.2f} {:9.2f} {:9.2f} {:9.2f}'.format(name, s['mean'], s['p50'], s['p95'], s['p99'])
+    print '{:.2f} fps, peak RSS {:.0f} MB'.format(result['fps'], rss)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as fid:
+            baseline = json.load(fid)
+        print 'compared with {} (ratio of p50, p95, below 1 is faster)'.format(baseline.get('commit'))
+        for name in STAGES:
+            if name in stats and name in baseline['stages']:
+                b = baseline['stages'][name]
+                print '{:12s} {:9.3f} {:9.3f}'.format(name, stats[name]['p50'] / max(b['p50'], 1e-6), \
+                    stats[name]['p95'] / max(b['p95'], 1e-6))
+        print '{:12s} {:9.3f}'.format('fps', result['fps'] / baseline['fps'])
+
+    if args.output is not None:
+        with open(args.output, 'w') as fid:
+            json.dump(result, fid, indent=2, sort_keys=True)
+        print 'results written to {}'.format(args.output)
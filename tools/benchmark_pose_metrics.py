@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Benchmark the batched pose errors against utils.pose_error.
+
+Loads the ground truth poses of a dataset split (YCB-Video keyframes by
+default), perturbs them into estimates, and evaluates all pairs with
+PoseEvaluator and with the per pair functions add/adi/re/te/reproj.
+Exits with 1 if the errors differ.
+"""
+
+import _init_paths
+from fcn.config import cfg, cfg_from_file
+from datasets.factory import get_imdb
+from utils.pose_error import add, adi, re, te, reproj
+from utils.pose_metrics import PoseEvaluator
+from transforms3d.quaternions import quat2mat
+import argparse
+import time
+import sys
+import numpy as np
+import scipy.io
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the batched pose errors')
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file', default=None, type=str)
+    parser.add_argument('--imdb', dest='imdb_name',
+                        help='dataset to evaluate on', default='lov_keyframe', type=str)
+    parser.add_argument('--rotation', dest='rotation',
+                        help='std of the rotation noise in radians', default=0.1, type=float)
+    parser.add_argument('--translation', dest='translation',
+                        help='std of the translation noise in meters', default=0.02, type=float)
+
+    args = parser.parse_args()
+    return args
+
+
+def random_rotations(num, sigma):
+    """Rotation matrices of random axis and normally distributed angle."""
+    axis = np.random.randn(num, 3)
+    axis /= np.linalg.norm(axis, axis=1)[:, np.newaxis]
+    angle = sigma * np.random.randn(num)
+    q = np.zeros((num, 4), dtype=np.float64)
+    q[:, 0] = np.cos(angle / 2)
+    q[:, 1:] = axis * np.sin(angle / 2)[:, np.newaxis]
+    return np.array([quat2mat(q[i]) for i in xrange(num)])
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+    np.random.seed(cfg.RNG_SEED)
+
+    imdb = get_imdb(args.imdb_name)
+    symmetric = [cls in ('024_bowl', '036_wood_block', '061_foam_brick') for cls in imdb.classes]
+
+    # all ground truth poses of the split
+    classes = []
+    poses_gt = []
+    K = None
+    for index in imdb.image_index:
+        meta_data = scipy.io.loadmat(imdb.metadata_path_from_index(index))
+        if K is None:
+            K = meta_data['intrinsic_matrix']
+        poses = meta_data['poses']
+        if len(poses.shape) == 2:
+            poses = np.reshape(poses, (3, 4, 1))
+        for j in xrange(poses.shape[2]):
+            if meta_data['cls_indexes'][j] > 0:
+                classes.append(int(meta_data['cls_indexes'][j]))
+                poses_gt.append(poses[:, :, j])
+    classes = np.array(classes, dtype=np.int64)
+    RT_gt = np.array(poses_gt, dtype=np.float64)
+    num = classes.shape[0]
+    print '{} images, {} ground truth poses'.format(len(imdb.image_index), num)
+
+    RT_est = RT_gt.copy()
+    RT_est[:, :, :3] = np.matmul(random_rotations(num, args.rotation), RT_gt[:, :, :3])
+    RT_est[:, :, 3] += args.translation * np.random.randn(num, 3)
+
+    t = time.time()
+    errors = PoseEvaluator(imdb._points, symmetric).evaluate(classes, RT_est, RT_gt, K)
+    t_batch = time.time() - t
+
+    t = time.time()
+    errors_ref = np.zeros((num, 4), dtype=np.float64)
+    for i in xrange(num):
+        cls = classes[i]
+        R_est, t_est = RT_est[i, :, :3], RT_est[i, :, 3]
+        R_gt, t_gt = RT_gt[i, :, :3], RT_gt[i, :, 3]
+        if symmetric[cls]:
+            errors_ref[i, 0] = adi(R_est, t_est, R_gt, t_gt, imdb._points[cls])
+        else:
+            errors_ref[i, 0] = add(R_est, t_est, R_gt, t_gt, imdb._points[cls])
+        errors_ref[i, 1] = re(R_est, R_gt)
+        errors_ref[i, 2] = te(t_est, t_gt)
+        errors_ref[i, 3] = reproj(K, R_est, t_est, R_gt, t_gt, imdb._points[cls])
+    t_ref = time.time() - t
+
+    print 'batched {:.3f}s, per pair {:.3f}s, speedup {:.2f}x'.format(t_batch, t_ref, t_ref / t_batch)
+    match = True
+    for k, key in enumerate(['add', 'rotation', 'translation', 'reprojection']):
+        diff = np.abs(errors[key] - errors_ref[:, k]).max()
+        print '{} max abs difference {:g}'.format(key, diff)
+        # reproj works in float32 pixels, acos is steep near zero rotation
+        if diff > {'add': 1e-6, 'rotation': 1e-4, 'translation': 1e-6, 'reprojection': 1e-3}[key]:
+            match = False
+    if not match:
+        print 'batched errors do not match utils.pose_error'
+        sys.exit(1)
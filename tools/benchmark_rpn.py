@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Benchmark the python RPN layers of the VGG16DET detector.
+
+Runs proposal_layer at the cfg.TRAIN.RPN_* and cfg.TEST.RPN_* settings and
+anchor_target_layer on random network outputs. Proposals are checked
+against the full-argsort baseline.
+"""
+
+import _init_paths
+from fcn.config import cfg, cfg_from_file
+from rpn_layer.snippets import generate_anchors_pre, print_rpn_timing
+from rpn_layer.proposal_layer import proposal_layer
+from rpn_layer.anchor_target_layer import anchor_target_layer
+from utils.bbox_transform import bbox_transform_inv, clip_boxes
+from utils.nms_wrapper import nms
+import argparse
+import time
+import sys
+import numpy as np
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the RPN layers')
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file', default=None, type=str)
+    parser.add_argument('--height', dest='height', help='image height',
+                        default=480, type=int)
+    parser.add_argument('--width', dest='width', help='image width',
+                        default=640, type=int)
+    parser.add_argument('--iters', dest='iters', help='number of calls per setting',
+                        default=20, type=int)
+    parser.add_argument('--gt', dest='num_gt', help='number of gt boxes',
+                        default=8, type=int)
+
+    args = parser.parse_args()
+    return args
+
+
+def proposal_layer_baseline(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, anchors, num_anchors):
+    """proposal_layer before top-k selection: decode and sort all anchors"""
+    pre_nms_topN = cfg[cfg_key].RPN_PRE_NMS_TOP_N
+    post_nms_topN = cfg[cfg_key].RPN_POST_NMS_TOP_N
+    scores = rpn_cls_prob[:, :, :, num_anchors:].reshape((-1, 1))
+    proposals = bbox_transform_inv(anchors, rpn_bbox_pred.reshape((-1, 4)))
+    proposals = clip_boxes(proposals, im_info[:2])
+    order = scores.ravel().argsort()[::-1]
+    if pre_nms_topN > 0:
+        order = order[:pre_nms_topN]
+    proposals = proposals[order, :]
+    scores = scores[order]
+    dets = np.hstack((proposals, scores))
+    keep = nms(dets, cfg[cfg_key].RPN_NMS_THRESH)
+    if post_nms_topN > 0:
+        keep = keep[:post_nms_topN]
+    return proposals[keep, :], dets[keep, 4:5]
+
+
+def random_gt_boxes(num, height, width):
+    w = np.random.uniform(0.1, 0.3, size=num) * width
+    h = np.random.uniform(0.1, 0.3, size=num) * height
+    x1 = np.random.uniform(0, 1, size=num) * (width - w)
+    y1 = np.random.uniform(0, 1, size=num) * (height - h)
+    cls = np.random.randint(1, 22, size=num)
+    return np.vstack((x1, y1, x1 + w, y1 + h, cls)).transpose().astype(np.float32)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+    np.random.seed(cfg.RNG_SEED)
+
+    im_scale = cfg.TEST.SCALES_BASE[0]
+    im_height = int(args.height * im_scale)
+    im_width = int(args.width * im_scale)
+    im_info = np.array([im_height, im_width, im_scale], dtype=np.float32)
+    height = int(np.ceil(im_height / float(cfg.FEATURE_STRIDE)))
+    width = int(np.ceil(im_width / float(cfg.FEATURE_STRIDE)))
+    num_anchors = len(cfg.ANCHOR_SCALES) * len(cfg.ANCHOR_RATIOS)
+
+    # anchors, first call fills the cache
+    anchors, length = generate_anchors_pre(height, width, cfg.FEATURE_STRIDE, cfg.ANCHOR_SCALES, cfg.ANCHOR_RATIOS)
+    t = time.time()
+    for _ in range(args.iters):
+        anchors, length = generate_anchors_pre(height, width, cfg.FEATURE_STRIDE, cfg.ANCHOR_SCALES, cfg.ANCHOR_RATIOS)
+    print('feature map {}x{}, {} anchors, cached anchors {:.3f}ms'.format( \
+          height, width, length, (time.time() - t) / args.iters * 1000))
+
+    rpn_cls_prob = np.random.rand(1, height, width, 2 * num_anchors).astype(np.float32)
+    rpn_bbox_pred = (0.1 * np.random.randn(1, height, width, 4 * num_anchors)).astype(np.float32)
+
+    for cfg_key in ['TRAIN', 'TEST']:
+        t = time.time()
+        for _ in range(args.iters):
+            rois, scores = proposal_layer(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, cfg.FEATURE_STRIDE, anchors, num_anchors)
+        t_new = (time.time() - t) / args.iters
+
+        t = time.time()
+        for _ in range(args.iters):
+            proposals_ref, scores_ref = proposal_layer_baseline(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, anchors, num_anchors)
+        t_ref = (time.time() - t) / args.iters
+
+        if not np.allclose(np.sort(scores.ravel()), np.sort(scores_ref.ravel())):
+            print('proposal_layer {} does not match the baseline'.format(cfg_key))
+            sys.exit(1)
+        print('proposal_layer {} pre_nms {} post_nms {}: {:.3f}ms, baseline {:.3f}ms, {} rois'.format( \
+              cfg_key, cfg[cfg_key].RPN_PRE_NMS_TOP_N, cfg[cfg_key].RPN_POST_NMS_TOP_N, \
+              t_new * 1000, t_ref * 1000, rois.shape[0]))
+
+    rpn_cls_score = np.zeros((1, height, width, 2 * num_anchors), dtype=np.float32)
+    for _ in range(args.iters):
+        gt_boxes = random_gt_boxes(args.num_gt, im_height, im_width)
+        anchor_target_layer(rpn_cls_score, gt_boxes, im_info, anchors, num_anchors)
+
+    print_rpn_timing()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Compare utils.syn_decode with the conversion the synthesis tools used before.
+
+Builds a synthetic depth buffer, vertex map and color image of the given
+size, runs both versions and reports the time per frame and the number
+of pixels where the results differ. Does not need the synthesizer.
+"""
+
+import _init_paths
+from utils.syn_decode import SynDecoder
+import argparse
+import time
+import numpy as np
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the synthesizer output conversion')
+    parser.add_argument('--height', dest='height', default=480, type=int)
+    parser.add_argument('--width', dest='width', default=640, type=int)
+    parser.add_argument('--classes', dest='num_classes', default=22, type=int)
+    parser.add_argument('--iters', dest='iters', default=50, type=int)
+    args = parser.parse_args()
+    return args
+
+
+def legacy(im_syn, depth_syn, vertmap_syn, znear, zfar, factor_depth):
+    # convert images
+    im_syn = np.clip(255 * im_syn, 0, 255)
+    im_syn = im_syn.astype(np.uint8)
+    depth_syn = depth_syn[:, :, 0]
+
+    # convert depth
+    im_depth_raw = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
+    I = np.where(depth_syn == 1)
+    im_depth_raw[I[0], I[1]] = 0
+
+    # compute labels from vertmap
+    label = np.round(vertmap_syn[:, :, 0]) + 1
+    label[np.isnan(label)] = 0
+    return im_syn, im_depth_raw.astype(np.uint16), label.astype(np.uint8)
+
+
+def fused(decoder, im_syn, depth_syn, vertmap_syn):
+    return decoder.color(im_syn), decoder.depth(depth_syn), decoder.label(vertmap_syn)
+
+
+def timeit(fn, iters):
+    fn()
+    start = time.time()
+    for _ in xrange(iters):
+        out = fn()
+    return (time.time() - start) / iters, out
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    height, width = args.height, args.width
+    znear, zfar, factor_depth = 0.25, 6.0, 10000.0
+
+    # half of the frame is background, the rest random objects at random depths
+    rng = np.random.RandomState(0)
+    im_syn = rng.rand(height, width, 4).astype(np.float32) * 1.1
+    depth_syn = np.ones((height, width, 3), dtype=np.float32)
+    vertmap_syn = np.zeros((height, width, 3), dtype=np.float32) * np.nan
+    mask = rng.rand(height, width) < 0.5
+    depth_syn[mask, 0] = rng.uniform(0.9, 0.999, mask.sum())
+    vertmap_syn[mask, :] = rng.uniform(-0.4, 0.4, (mask.sum(), 3))
+    vertmap_syn[mask, 0] += rng.randint(0, args.num_classes - 1, mask.sum())
+
+    decoder = SynDecoder(height, width, znear, zfar, factor_depth)
+    t_legacy, out_legacy = timeit(lambda: legacy(im_syn, depth_syn, vertmap_syn, znear, zfar, factor_depth), args.iters)
+    t_fused, out_fused = timeit(lambda: fused(decoder, im_syn, depth_syn, vertmap_syn), args.iters)
+
+    print '{}x{}, {} iterations'.format(height, width, args.iters)
+    print 'legacy {:.2f} ms, fused {:.2f} ms, {:.2f}x'.format(1000 * t_legacy, 1000 * t_fused, t_legacy / t_fused)
+    for name, a, b in zip(['color', 'depth', 'label'], out_legacy, out_fused):
+        diff = np.abs(a.astype(np.int64) - b.astype(np.int64))
+        print '{:6s} {} pixels differ, max difference {}'.format(name, np.count_nonzero(diff), diff.max())
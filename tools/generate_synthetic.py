@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Generate the offline synthetic training set in parallel shards.
+
+Renders the frames of test_synthesis.py, split into shards of
+--shard_size frames that are distributed over --workers processes. Every
+worker owns a synthesizer (an OpenGL context), seeds its sampler per
+shard and writes the frames straight into the packed shard files of
+utils.syn_shards. Shards that are complete are skipped, so an interrupted
+run is resumed by starting it again. Train on the shards with
+TRAIN.SYN_SHARDS: True and TRAIN.SYNROOT set to --root.
+"""
+
+import _init_paths
+from fcn.config import cfg, cfg_from_file
+from utils.syn_shards import ShardWriter, completed_shards, shard_frames
+from utils.se3 import quat2mat_batch
+from utils.syn_decode import SynDecoder, class_pixels
+import argparse
+import multiprocessing
+import Queue
+import os, sys
+import time
+import numpy as np
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Generate synthetic training frames in shards')
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file', default=None, type=str)
+    parser.add_argument('--cad', dest='cad_name',
+                        help='name of the CAD files', required=True, type=str)
+    parser.add_argument('--pose', dest='pose_name',
+                        help='name of the pose files', required=True, type=str)
+    parser.add_argument('--root', dest='root',
+                        help='output directory, TRAIN.SYNROOT by default', default=None, type=str)
+    parser.add_argument('--num', dest='num_frames',
+                        help='number of frames, TRAIN.SYNNUM by default', default=None, type=int)
+    parser.add_argument('--shard_size', dest='shard_size',
+                        help='frames per shard, TRAIN.SYN_SHARD_SIZE by default', default=None, type=int)
+    parser.add_argument('--workers', dest='workers',
+                        help='number of rendering processes', default=4, type=int)
+    parser.add_argument('--seed', dest='seed',
+                        help='seed of the pose sampler, shard k uses seed + k', default=1200, type=int)
+    parser.add_argument('--classes', dest='num_classes',
+                        help='number of classes including the background', default=22, type=int)
+    parser.add_argument('--min_pixels', dest='min_pixels',
+                        help='reject frames with an object of fewer visible pixels', default=800, type=int)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+
+# camera of the YCB-Video dataset, as in test_synthesis.py
+height = 480
+width = 640
+fx = 1066.778
+fy = 1067.487
+px = 312.9869
+py = 241.3109
+zfar = 6.0
+znear = 0.25
+tnear = 0.5
+tfar = 2.0
+factor_depth = 10000.0
+intrinsic_matrix = np.array([[fx, 0, px], [0, fy, py], [0, 0, 1]])
+
+
+def postprocess(decoder, im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers, num_classes, min_pixels):
+    """(color, depth, label, meta data) of a rendered frame, None if an object is occluded too much."""
+    # labels from the vertmap, all objects need min_pixels visible pixels
+    label = decoder.label(vertmap_syn)
+    index = np.where(class_indexes >= 0)[0]
+    cls_indexes = class_indexes[index] + 1
+    counts = class_pixels(label, num_classes + 1)
+    if np.any(counts[cls_indexes.astype(np.int64)] < min_pixels):
+        return None
+
+    color = decoder.color(im_syn)
+
+    # OpenGL depth buffer to metric depth, background is 0
+    depth = decoder.depth(depth_syn)
+
+    # poses as 3 x 4 x n
+    qt = np.zeros((3, 4, len(index)), dtype=np.float32)
+    qt[:, :3, :] = quat2mat_batch(poses[index, :4]).transpose((1, 2, 0))
+    qt[:, 3, :] = poses[index, 4:].T
+
+    meta = {'poses': qt, 'center': centers[class_indexes[index].astype(int), :], \
+            'cls_indexes': cls_indexes, 'intrinsic_matrix': intrinsic_matrix, 'factor_depth': factor_depth}
+    return color, depth, label, meta
+
+
+def worker(worker_id, shards, args, queue):
+    """Render the shards, reporting (worker, shard, frames, rendered, seconds) of each to queue."""
+    try:
+        import libsynthesizer
+        synthesizer = libsynthesizer.Synthesizer(args.cad_name, args.pose_name)
+        synthesizer.setup(width, height)
+        parameters = np.array([fx, fy, px, py, znear, zfar, tnear, tfar], dtype=np.float32)
+        decoder = SynDecoder(height, width, znear, zfar, factor_depth)
+
+        for shard in shards:
+            start = time.time()
+            synthesizer.init_rand(args.seed + shard)
+            writer = ShardWriter(args.root, shard)
+            rendered = 0
+            for frame in shard_frames(shard, args.shard_size, args.num_frames):
+                while True:
+                    im_syn = np.zeros((height, width, 4), dtype=np.float32)
+                    depth_syn = np.zeros((height, width, 3), dtype=np.float32)
+                    vertmap_syn = np.zeros((height, width, 3), dtype=np.float32)
+                    class_indexes = -1 * np.ones((args.num_classes, ), dtype=np.float32)
+                    poses = np.zeros((args.num_classes, 7), dtype=np.float32)
+                    centers = np.zeros((args.num_classes, 2), dtype=np.float32)
+                    synthesizer.render_python(int(width), int(height), parameters, \
+                        im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers, True, True)
+                    rendered += 1
+                    result = postprocess(decoder, im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers, \
+                        args.num_classes, args.min_pixels)
+                    if result is not None:
+                        break
+                writer.add(frame, *result)
+            num = writer.close()
+            queue.put((worker_id, shard, num, rendered, time.time() - start))
+    except Exception as e:
+        queue.put((worker_id, None, 0, 0, repr(e)))
+        raise
+    queue.put((worker_id, None, 0, 0, None))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+    if args.root is None:
+        args.root = cfg.TRAIN.SYNROOT
+    if args.num_frames is None:
+        args.num_frames = cfg.TRAIN.SYNNUM
+    if args.shard_size is None:
+        args.shard_size = cfg.TRAIN.SYN_SHARD_SIZE
+
+    num_shards = (args.num_frames + args.shard_size - 1) // args.shard_size
+    done = set(completed_shards(args.root))
+    shards = [shard for shard in xrange(num_shards) if shard not in done]
+    print '{} frames in {} shards of {}, {} complete, writing {} to {}'.format(args.num_frames, num_shards, \
+        args.shard_size, len(done), len(shards), args.root)
+    if len(shards) == 0:
+        sys.exit(0)
+
+    # the synthesizers are created in the workers, no OpenGL context is forked
+    num_workers = min(args.workers, len(shards))
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(k, shards[k::num_workers], args, queue)) \
+                 for k in xrange(num_workers)]
+    for p in processes:
+        p.start()
+
+    start = time.time()
+    frames = np.zeros((num_workers, ), dtype=np.int64)
+    seconds = np.zeros((num_workers, ), dtype=np.float64)
+    running = set(xrange(num_workers))
+    failed = False
+    while len(running) > 0:
+        try:
+            worker_id, shard, num, rendered, elapsed = queue.get(timeout=1)
+        except Queue.Empty:
+            # a worker killed by a signal, e.g. a crash in the renderer, never reports
+            for k in sorted(running):
+                if not processes[k].is_alive() and queue.empty():
+                    print 'worker {} died with exit code {}'.format(k, processes[k].exitcode)
+                    running.discard(k)
+                    failed = True
+            continue
+        if shard is None:
+            running.discard(worker_id)
+            if elapsed is not None:
+                print 'worker {} failed: {}'.format(worker_id, elapsed)
+                failed = True
+            continue
+        frames[worker_id] += num
+        seconds[worker_id] += elapsed
+        print 'worker {} shard {:5d}: {} frames ({} rendered) in {:.1f}s, {:.2f} frames/s'.format( \
+            worker_id, shard, num, rendered, elapsed, num / max(elapsed, 1e-6))
+
+    for p in processes:
+        p.join()
+    for k in xrange(num_workers):
+        print 'worker {}: {} frames, {:.2f} frames/s'.format(k, frames[k], frames[k] / max(seconds[k], 1e-6))
+    print '{} frames in {:.1f}s, {:.2f} frames/s in total'.format(frames.sum(), time.time() - start, \
+        frames.sum() / max(time.time() - start, 1e-6))
+    if failed:
+        print 'some shards are incomplete, run again to resume'
+        sys.exit(1)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Report the memory footprint of the training queue and the network.
+
+Computes the bytes of one element of the training queue from the config,
+the host memory of the queue at its configured size, the element with
+the other layout of TRAIN.VERTEX_COMPACT, and recommends
+batch and queue sizes for a host memory budget (--budget, TRAIN.QUEUE_MEMORY
+sizes the queue of vgg16_convs from it). With --network the graph is
+built and one frame is segmented as in test_images.py, to report the
+bytes of the variables, an estimate of their training footprint and the
+peak device and host memory of inference.
+"""
+
+import _init_paths
+from fcn.config import cfg, cfg_from_file
+from datasets.factory import get_imdb
+from utils.memory_budget import cfg_element_bytes, queue_size, recommend
+import argparse
+import resource
+import sys
+import numpy as np
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Memory footprint of training and inference')
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file', default=None, type=str)
+    parser.add_argument('--imdb', dest='imdb_name',
+                        help='dataset to train on', default='lov_train', type=str)
+    parser.add_argument('--budget', dest='budget',
+                        help='host memory in MB for the training queue', default=None, type=float)
+    parser.add_argument('--network', dest='network_name',
+                        help='name of the network, builds the graph and measures inference',
+                        default=None, type=str)
+    parser.add_argument('--model', dest='model',
+                        help='optional model to restore, variables are initialized otherwise',
+                        default=None, type=str)
+    parser.add_argument('--gpu', dest='gpu_id', help='GPU id to use',
+                        default=0, type=int)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+
+def mb(num_bytes):
+    return num_bytes / 1048576.0
+
+
+def measure_inference(args, imdb):
+    """(variable bytes, peak device bytes) of segmenting one frame with the network."""
+    import tensorflow as tf
+    from fcn.test import im_segment_single_frame
+    from utils.voxelizer import Voxelizer
+
+    cfg.GPU_ID = args.gpu_id
+    cfg.TRAIN.NUM_STEPS = 1
+    cfg.TRAIN.GRID_SIZE = cfg.TEST.GRID_SIZE
+    cfg.TRAIN.TRAINABLE = False
+    cfg.IS_TRAIN = False
+
+    from networks.factory import get_network
+    network = get_network(args.network_name)
+    variable_bytes = sum(np.prod(v.get_shape().as_list()) * v.dtype.base_dtype.size for v in tf.global_variables())
+
+    with tf.device('/gpu:{:d}'.format(args.gpu_id)):
+        max_bytes = tf.contrib.memory_stats.MaxBytesInUse()
+    gpu_options = tf.GPUOptions(allow_growth=True)
+    sess = tf.Session(config=tf.ConfigProto(allow_soft_placement=True, gpu_options=gpu_options))
+    if args.model is not None:
+        tf.train.Saver().restore(sess, args.model)
+    else:
+        sess.run(tf.global_variables_initializer())
+
+    # a synthetic frame of the training size
+    height = cfg.TRAIN.SYN_HEIGHT
+    width = cfg.TRAIN.SYN_WIDTH
+    im = np.zeros((height, width, 3), dtype=np.uint8)
+    im_depth = np.ones((height, width), dtype=np.uint16) * 1000
+    K = np.array([[1066.778, 0, 312.9869], [0, 1067.487, 241.3109], [0, 0, 1]])
+    meta_data = {'intrinsic_matrix': K, 'factor_depth': 1000.0}
+    voxelizer = Voxelizer(cfg.TEST.GRID_SIZE, imdb.num_classes)
+    voxelizer.setup(-3, -3, -3, 3, 3, 4)
+    im_segment_single_frame(sess, network, im, im_depth, meta_data, voxelizer, \
+        imdb._extents, imdb._points_all, imdb._symmetry, imdb.num_classes)
+    peak = sess.run(max_bytes)
+    sess.close()
+    return variable_bytes, peak
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+
+    imdb = get_imdb(args.imdb_name)
+    num_points = imdb._points_all.shape[1]
+
+    sizes = cfg_element_bytes(imdb.num_classes, num_points)
+    element = sum(sizes.values())
+    print 'queue element of {} classes at {}x{}, scale {}, input {}'.format(imdb.num_classes, \
+        cfg.TRAIN.SYN_HEIGHT, cfg.TRAIN.SYN_WIDTH, max(cfg.TRAIN.SCALES_BASE), cfg.INPUT)
+    for name, num_bytes in sizes.items():
+        print '  {:16s} {:10.2f} MB'.format(name, mb(num_bytes))
+    print '  {:16s} {:10.2f} MB'.format('total', mb(element))
+    if cfg.TRAIN.VERTEX_REG_2D or cfg.TRAIN.VERTEX_REG_3D:
+        cfg.TRAIN.VERTEX_COMPACT = not cfg.TRAIN.VERTEX_COMPACT
+        other = sum(cfg_element_bytes(imdb.num_classes, num_points).values())
+        cfg.TRAIN.VERTEX_COMPACT = not cfg.TRAIN.VERTEX_COMPACT
+        print '  {:16s} {:10.2f} MB with TRAIN.VERTEX_COMPACT {}'.format('total', mb(other), not cfg.TRAIN.VERTEX_COMPACT)
+
+    size = queue_size(imdb.num_classes, num_points)
+    print 'queue of {} elements (TRAIN.QUEUE_SIZE {}, TRAIN.QUEUE_MEMORY {} MB): {:.0f} MB of host memory'.format( \
+        size, cfg.TRAIN.QUEUE_SIZE, cfg.TRAIN.QUEUE_MEMORY, mb(element * size))
+
+    if args.budget is not None:
+        options = recommend(args.budget * 1048576, imdb.num_classes, num_points)
+        if len(options) == 0:
+            print 'a budget of {:.0f} MB does not hold two elements of a single image'.format(args.budget)
+        else:
+            print 'for a budget of {:.0f} MB:'.format(args.budget)
+            print '  {:>10s} {:>10s} {:>10s}'.format('batch', 'queue', 'MB')
+            for batch_size, size, num_bytes in options:
+                print '  {:10d} {:10d} {:10.0f}'.format(batch_size, size, mb(num_bytes))
+            print 'set TRAIN.QUEUE_MEMORY: {:.0f} in the config to size the queue from the budget'.format(args.budget)
+
+    if args.network_name is not None:
+        variable_bytes, peak = measure_inference(args, imdb)
+        print 'variables {:.0f} MB, about {:.0f} MB with gradients and momentum in training'.format( \
+            mb(variable_bytes), mb(3 * variable_bytes))
+        print 'peak device memory of inference {:.0f} MB'.format(mb(peak))
+
+    print 'peak host memory {:.0f} MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
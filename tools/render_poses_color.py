@@ -19,6 +19,8 @@ import scipy.io
 import cv2
 import numpy as np
 from utils.se3 import *
+from utils.render_batch import load_pose_index, pose_qt, AsyncWriter
+import time
 
 def parse_args():
     """
@@ -61,6 +63,12 @@ def parse_args():
     parser.add_argument('--background', dest='background_name',
                         help='name of the background file',
                         default=None, type=str)
+    parser.add_argument('--batch', dest='batch',
+                        help='preload all poses and write the images asynchronously',
+                        action='store_true')
+    parser.add_argument('--writers', dest='writers',
+                        help='number of threads writing images in batch mode',
+                        default=4, type=int)
 
     if len(sys.argv) == 1:
         parser.print_help()
@@ -108,53 +116,70 @@ if __name__ == '__main__':
     else:
         perm = xrange(num_images)
 
-    for i in perm:
-
-        # load meta data
-        filename = root + '{:06d}-meta.mat'.format(i+1)
-        meta_data = scipy.io.loadmat(filename)
-
-        # prepare data
-        poses = meta_data['poses']
-        if len(poses.shape) == 2:
-            poses = np.reshape(poses, (3, 4, 1))
-        num = poses.shape[2]
-        channel = 8
-        qt = np.zeros((num, channel), dtype=np.float32)
-        for j in xrange(num):
-            class_id = int(meta_data['cls_indexes'][j]) - 1
-            RT = poses[:,:,j]
-
-            R = RT[:, :3]
-            T = RT[:, 3]
-            qt[j, 0] = meta_data['cls_indexes'][j]
-            qt[j, 1:5] = mat2quat(R)
-            qt[j, 5:] = T
+    if args.batch and not is_show:
+        # compose all poses at once, render while a thread pool writes
+        filenames = [root + '{:06d}-meta.mat'.format(i+1) for i in perm]
+        index = load_pose_index(filenames, os.path.join(outdir, 'pose_index.npz'))
+        qt_all = pose_qt(index)
+        offsets = index['offsets']
+        writer = AsyncWriter(args.writers)
+        start = time.time()
+        for k, i in enumerate(perm):
+            qt = qt_all[offsets[k]:offsets[k+1]]
+            im_syn = np.zeros((height, width, 4), dtype=np.uint8)
+            synthesizer_.render_poses_color_python(int(qt.shape[0]), int(qt.shape[1]), int(width), int(height), parameters, im_syn, qt)
+            writer.write(outdir + '{:06d}-render.png'.format(i+1), im_syn[::-1, :, :])
+            if (k+1) % 1000 == 0:
+                print '{} / {} images, {:.1f} images/s'.format(k+1, len(filenames), (k+1) / (time.time() - start))
+        writer.close()
+    else:
+        for i in perm:
+
+            # load meta data
+            filename = root + '{:06d}-meta.mat'.format(i+1)
+            meta_data = scipy.io.loadmat(filename)
+
+            # prepare data
+            poses = meta_data['poses']
+            if len(poses.shape) == 2:
+                poses = np.reshape(poses, (3, 4, 1))
+            num = poses.shape[2]
+            channel = 8
+            qt = np.zeros((num, channel), dtype=np.float32)
+            for j in xrange(num):
+                class_id = int(meta_data['cls_indexes'][j]) - 1
+                RT = poses[:,:,j]
+
+                R = RT[:, :3]
+                T = RT[:, 3]
+                qt[j, 0] = meta_data['cls_indexes'][j]
+                qt[j, 1:5] = mat2quat(R)
+                qt[j, 5:] = T
         
-        # render a synthetic image
-        im_syn = np.zeros((height, width, 4), dtype=np.uint8)
-        synthesizer_.render_poses_color_python(int(num), int(channel), int(width), int(height), parameters, im_syn, qt)
-
-        # convert images
-        im_syn = im_syn[::-1, :, :]
-
-        # show images
-        if is_show:
-            import matplotlib.pyplot as plt
-            fig = plt.figure()
-            ax = fig.add_subplot(1, 2, 1)
-            filename = root + '{:06d}-color.png'.format(i+1)
-            im = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
-            im = im[:, :, (2, 1, 0)]
-            plt.imshow(im)
-            ax.set_title('color') 
-
-            ax = fig.add_subplot(1, 2, 2)
-            plt.imshow(im_syn)
-            ax.set_title('render') 
-            plt.show()
-        else:
-            # save image
-            filename = outdir + '{:06d}-render.png'.format(i+1)
-            cv2.imwrite(filename, im_syn)
-            print filename
+            # render a synthetic image
+            im_syn = np.zeros((height, width, 4), dtype=np.uint8)
+            synthesizer_.render_poses_color_python(int(num), int(channel), int(width), int(height), parameters, im_syn, qt)
+
+            # convert images
+            im_syn = im_syn[::-1, :, :]
+
+            # show images
+            if is_show:
+                import matplotlib.pyplot as plt
+                fig = plt.figure()
+                ax = fig.add_subplot(1, 2, 1)
+                filename = root + '{:06d}-color.png'.format(i+1)
+                im = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+                im = im[:, :, (2, 1, 0)]
+                plt.imshow(im)
+                ax.set_title('color') 
+
+                ax = fig.add_subplot(1, 2, 2)
+                plt.imshow(im_syn)
+                ax.set_title('render') 
+                plt.show()
+            else:
+                # save image
+                filename = outdir + '{:06d}-render.png'.format(i+1)
+                cv2.imwrite(filename, im_syn)
+                print filename
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Re-score the stored results of a test run without the network.
+
+Reads the result store (or an old segmentations.pkl) in the output
+directory of test_net.py and sweeps pose accuracy over thresholds,
+classes and stages. The pose errors of the frames are computed once in
+parallel shards and checkpointed next to the results, so later sweeps
+over the same results only reduce the shards. TensorFlow is not imported.
+"""
+
+import _init_paths
+from fcn.config import cfg, cfg_from_file
+from datasets.factory import get_imdb
+from utils.result_store import ResultStore
+from utils.pose_auc import pose_curves, save_curves
+import argparse
+import cPickle
+import os
+import sys
+import time
+import numpy as np
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Re-score stored pose estimates')
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='config file of the test run', default=None, type=str)
+    parser.add_argument('--imdb', dest='imdb_name',
+                        help='dataset the results belong to', default='lov_keyframe', type=str)
+    parser.add_argument('--results', dest='results_dir',
+                        help='output directory of the test run', required=True, type=str)
+    parser.add_argument('--stages', dest='stages',
+                        help='comma separated stages out of poses, poses_refined, poses_icp',
+                        default='poses,poses_refined,poses_icp', type=str)
+    parser.add_argument('--classes', dest='classes',
+                        help='comma separated class names, all classes by default', default=None, type=str)
+    parser.add_argument('--metric', dest='metric', choices=['add', 'adds'],
+                        help='add (adi for symmetric objects) or adds (adi for all objects)', default='add')
+    parser.add_argument('--factors', dest='factors',
+                        help='comma separated thresholds relative to the object size, norm of the extents',
+                        default='0.1', type=str)
+    parser.add_argument('--auc_max', dest='auc_max',
+                        help='max threshold of the AUC in meters', default=None, type=float)
+    parser.add_argument('--workers', dest='workers',
+                        help='number of evaluation processes', default=None, type=int)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+
+def load_results(results_dir):
+    """The result store of a test run, or the segmentations of an older one."""
+    store_dir = os.path.join(results_dir, 'results')
+    if os.path.exists(os.path.join(store_dir, 'frames.bin')):
+        return ResultStore(store_dir)
+    seg_file = os.path.join(results_dir, 'segmentations.pkl')
+    if os.path.exists(seg_file):
+        with open(seg_file, 'rb') as fid:
+            return cPickle.load(fid)
+    print 'no results in {}'.format(results_dir)
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+    cfg.TEST.POSE_REG = True
+    if args.workers is not None:
+        cfg.TEST.EVAL_WORKERS = args.workers
+    auc_max = cfg.TEST.AUC_MAX_THRESHOLD if args.auc_max is None else args.auc_max
+
+    imdb = get_imdb(args.imdb_name)
+    segmentations = load_results(args.results_dir)
+    if len(segmentations) < len(imdb.image_index):
+        print '{} has results of {} of {} frames'.format(args.results_dir, len(segmentations), len(imdb.image_index))
+        sys.exit(1)
+
+    stages = args.stages.split(',')
+    factors = np.array([float(f) for f in args.factors.split(',')], dtype=np.float64)
+    if args.classes is None:
+        selected = range(1, imdb.num_classes)
+    else:
+        selected = [imdb.classes.index(name) for name in args.classes.split(',')]
+    mask = np.zeros((imdb.num_classes,), dtype=np.bool_)
+    mask[selected] = True
+
+    t = time.time()
+    confusion, count_all, records = imdb.evaluate_records(segmentations, args.results_dir)
+    print 'pose errors of {} estimates in {:.2f}s'.format(len(records.get('cls', [])), time.time() - t)
+
+    column = {'add': 0, 'adds': 3}[args.metric]
+    sizes = np.linalg.norm(imdb._extents, axis=1)
+    count_selected = count_all * mask
+    curves = {}
+    for stage in stages:
+        if stage not in records:
+            print 'no {} in the results, enable TEST.POSE_REFINE in the config of the test run'.format(stage)
+            continue
+        index = mask[records['cls']]
+        classes = records['cls'][index]
+        errors = records[stage][index, column]
+
+        # correct estimates of all thresholds at once
+        correct = errors[:, np.newaxis] < factors[np.newaxis, :] * sizes[classes][:, np.newaxis]
+        counts = np.array([np.bincount(classes[correct[:, f]], minlength=imdb.num_classes) \
+            for f in xrange(factors.shape[0])], dtype=np.float64)
+        curves[stage] = pose_curves(classes, errors, count_selected, auc_max, cfg.TEST.AUC_STEPS)
+
+        print '\n{} {}, accuracy at {} x object size, AUC up to {}m'.format(stage, args.metric, \
+            ', '.join('{:g}'.format(f) for f in factors), auc_max)
+        for cls in selected:
+            accuracy = counts[:, cls] / max(count_all[cls], 1)
+            print '{:24s} {} {:.4f}'.format(imdb.classes[cls], \
+                ' '.join('{:.4f}'.format(a) for a in accuracy), curves[stage]['auc'][cls])
+        accuracy = counts.sum(axis=1) / max(count_selected.sum(), 1)
+        print '{:24s} {} {:.4f}'.format('all', ' '.join('{:.4f}'.format(a) for a in accuracy), curves[stage]['auc_all'])
+
+    filename = os.path.join(args.results_dir, 'rescore_curves_{}.npz'.format(args.metric))
+    save_curves(filename, curves)
+    print '\ncurves saved to {}, {:.2f}s in total'.format(filename, time.time() - t)
@@ -18,6 +18,7 @@ import libsynthesizer
 import scipy.io
 import cv2
 import numpy as np
+from utils.syn_decode import SynDecoder
 
 def parse_args():
     """
@@ -94,6 +95,7 @@ if __name__ == '__main__':
 
     synthesizer_ = libsynthesizer.Synthesizer(args.cad_name, args.pose_name)
     synthesizer_.setup(width, height)
+    decoder = SynDecoder(height, width, znear, zfar, factor_depth)
     synthesizer_.init_rand(1200)
 
     parameters = np.zeros((8, ), dtype=np.float32)
@@ -121,19 +123,10 @@ if __name__ == '__main__':
         synthesizer_.render_python(int(width), int(height), parameters, \
                                    im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers, is_sampling, is_sampling_pose)
 
-        # convert images
-        im_syn = np.clip(255 * im_syn, 0, 255)
-        im_syn = im_syn.astype(np.uint8)
-        depth_syn = depth_syn[:, :, 0]
-
-        # convert depth
-        im_depth_raw = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
-        I = np.where(depth_syn == 1)
-        im_depth_raw[I[0], I[1]] = 0
-
-        # compute labels from vertmap
-        label = np.round(vertmap_syn[:, :, 0]) + 1
-        label[np.isnan(label)] = 0
+        # convert images, depth and labels from vertmap
+        im_syn = decoder.color(im_syn)
+        im_depth_raw = decoder.depth(depth_syn)
+        label = decoder.label(vertmap_syn)
 
         # convert pose
         index = np.where(class_indexes >= 0)[0]
@@ -155,8 +148,7 @@ if __name__ == '__main__':
             continue
 
         # process the vertmap
-        vertmap_syn[:, :, 0] = vertmap_syn[:, :, 0] - np.round(vertmap_syn[:, :, 0])
-        vertmap_syn[np.isnan(vertmap_syn)] = 0
+        decoder.vertmap(vertmap_syn)
 
         # metadata
         metadata = {'poses': qt, 'center': centers[class_indexes[index].astype(int), :], \
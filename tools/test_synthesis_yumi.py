@@ -18,6 +18,7 @@ from fcn.config import cfg, cfg_from_file, get_output_dir
 import scipy.io
 import cv2
 import numpy as np
+from utils.syn_decode import SynDecoder
 
 def parse_args():
     """
@@ -85,6 +86,7 @@ if __name__ == '__main__':
 
     synthesizer_ = synthesizer.PySynthesizer(args.cad_name, args.pose_name)
     synthesizer_.setup(width, height)
+    decoder = SynDecoder(height, width, znear, zfar, factor_depth)
 
     i = 0
     while i < num_images:
@@ -102,14 +104,9 @@ if __name__ == '__main__':
         im_syn = im_syn[::-1, :, :]
         depth_syn = depth_syn[::-1, :]
 
-        # convert depth
-        im_depth_raw = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
-        I = np.where(depth_syn == 1)
-        im_depth_raw[I[0], I[1]] = 0
-
-        # compute labels from vertmap
-        label = np.round(vertmap_syn[:, :, 0]) + 1
-        label[np.isnan(label)] = 0
+        # convert depth and labels from vertmap
+        im_depth_raw = decoder.depth(depth_syn)
+        label = decoder.label(vertmap_syn)
 
         flag = 1
         for j in xrange(1, num_classes):
@@ -130,8 +127,7 @@ if __name__ == '__main__':
             qt[:, 3, j] = poses[ind, 4:]
 
         # process the vertmap
-        vertmap_syn[:, :, 0] = vertmap_syn[:, :, 0] - np.round(vertmap_syn[:, :, 0])
-        vertmap_syn[np.isnan(vertmap_syn)] = 0
+        decoder.vertmap(vertmap_syn)
 
         # metadata
         metadata = {'poses': qt, 'center': centers[class_indexes[index].astype(int), :], \
@@ -13,6 +13,8 @@ import _init_paths
 from fcn.train import get_training_roidb, train_net, train_net_det
 from fcn.config import cfg, cfg_from_file, get_output_dir
 from datasets.factory import get_imdb
+from utils.syn_decode import SynDecoder
+from utils.scene_sampler import SceneSampler, load_pose_lists
 import argparse
 import pprint
 import numpy as np
@@ -70,6 +72,12 @@ def parse_args():
     return args
 
 
+def report_sampler(sampler, accepted):
+    sampler.record(accepted)
+    if sampler.stats['rendered'] % 1000 == 0:
+        print 'synthesizer: ' + sampler.summary()
+
+
 def render_one(data_queue, intrinsic_matrix, extents, points):
 
     synthesizer = libsynthesizer.Synthesizer(cfg.CAD, cfg.POSE)
@@ -85,6 +93,13 @@ def render_one(data_queue, intrinsic_matrix, extents, points):
     zfar = 6.0
     znear = 0.25;
     factor_depth = 1000.0
+    decoder = SynDecoder(height, width, znear, zfar, factor_depth)
+
+    sampler = None
+    if cfg.TRAIN.SYN_PREDICT_VISIBILITY:
+        sampler = SceneSampler(points, intrinsic_matrix, width, height, cfg.TRAIN.SYN_MIN_PIXELS, \
+            cfg.TRAIN.SYN_VISIBILITY_MARGIN, cfg.TRAIN.SYN_VISIBILITY_SCALE)
+        parameters = np.array([fx, fy, px, py, znear, zfar, 0, 0], dtype=np.float32)
 
     while True:
 
@@ -92,30 +107,32 @@ def render_one(data_queue, intrinsic_matrix, extents, points):
         im_syn = np.zeros((height, width, 4), dtype=np.float32)
         depth_syn = np.zeros((height, width, 3), dtype=np.float32)
         vertmap_syn = np.zeros((height, width, 3), dtype=np.float32)
-        poses = np.zeros((1, 7), dtype=np.float32)
-        centers = np.zeros((1, 2), dtype=np.float32)
-        synthesizer.render_one_python(int(which_class), int(width), int(height), fx, fy, px, py, znear, zfar, \
-            im_syn, depth_syn, vertmap_syn, poses, centers, extents)
-
-        # convert images
-        im_syn = np.clip(255 * im_syn, 0, 255)
-        im_syn = im_syn.astype(np.uint8)
-        depth_syn = depth_syn[:, :, 0]
-
-        # convert depth
-        im_depth_raw = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
-        I = np.where(depth_syn == 1)
-        im_depth_raw[I[0], I[1]] = 0
-
-        # compute labels from vertmap
-        label = np.round(vertmap_syn[:, :, 0]) + 1
-        label[np.isnan(label)] = 0
+        if sampler is None:
+            poses = np.zeros((1, 7), dtype=np.float32)
+            centers = np.zeros((1, 2), dtype=np.float32)
+            synthesizer.render_one_python(int(which_class), int(width), int(height), fx, fy, px, py, znear, zfar, \
+                im_syn, depth_syn, vertmap_syn, poses, centers, extents)
+        else:
+            class_indexes, poses = sampler.sample_one(which_class, extents)
+            centers = np.zeros((points.shape[0], 2), dtype=np.float32)
+            synthesizer.render_scene_python(int(width), int(height), parameters, \
+                im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers)
+            poses = poses[:1]
+            centers = centers[which_class:which_class + 1]
+
+        # convert images, depth and labels from vertmap
+        im_syn = decoder.color(im_syn)
+        im_depth_raw = decoder.depth(depth_syn, dtype=np.float32)
+        label = decoder.label(vertmap_syn)
 
         I = np.where(label != which_class + 1)
         label[I[0], I[1]] = 0
 
         I = np.where(label == which_class + 1)
-        if len(I[0]) < 800:
+        accepted = len(I[0]) >= cfg.TRAIN.SYN_MIN_PIXELS
+        if sampler is not None:
+            report_sampler(sampler, accepted)
+        if not accepted:
             continue
 
         # convert pose
@@ -124,8 +141,7 @@ def render_one(data_queue, intrinsic_matrix, extents, points):
         qt[:, 3, 0] = poses[0, 4:]
 
         # process the vertmap
-        vertmap_syn[:, :, 0] = vertmap_syn[:, :, 0] - np.round(vertmap_syn[:, :, 0])
-        vertmap_syn[np.isnan(vertmap_syn)] = 0
+        decoder.vertmap(vertmap_syn)
 
         # compute box
         x3d = np.ones((4, points.shape[1]), dtype=np.float32)
@@ -168,6 +184,7 @@ def render(data_queue, intrinsic_matrix, points):
     tnear = cfg.TRAIN.SYN_TNEAR
     tfar = cfg.TRAIN.SYN_TFAR
     factor_depth = 1000.0
+    decoder = SynDecoder(height, width, znear, zfar, factor_depth)
     num_classes = points.shape[0]
 
     parameters = np.zeros((8, ), dtype=np.float32)
@@ -180,33 +197,35 @@ def render(data_queue, intrinsic_matrix, points):
     parameters[6] = tnear
     parameters[7] = tfar
 
+    sampler = None
+    if cfg.TRAIN.SYN_PREDICT_VISIBILITY:
+        pose_lists = load_pose_lists(cfg.POSE) if cfg.TRAIN.SYN_SAMPLE_POSE else None
+        sampler = SceneSampler(points, intrinsic_matrix, width, height, cfg.TRAIN.SYN_MIN_PIXELS, \
+            cfg.TRAIN.SYN_VISIBILITY_MARGIN, cfg.TRAIN.SYN_VISIBILITY_SCALE, pose_lists)
+
     while True:
 
         # render a synthetic image
         im_syn = np.zeros((height, width, 4), dtype=np.float32)
         depth_syn = np.zeros((height, width, 3), dtype=np.float32)
         vertmap_syn = np.zeros((height, width, 3), dtype=np.float32)
-        class_indexes = -1 * np.ones((num_classes, ), dtype=np.float32)
-        poses = np.zeros((num_classes, 7), dtype=np.float32)
         centers = np.zeros((num_classes, 2), dtype=np.float32)
         is_sampling = cfg.TRAIN.SYN_SAMPLE_OBJECT
         is_sampling_pose = cfg.TRAIN.SYN_SAMPLE_POSE
-        synthesizer.render_python(int(width), int(height), parameters, \
-                                   im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers, is_sampling, is_sampling_pose)
-
-        # convert images
-        im_syn = np.clip(255 * im_syn, 0, 255)
-        im_syn = im_syn.astype(np.uint8)
-        depth_syn = depth_syn[:, :, 0]
-
-        # convert depth
-        im_depth_raw = factor_depth * 2 * zfar * znear / (zfar + znear - (zfar - znear) * (2 * depth_syn - 1))
-        I = np.where(depth_syn == 1)
-        im_depth_raw[I[0], I[1]] = 0
+        if sampler is None:
+            class_indexes = -1 * np.ones((num_classes, ), dtype=np.float32)
+            poses = np.zeros((num_classes, 7), dtype=np.float32)
+            synthesizer.render_python(int(width), int(height), parameters, \
+                                       im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers, is_sampling, is_sampling_pose)
+        else:
+            class_indexes, poses = sampler.sample(num_classes, tnear, tfar, is_sampling, is_sampling_pose)
+            synthesizer.render_scene_python(int(width), int(height), parameters, \
+                                             im_syn, depth_syn, vertmap_syn, class_indexes, poses, centers)
 
-        # compute labels from vertmap
-        label = np.round(vertmap_syn[:, :, 0]) + 1
-        label[np.isnan(label)] = 0
+        # convert images, depth and labels from vertmap
+        im_syn = decoder.color(im_syn)
+        im_depth_raw = decoder.depth(depth_syn, dtype=np.float32)
+        label = decoder.label(vertmap_syn)
 
         # convert pose
         index = np.where(class_indexes >= 0)[0]
@@ -221,15 +240,16 @@ def render(data_queue, intrinsic_matrix, points):
         for j in xrange(num):
             cls = class_indexes[index[j]] + 1
             I = np.where(label == cls)
-            if len(I[0]) < 800:
+            if len(I[0]) < cfg.TRAIN.SYN_MIN_PIXELS:
                 flag = 0
                 break
+        if sampler is not None:
+            report_sampler(sampler, flag == 1)
         if flag == 0:
             continue
 
         # process the vertmap
-        vertmap_syn[:, :, 0] = vertmap_syn[:, :, 0] - np.round(vertmap_syn[:, :, 0])
-        vertmap_syn[np.isnan(vertmap_syn)] = 0
+        decoder.vertmap(vertmap_syn)
 
         # compute box
         box = np.zeros((num, 4), dtype=np.float32)